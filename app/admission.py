@@ -0,0 +1,187 @@
+"""
+Kontrola przyjmowania żądań LLM (admission control) z szacowaniem czasu oczekiwania.
+Zamiast przyjmować pracę, której worker nie skończy przed timeoutem gunicorna, żądanie
+jest odrzucane od razu (429 + Retry-After), gdy szacowany czas odpowiedzi przekracza SLO.
+
+Szacunek = czas oczekiwania w kolejce (pozostała praca przyjętych żądań / liczba slotów LLM)
++ własny czas obsługi (EWMA czasów etapów). Odrzucane są tylko żądania, które musiałyby czekać
+na slot. Zajętość slotów liczona jest z przyjętych żądań oraz z wywołań LLM trzymających slot
+schedulera, przeliczonych na sloty żądań (fan-out jednego żądania na wymiary / próbki nie liczy
+się jak wiele żądań). Stan jest per proces (worker gunicorna).
+"""
+
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.llm_scheduler import LLM_SCHEDULER
+
+logger = logging.getLogger("lem.admission")
+
+EWMA_ALPHA = 0.2
+DEFAULT_SLO_MS = 90_000
+DEFAULT_CAPACITY = 4
+
+# Czas etapu przed pierwszymi pomiarami (ms)
+DEFAULT_STAGE_MS = {
+    "parse": 4000.0,
+    "map": 10000.0,
+    "score": 8000.0,
+    "feedback": 12000.0,
+}
+
+# Etapy wykonywane przez endpointy LLM
+ADMISSION_ROUTES = {
+    "/assess": ["parse", "map", "score", "feedback"],
+    "/api/diagnostic/parse": ["parse"],
+    "/api/diagnostic/map": ["map"],
+    "/api/diagnostic/score": ["score"],
+    "/api/diagnostic/feedback": ["feedback"],
+    "/api/diagnostic/feedback/stream": ["feedback"],
+}
+_PIPELINE_STAGE_PREFIX = "/api/pipeline/runs/"
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        logger.warning("Nieprawidłowa wartość %s: %s", name, raw)
+        return default
+
+
+def route_stages(method: str, path: str) -> Optional[list[str]]:
+    """Etapy pipeline'u uruchamiane przez żądanie; None = żądanie nie podlega kontroli."""
+    if method != "POST":
+        return None
+    if path in ADMISSION_ROUTES:
+        return ADMISSION_ROUTES[path]
+    if path.startswith(_PIPELINE_STAGE_PREFIX):
+        parts = path[len(_PIPELINE_STAGE_PREFIX):].split("/")
+        if len(parts) == 3 and parts[1] == "stages" and parts[2] in DEFAULT_STAGE_MS:
+            return [parts[2]]
+        if len(parts) == 2 and parts[1] == "revise":
+            return ["parse", "map", "score", "feedback"]
+    return None
+
+
+class Rejected(Exception):
+    def __init__(self, estimate_ms: float, slo_ms: float, retry_after_s: int):
+        self.estimate_ms = estimate_ms
+        self.slo_ms = slo_ms
+        self.retry_after_s = retry_after_s
+        super().__init__(
+            f"Serwer przeciążony: szacowany czas odpowiedzi {estimate_ms / 1000:.0f} s "
+            f"przekracza limit {slo_ms / 1000:.0f} s. Spróbuj ponownie za {retry_after_s} s."
+        )
+
+
+class AdmissionController:
+    """Szacuje czas odpowiedzi nowego żądania i przyjmuje je tylko w ramach SLO."""
+
+    def __init__(
+        self,
+        slo_ms: Optional[int] = None,
+        capacity: Optional[int] = None,
+        llm_capacity: Optional[int] = None,
+    ):
+        self.slo_ms = slo_ms if slo_ms is not None else _env_int("LEM_ADMISSION_SLO_MS", DEFAULT_SLO_MS)
+        self.capacity = max(1, capacity if capacity is not None else _env_int("LEM_ADMISSION_CAPACITY", DEFAULT_CAPACITY))
+        self.llm_capacity = max(1, llm_capacity if llm_capacity is not None else LLM_SCHEDULER.capacity)
+        self.stage_ms: dict[str, float] = {}
+        self.llm_in_flight = 0
+        self._active: dict[int, tuple[float, float]] = {}  # ticket -> (start, oczekiwany czas ms)
+        self._next_ticket = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.slo_ms > 0
+
+    def record_stage(self, stage: str, duration_ms: float) -> None:
+        """Aktualizuje EWMA czasu etapu (wywoływane po każdym ukończonym etapie)."""
+        previous = self.stage_ms.get(stage)
+        self.stage_ms[stage] = duration_ms if previous is None else (
+            EWMA_ALPHA * duration_ms + (1 - EWMA_ALPHA) * previous
+        )
+
+    @contextmanager
+    def llm_call(self) -> Iterator[None]:
+        """Wywołanie LLM trzymające slot schedulera (używane wewnątrz LLM_SCHEDULER.slot() -
+        wywołania czekające w kolejce nie zwiększają zajętości)."""
+        self.llm_in_flight += 1
+        try:
+            yield
+        finally:
+            self.llm_in_flight = max(0, self.llm_in_flight - 1)
+
+    def llm_busy_slots(self) -> int:
+        """Wywołania LLM w toku przeliczone na sloty żądań: wszystkie sloty schedulera zajęte
+        = wszystkie sloty żądań zajęte."""
+        return math.ceil(self.llm_in_flight * self.capacity / self.llm_capacity)
+
+    def service_ms(self, stages: list[str]) -> float:
+        return sum(self.stage_ms.get(stage, DEFAULT_STAGE_MS.get(stage, 0.0)) for stage in stages)
+
+    def queue_wait_ms(self, now: Optional[float] = None) -> float:
+        """Czas, po którym zwolni się slot: pozostała praca przyjętych żądań rozłożona na sloty.
+        Dopóki wolne są sloty (także wg wywołań LLM w toku) - brak oczekiwania."""
+        now = time.monotonic() if now is None else now
+        busy = max(len(self._active), self.llm_busy_slots())
+        if busy < self.capacity:
+            return 0.0
+        outstanding = sum(
+            max(0.0, expected_ms - (now - started) * 1000)
+            for started, expected_ms in self._active.values()
+        )
+        return outstanding / self.capacity
+
+    def admit(self, stages: list[str], budget_ms: Optional[float] = None) -> int:
+        """Przyjmuje żądanie (zwraca bilet do release) albo rzuca Rejected.
+        budget_ms - deadline żądania, jeśli krótszy od SLO, jest limitem dla tego żądania."""
+        service = self.service_ms(stages)
+        limit = self.slo_ms if budget_ms is None else min(self.slo_ms, budget_ms)
+        queue_wait = self.queue_wait_ms()
+        # Przy wolnym slocie żądanie jest zawsze przyjmowane - inaczej zawyżona EWMA
+        # (bez nowych pomiarów) blokowałaby endpoint na stałe
+        if self.enabled and queue_wait > 0:
+            estimate = queue_wait + service
+            if estimate > limit:
+                self.rejected += 1
+                retry_after = max(1, math.ceil(min(queue_wait, estimate - limit) / 1000))
+                logger.warning(
+                    "Odrzucono żądanie %s: szacunek %.0f ms > limit %.0f ms (aktywne: %d, LLM w toku: %d)",
+                    stages, estimate, limit, len(self._active), self.llm_in_flight,
+                )
+                raise Rejected(estimate, limit, retry_after)
+        self._next_ticket += 1
+        self._active[self._next_ticket] = (time.monotonic(), service)
+        self.admitted += 1
+        return self._next_ticket
+
+    def release(self, ticket: int) -> None:
+        self._active.pop(ticket, None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "slo_ms": self.slo_ms,
+            "capacity": self.capacity,
+            "active": len(self._active),
+            "llm_in_flight": self.llm_in_flight,
+            "llm_capacity": self.llm_capacity,
+            "queue_wait_ms": round(self.queue_wait_ms()),
+            "stage_ms": {stage: round(ms) for stage, ms in self.stage_ms.items()},
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+ADMISSION = AdmissionController()
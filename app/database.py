@@ -1,6 +1,11 @@
+import asyncio
+import hashlib
+import logging
 import os
-from contextlib import asynccontextmanager
+import time
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
+from typing import Optional
 
 import aiosqlite
 
@@ -91,6 +96,56 @@ CREATE INDEX IF NOT EXISTS idx_evidence_assessment ON evidence(assessment_id);
 CREATE INDEX IF NOT EXISTS idx_pipeline_steps_assessment ON pipeline_steps(assessment_id);
 CREATE INDEX IF NOT EXISTS idx_pipeline_steps_step_name ON pipeline_steps(step_name);
 
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id TEXT PRIMARY KEY,
+    participant_id TEXT NOT NULL,
+    competency TEXT NOT NULL,
+    response_text TEXT NOT NULL,
+    input_sections TEXT,
+    assessment_id INTEGER,
+    created_by TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    FOREIGN KEY (assessment_id) REFERENCES assessments(id) ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_run_stages (
+    run_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    output_data TEXT NOT NULL,
+    duration_ms INTEGER,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, stage),
+    FOREIGN KEY (run_id) REFERENCES pipeline_runs(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_runs_created_by ON pipeline_runs(created_by, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    total INTEGER DEFAULT 0,
+    done INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    skipped INTEGER DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_by TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+-- Punkty kontrolne zadań: wynik każdego przetworzonego elementu osobnym wierszem
+CREATE TABLE IF NOT EXISTS background_job_results (
+    job_id TEXT NOT NULL,
+    item_index INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (job_id, item_index),
+    FOREIGN KEY (job_id) REFERENCES background_jobs(id) ON DELETE CASCADE
+);
+
 CREATE TABLE IF NOT EXISTS sample_responses (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     label TEXT NOT NULL,
@@ -102,24 +157,252 @@ CREATE TABLE IF NOT EXISTS sample_responses (
 """
 
 
+# Pula połączeń per proces (worker gunicorna): jedno połączenie zapisujące i kilka tylko do odczytu.
+# W trybie WAL odczyty nie czekają na transakcje zapisu, a zapisy w procesie kolejkują się
+# na jednym połączeniu zamiast rywalizować o blokadę pliku (SQLITE_BUSY).
+READ_POOL_SIZE = int(os.getenv("LEM_DB_READ_POOL_SIZE", "4"))
+BUSY_TIMEOUT_MS = int(os.getenv("LEM_DB_BUSY_TIMEOUT_MS", "5000"))
+CACHE_SIZE_KB = int(os.getenv("LEM_DB_CACHE_SIZE_KB", "20000"))
+MMAP_SIZE = int(os.getenv("LEM_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+logger = logging.getLogger("lem.database")
+
+
+class _KindStats:
+    def __init__(self):
+        self.acquired = 0
+        self.waited = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def record(self, wait_ms: float) -> None:
+        self.acquired += 1
+        if wait_ms >= 1.0:
+            self.waited += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+
+class ConnectionPool:
+    """Połączenia aiosqlite do jednej bazy, związane z pętlą zdarzeń, w której powstały."""
+
+    def __init__(self, path: Path, read_size: int = READ_POOL_SIZE):
+        self.path = path
+        self.sizes = {"read": max(1, read_size), "write": 1}
+        self.loop = asyncio.get_running_loop()
+        self._idle: dict[str, asyncio.Queue] = {kind: asyncio.Queue() for kind in self.sizes}
+        self._open: dict[str, list[aiosqlite.Connection]] = {kind: [] for kind in self.sizes}
+        self._connecting = {kind: 0 for kind in self.sizes}  # rezerwacja miejsca na czas otwierania
+        self._waiting = {kind: 0 for kind in self.sizes}
+        self._stats = {kind: _KindStats() for kind in self.sizes}
+
+    async def _connect(self, kind: str) -> aiosqlite.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = await aiosqlite.connect(self.path.as_posix())
+        try:
+            conn.row_factory = aiosqlite.Row
+            await conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            if kind == "write":
+                # Tryb WAL jest trwały w pliku bazy - wystarczy ustawić go z połączenia zapisującego
+                await conn.execute("PRAGMA journal_mode = WAL")
+            await conn.execute("PRAGMA synchronous = NORMAL")
+            await conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+            await conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            await conn.execute("PRAGMA temp_store = MEMORY")
+            await conn.execute("PRAGMA foreign_keys = ON")
+            if kind == "read":
+                await conn.execute("PRAGMA query_only = ON")
+        except Exception:
+            await conn.close()
+            raise
+        self._open[kind].append(conn)
+        return conn
+
+    async def acquire(self, kind: str) -> aiosqlite.Connection:
+        started = time.perf_counter()
+        idle = self._idle[kind]
+        if idle.empty() and len(self._open[kind]) + self._connecting[kind] < self.sizes[kind]:
+            self._connecting[kind] += 1
+            try:
+                conn = await self._connect(kind)
+            finally:
+                self._connecting[kind] -= 1
+        else:
+            self._waiting[kind] += 1
+            try:
+                conn = await idle.get()
+            finally:
+                self._waiting[kind] -= 1
+        self._stats[kind].record((time.perf_counter() - started) * 1000)
+        return conn
+
+    async def release(self, kind: str, conn: aiosqlite.Connection) -> None:
+        try:
+            if conn.in_transaction:
+                # Niezatwierdzone zmiany (wyjątek w bloku) nie mogą przejść do kolejnego użytkownika
+                await conn.rollback()
+        except Exception:
+            logger.warning("Połączenie %s odrzucone z puli", kind, exc_info=True)
+            self._open[kind].remove(conn)
+            await conn.close()
+            return
+        self._idle[kind].put_nowait(conn)
+
+    async def close(self) -> None:
+        for kind, conns in self._open.items():
+            for conn in conns:
+                with suppress(Exception):
+                    await conn.close()
+            conns.clear()
+            self._idle[kind] = asyncio.Queue()
+
+    def stop(self) -> None:
+        """Zamyka połączenia bez czekania (pula z pętli, która już nie działa)."""
+        for conns in self._open.values():
+            for conn in conns:
+                with suppress(Exception):
+                    conn.stop()
+            conns.clear()
+
+    def stats(self) -> dict:
+        kinds = {}
+        for kind, stats in self._stats.items():
+            kinds[kind] = {
+                "size": self.sizes[kind],
+                "open": len(self._open[kind]),
+                "idle": self._idle[kind].qsize(),
+                "waiting": self._waiting[kind],
+                "acquired": stats.acquired,
+                "waited": stats.waited,
+                "avg_wait_ms": round(stats.wait_ms_total / stats.acquired, 2) if stats.acquired else 0.0,
+                "max_wait_ms": round(stats.wait_ms_max, 1),
+            }
+        return {"path": self.path.as_posix(), **kinds}
+
+
+_POOL: Optional[ConnectionPool] = None
+
+
+def _get_pool() -> ConnectionPool:
+    global _POOL
+    loop = asyncio.get_running_loop()
+    if _POOL is None or _POOL.path != DB_PATH or _POOL.loop is not loop:
+        if _POOL is not None:
+            _POOL.stop()
+        _POOL = ConnectionPool(DB_PATH)
+    return _POOL
+
+
 @asynccontextmanager
-async def get_connection():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = await aiosqlite.connect(DB_PATH.as_posix())
-    conn.row_factory = aiosqlite.Row
-    await conn.execute("PRAGMA foreign_keys = ON")
+async def get_connection(read_only: bool = False):
+    """Połączenie z puli. read_only=True - połączenie do odczytu (zapis zakończy się błędem)."""
+    pool = _get_pool()
+    kind = "read" if read_only else "write"
+    conn = await pool.acquire(kind)
     try:
         yield conn
     finally:
-        await conn.close()
+        await pool.release(kind, conn)
+
+
+async def close_pool() -> None:
+    global _POOL
+    pool, _POOL = _POOL, None
+    if pool is not None:
+        await pool.close()
+
+
+def get_pool_stats() -> dict:
+    return _POOL.stats() if _POOL is not None else {}
 
 
 MIGRATIONS = [
     "ALTER TABLE assessments ADD COLUMN total_tokens INTEGER DEFAULT 0",
     "ALTER TABLE assessments ADD COLUMN total_cost_usd REAL DEFAULT 0.0",
     "ALTER TABLE assessments ADD COLUMN run_name TEXT DEFAULT ''",
+    "ALTER TABLE assessments ADD COLUMN reassessed_from INTEGER",
+    "ALTER TABLE pipeline_runs ADD COLUMN parent_run_id TEXT",
+    "ALTER TABLE background_jobs ADD COLUMN schedule TEXT",
+    "ALTER TABLE background_jobs ADD COLUMN items TEXT",
+    "ALTER TABLE background_jobs ADD COLUMN status_reason TEXT",
+    "ALTER TABLE background_jobs ADD COLUMN lease_owner TEXT",
+    "ALTER TABLE background_jobs ADD COLUMN lease_until TEXT",
+    "ALTER TABLE dimension_scores ADD COLUMN spread REAL",
+    "ALTER TABLE dimension_scores ADD COLUMN samples INTEGER DEFAULT 1",
+    "ALTER TABLE assessments ADD COLUMN response_text_hash TEXT",
+    "ALTER TABLE assessments ADD COLUMN response_text_len INTEGER",
+    "CREATE INDEX IF NOT EXISTS idx_assessments_text_hash ON assessments(response_text_hash)",
+    # Zapisane runy (step_name 'run:<moduł>'): metadane z input_data jako kolumny z indeksami
+    "ALTER TABLE pipeline_steps ADD COLUMN module TEXT",
+    "ALTER TABLE pipeline_steps ADD COLUMN participant_id TEXT",
+    "ALTER TABLE pipeline_steps ADD COLUMN competency TEXT",
+    "ALTER TABLE pipeline_steps ADD COLUMN saved_by TEXT",
+    """
+    UPDATE pipeline_steps SET
+        module = substr(step_name, 5),
+        participant_id = json_extract(input_data, '$.participant_id'),
+        competency = json_extract(input_data, '$.competency'),
+        saved_by = json_extract(input_data, '$.saved_by')
+    WHERE step_name LIKE 'run:%' AND module IS NULL
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_pipeline_steps_runs ON pipeline_steps(id) WHERE module IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_pipeline_steps_runs_competency ON pipeline_steps(competency, id) WHERE module IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_pipeline_steps_runs_module ON pipeline_steps(module, id) WHERE module IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_pipeline_steps_runs_participant ON pipeline_steps(participant_id, id) WHERE module IS NOT NULL",
+    # Stronicowanie listy ocen (keyset po created_at, id) - także z filtrem kompetencji, uczestnika, modelu
+    "CREATE INDEX IF NOT EXISTS idx_assessments_page ON assessments(created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_assessments_competency_page ON assessments(competency, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_assessments_participant_page ON assessments(participant_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_assessments_model_page ON assessments(llm_model, created_at, id)",
 ]
 
+BACKFILL_CHUNK = 500
+
+
+def response_text_hash(text: str) -> str:
+    """Skrót tekstu odpowiedzi pokazywany na listach i używany do grupowania ocen tego samego tekstu."""
+    return hashlib.md5(text.encode()).hexdigest()[:12] if text else ""
+
+
+async def _backfill_text_hashes() -> int:
+    """Uzupełnia response_text_hash/len ocen zapisanych przed dodaniem kolumn (partiami po id).
+
+    Każda partia to osobna operacja kolejki zapisów - pod blokadą pliku, więc workery startujące
+    równocześnie nie walczą o bazę; warunek IS NULL w UPDATE sprawia, że partie uzupełnione
+    już przez inny worker są pomijane.
+    """
+    from app.db_writer import run_write  # db_writer importuje ten moduł
+
+    filled = 0
+    last_id = 0
+    while True:
+        async with get_connection(read_only=True) as conn:
+            rows = await conn.execute_fetchall(
+                """
+                SELECT id, response_text FROM assessments
+                WHERE response_text_hash IS NULL AND id > ?
+                ORDER BY id LIMIT ?
+                """,
+                (last_id, BACKFILL_CHUNK),
+            )
+        if not rows:
+            return filled
+        params = [
+            (response_text_hash(row["response_text"] or ""), len(row["response_text"] or ""), row["id"])
+            for row in rows
+        ]
+
+        async def write(conn, params=params):
+            await conn.executemany(
+                "UPDATE assessments SET response_text_hash = ?, response_text_len = ? "
+                "WHERE id = ? AND response_text_hash IS NULL",
+                params,
+            )
+
+        await run_write(write)
+        filled += len(rows)
+        last_id = rows[-1]["id"]
+
 
 async def init_db() -> None:
     async with get_connection() as conn:
@@ -130,3 +413,11 @@ async def init_db() -> None:
             except Exception:
                 pass
         await conn.commit()
+    try:
+        filled = await _backfill_text_hashes()
+    except Exception:
+        # Brakujące skróty nie blokują startu - kolejny start workera dokończy uzupełnianie
+        logger.warning("Uzupełnianie skrótów tekstu przerwane", exc_info=True)
+    else:
+        if filled:
+            logger.info("Uzupełniono skrót tekstu dla %d ocen", filled)
@@ -1,10 +1,12 @@
-import hashlib
+import base64
 import json
 import re
-from datetime import datetime, timezone
+import uuid
+from datetime import date, datetime, timedelta, timezone
 from typing import Any, Optional
 
-from app.database import get_connection
+from app.database import get_connection, response_text_hash
+from app.db_writer import run_write
 
 
 SESSION_REF_PATTERN = re.compile(r"^(?:session_)?(\d+)(?:\.json)?$")
@@ -38,6 +40,44 @@ def _parse_run_ref(ref: str) -> Optional[int]:
     return int(match.group(1)) if match else None
 
 
+def encode_cursor(values: list[Any]) -> str:
+    """Kursor stronicowania (keyset): wartości klucza sortowania ostatniego wiersza strony."""
+    return base64.urlsafe_b64encode(_dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> list[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Nieprawidłowy kursor") from None
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Nieprawidłowy kursor")
+    return values
+
+
+def _date_filters(column: str, date_from: Optional[str], date_to: Optional[str]) -> tuple[list[str], list[Any]]:
+    """Warunki zakresu dat na kolumnie ISO (UTC). Sama data w date_to obejmuje cały dzień."""
+    clauses: list[str] = []
+    params: list[Any] = []
+    for value, is_end in ((date_from, False), (date_to, True)):
+        if not value:
+            continue
+        try:
+            if len(value) == 10:
+                day = date.fromisoformat(value)
+                bound, operator = ((day + timedelta(days=1)).isoformat(), "<") if is_end else (day.isoformat(), ">=")
+            else:
+                moment = datetime.fromisoformat(value)
+                if moment.tzinfo is None:
+                    moment = moment.replace(tzinfo=timezone.utc)
+                bound, operator = moment.astimezone(timezone.utc).isoformat(), "<=" if is_end else ">="
+        except ValueError:
+            raise ValueError(f"Nieprawidłowa data: {value}") from None
+        clauses.append(f"{column} {operator} ?")
+        params.append(bound)
+    return clauses, params
+
+
 def _extract_score_data(steps: dict[str, Any]) -> tuple[Optional[float], Optional[str]]:
     score_data = steps.get("score", {})
     score = score_data.get("ocena", score_data.get("ocena_delegowanie"))
@@ -58,12 +98,106 @@ async def save_assessment(
     created_by: str,
     prompt_versions: Optional[dict[str, Any]] = None,
     run_name: str = "",
+    reassessed_from: Optional[int] = None,
+    created_at: Optional[str] = None,
 ) -> dict[str, Any]:
+    created_at = created_at or _now_iso()
+
+    async def write(conn) -> int:
+        return await _insert_assessment(
+            conn,
+            participant_id=participant_id,
+            run_name=run_name,
+            competency=competency,
+            steps=steps,
+            created_by=created_by,
+            prompt_versions=prompt_versions,
+            created_at=created_at,
+            reassessed_from=reassessed_from,
+        )
+
+    assessment_id = await run_write(write)
+
+    return {
+        "id": assessment_id,
+        "filename": f"session_{assessment_id}.json",
+        "saved_at": created_at,
+        "saved_by": created_by,
+    }
+
+
+async def save_assessments(records: list[dict[str, Any]]) -> list[int]:
+    """Zapis wielu ocen w jednej transakcji (zadania wsadowe, write-behind); rekord ma argumenty
+    save_assessment. Wiersze tabel zależnych wszystkich ocen idą jednym executemany na tabelę. Zwraca id ocen."""
+    now = _now_iso()
+    records = [
+        {
+            "participant_id": record["participant_id"],
+            "run_name": record.get("run_name", ""),
+            "competency": record["competency"],
+            "steps": record["steps"],
+            "created_by": record["created_by"],
+            "prompt_versions": record.get("prompt_versions"),
+            "created_at": record.get("created_at") or now,
+            "reassessed_from": record.get("reassessed_from"),
+        }
+        for record in records
+    ]
+
+    async def write(conn) -> list[int]:
+        return await _insert_assessments(conn, records)
+
+    return await run_write(write)
+
+
+# Stałe teksty zapytań - sqlite3 trzyma przygotowane instrukcje w cache połączenia (po tekście SQL)
+_INSERT_ASSESSMENT_SQL = """
+    INSERT INTO assessments (
+        participant_id, run_name, competency, response_text, response_text_hash, response_text_len, score, level,
+        created_at, created_by, llm_model, prompt_versions, total_tokens, total_cost_usd, reassessed_from
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_DIMENSION_SQL = """
+    INSERT INTO dimension_scores (
+        assessment_id, dimension, score, weight, points, justification, spread, samples
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_EVIDENCE_SQL = """
+    INSERT INTO evidence (assessment_id, dimension, citation, is_present)
+    VALUES (?, ?, ?, ?)
+"""
+_INSERT_FEEDBACK_SQL = """
+    INSERT INTO feedback (
+        assessment_id, summary, recommendation, strengths, development_areas
+    ) VALUES (?, ?, ?, ?, ?)
+"""
+_INSERT_STEP_SQL = """
+    INSERT INTO pipeline_steps (
+        assessment_id, step_name, input_data, output_data, prompt_used, prompt_version, duration_ms, created_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+ASSESSMENT_CHILD_INSERTS = (
+    ("dimension_scores", _INSERT_DIMENSION_SQL),
+    ("evidence", _INSERT_EVIDENCE_SQL),
+    ("feedback", _INSERT_FEEDBACK_SQL),
+    ("pipeline_steps", _INSERT_STEP_SQL),
+)
+
+
+def _assessment_row(
+    *,
+    participant_id: str,
+    run_name: str,
+    competency: str,
+    steps: dict[str, Any],
+    created_by: str,
+    prompt_versions: Optional[dict[str, Any]],
+    created_at: str,
+    reassessed_from: Optional[int] = None,
+) -> tuple[Any, ...]:
+    """Parametry wiersza assessments (_INSERT_ASSESSMENT_SQL) wyliczone z wyników etapów."""
     score, level = _extract_score_data(steps)
     parse_data = steps.get("parse", {})
-    map_data = steps.get("map", {})
-    score_data = steps.get("score", {})
-    feedback_data = steps.get("feedback", {})
 
     response_text = parse_data.get("raw_text") or steps.get("response_text") or ""
     llm_model = None
@@ -80,6 +214,9 @@ async def save_assessment(
     total_cost_usd = 0.0
     for step_name in ("parse", "map", "score", "feedback"):
         step_data = steps.get(step_name, {})
+        # Etap przeniesiony z poprzedniej oceny nie generował nowych kosztów
+        if step_data.get("_reused_from"):
+            continue
         usage = step_data.get("_usage")
         if usage:
             total_tokens += int(usage.get("total_tokens", 0))
@@ -89,117 +226,108 @@ async def save_assessment(
         elif isinstance(cost, (int, float)):
             total_cost_usd += float(cost)
 
-    created_at = _now_iso()
-    async with get_connection() as conn:
-        cursor = await conn.execute(
-            """
-            INSERT INTO assessments (
-                participant_id, run_name, competency, response_text, score, level, created_at, created_by,
-                llm_model, prompt_versions, total_tokens, total_cost_usd
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                participant_id,
-                run_name,
-                competency,
-                response_text,
-                score,
-                level,
-                created_at,
-                created_by,
-                llm_model,
-                _dumps(prompt_versions),
-                total_tokens,
-                total_cost_usd,
-            ),
+    return (
+        participant_id,
+        run_name,
+        competency,
+        response_text,
+        response_text_hash(response_text),
+        len(response_text),
+        score,
+        level,
+        created_at,
+        created_by,
+        llm_model,
+        _dumps(prompt_versions),
+        total_tokens,
+        total_cost_usd,
+        reassessed_from,
+    )
+
+
+def _assessment_child_rows(assessment_id: int, steps: dict[str, Any], created_at: str) -> dict[str, list[tuple[Any, ...]]]:
+    """Wiersze tabel zależnych oceny (klucze jak w ASSESSMENT_CHILD_INSERTS)."""
+    map_data = steps.get("map", {})
+    score_data = steps.get("score", {})
+    feedback_data = steps.get("feedback", {})
+
+    dimension_rows = [
+        (
+            assessment_id,
+            dimension,
+            dimension_data.get("ocena"),
+            dimension_data.get("waga"),
+            dimension_data.get("punkty"),
+            dimension_data.get("uzasadnienie"),
+            dimension_data.get("rozrzut"),
+            dimension_data.get("liczba_probek", 1),
         )
-        assessment_id = cursor.lastrowid
+        for dimension, dimension_data in score_data.get("dimension_scores", {}).items()
+    ]
+
+    evidence_rows = []
+    for dimension, evidence_data in map_data.get("evidence", {}).items():
+        is_present = 1 if evidence_data.get("czy_obecny") else 0
+        # Wymiar bez cytatów zapisywany jest z pustym cytatem (zachowuje czy_obecny)
+        for citation in evidence_data.get("znalezione_fragmenty", []) or [""]:
+            evidence_rows.append((assessment_id, dimension, citation, is_present))
+
+    feedback_rows = [(
+        assessment_id,
+        feedback_data.get("summary"),
+        feedback_data.get("recommendation"),
+        _dumps(feedback_data.get("mocne_strony", [])),
+        _dumps(feedback_data.get("obszary_rozwoju", [])),
+    )]
+
+    step_rows = []
+    timing = steps.get("timing") or {}
+    for step_name in ("parse", "map", "score", "feedback"):
+        output_data = steps.get(step_name)
+        if not output_data:
+            continue
+        prompt_data = output_data.get("_prompt")
+        prompt_meta = output_data.get("_prompt_meta", {})
+        step_rows.append((
+            assessment_id,
+            step_name,
+            None,
+            _dumps(output_data),
+            _dumps(prompt_data) if prompt_data else None,
+            prompt_meta.get("active_version"),
+            timing.get(f"{step_name}_ms"),
+            created_at,
+        ))
 
-        for dimension, dimension_data in score_data.get("dimension_scores", {}).items():
-            await conn.execute(
-                """
-                INSERT INTO dimension_scores (
-                    assessment_id, dimension, score, weight, points, justification
-                ) VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    assessment_id,
-                    dimension,
-                    dimension_data.get("ocena"),
-                    dimension_data.get("waga"),
-                    dimension_data.get("punkty"),
-                    dimension_data.get("uzasadnienie"),
-                ),
-            )
+    return {
+        "dimension_scores": dimension_rows,
+        "evidence": evidence_rows,
+        "feedback": feedback_rows,
+        "pipeline_steps": step_rows,
+    }
 
-        for dimension, evidence_data in map_data.get("evidence", {}).items():
-            citations = evidence_data.get("znalezione_fragmenty", [])
-            is_present = 1 if evidence_data.get("czy_obecny") else 0
-            if citations:
-                for citation in citations:
-                    await conn.execute(
-                        """
-                        INSERT INTO evidence (assessment_id, dimension, citation, is_present)
-                        VALUES (?, ?, ?, ?)
-                        """,
-                        (assessment_id, dimension, citation, is_present),
-                    )
-            else:
-                await conn.execute(
-                    """
-                    INSERT INTO evidence (assessment_id, dimension, citation, is_present)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (assessment_id, dimension, "", is_present),
-                )
 
-        await conn.execute(
-            """
-            INSERT INTO feedback (
-                assessment_id, summary, recommendation, strengths, development_areas
-            ) VALUES (?, ?, ?, ?, ?)
-            """,
-            (
-                assessment_id,
-                feedback_data.get("summary"),
-                feedback_data.get("recommendation"),
-                _dumps(feedback_data.get("mocne_strony", [])),
-                _dumps(feedback_data.get("obszary_rozwoju", [])),
-            ),
-        )
+async def _insert_assessments(conn, records: list[dict[str, Any]]) -> list[int]:
+    """Zapis ocen ze wszystkimi tabelami zależnymi na podanym połączeniu (bez commit - w operacji run_write).
+    Wiersz assessments wstawiany jest osobno (potrzebne id), wiersze zależnych tabel - executemany na tabelę."""
+    assessment_ids = []
+    child_rows: dict[str, list[tuple[Any, ...]]] = {table: [] for table, _ in ASSESSMENT_CHILD_INSERTS}
+    for record in records:
+        cursor = await conn.execute(_INSERT_ASSESSMENT_SQL, _assessment_row(**record))
+        assessment_ids.append(cursor.lastrowid)
+        for table, rows in _assessment_child_rows(cursor.lastrowid, record["steps"], record["created_at"]).items():
+            child_rows[table].extend(rows)
 
-        for step_name in ("parse", "map", "score", "feedback"):
-            output_data = steps.get(step_name)
-            if not output_data:
-                continue
-            prompt_data = output_data.get("_prompt")
-            prompt_meta = output_data.get("_prompt_meta", {})
-            await conn.execute(
-                """
-                INSERT INTO pipeline_steps (
-                    assessment_id, step_name, input_data, output_data, prompt_used, prompt_version, duration_ms, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    assessment_id,
-                    step_name,
-                    None,
-                    _dumps(output_data),
-                    _dumps(prompt_data) if prompt_data else None,
-                    prompt_meta.get("active_version"),
-                    None,
-                    created_at,
-                ),
-            )
+    for table, sql in ASSESSMENT_CHILD_INSERTS:
+        if child_rows[table]:
+            await conn.executemany(sql, child_rows[table])
+    return assessment_ids
 
-        await conn.commit()
 
-    return {
-        "id": assessment_id,
-        "filename": f"session_{assessment_id}.json",
-        "saved_at": created_at,
-        "saved_by": created_by,
-    }
+async def _insert_assessment(conn, **record: Any) -> int:
+    """Zapis jednej oceny (argumenty jak _assessment_row) na podanym połączeniu, bez commit."""
+    record.setdefault("reassessed_from", None)
+    return (await _insert_assessments(conn, [record]))[0]
 
 
 async def save_run(
@@ -214,12 +342,13 @@ async def save_run(
     prompt = run.get("_prompt")
     prompt_meta = run.get("_prompt_meta", {})
 
-    async with get_connection() as conn:
+    async def write(conn) -> int:
         cursor = await conn.execute(
             """
             INSERT INTO pipeline_steps (
-                assessment_id, step_name, input_data, output_data, prompt_used, prompt_version, duration_ms, created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                assessment_id, step_name, input_data, output_data, prompt_used, prompt_version, duration_ms, created_at,
+                module, participant_id, competency, saved_by
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 None,
@@ -236,10 +365,15 @@ async def save_run(
                 prompt_meta.get("active_version"),
                 None,
                 created_at,
+                module,
+                participant_id,
+                competency,
+                saved_by,
             ),
         )
-        run_id = cursor.lastrowid
-        await conn.commit()
+        return cursor.lastrowid
+
+    run_id = await run_write(write)
 
     return {
         "id": run_id,
@@ -252,36 +386,70 @@ async def save_run(
     }
 
 
-async def list_runs(competency: Optional[str] = None, module: Optional[str] = None) -> list[dict[str, Any]]:
-    async with get_connection() as conn:
-        rows = await conn.execute_fetchall(
-            """
-            SELECT id, step_name, input_data, created_at
-            FROM pipeline_steps
-            WHERE step_name LIKE 'run:%'
-            ORDER BY id DESC
-            """
-        )
+async def list_runs(
+    competency: Optional[str] = None,
+    module: Optional[str] = None,
+    participant_id: Optional[str] = None,
+    limit: int = 1000,
+) -> list[dict[str, Any]]:
+    items, _ = await list_runs_page(competency=competency, module=module, participant_id=participant_id, limit=limit)
+    return items
 
-    result: list[dict[str, Any]] = []
-    for row in rows:
-        module_name = row["step_name"].replace("run:", "", 1)
-        input_data = _loads(row["input_data"], {})
-        if competency and input_data.get("competency") != competency:
-            continue
-        if module and module_name != module:
-            continue
-        result.append(
-            {
-                "filename": f"run_{row['id']}.json",
-                "saved_at": row["created_at"],
-                "saved_by": input_data.get("saved_by"),
-                "participant_id": input_data.get("participant_id"),
-                "competency": input_data.get("competency"),
-                "module": module_name,
-            }
-        )
-    return result
+
+async def list_runs_page(
+    competency: Optional[str] = None,
+    module: Optional[str] = None,
+    participant_id: Optional[str] = None,
+    limit: int = 1000,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> tuple[list[dict[str, Any]], Optional[str]]:
+    """Strona zapisanych runów od najnowszych (keyset po id) i kursor następnej strony."""
+    # Runy to wiersze pipeline_steps z kolumną module (indeksy częściowe WHERE module IS NOT NULL)
+    query = """
+        SELECT id, module, participant_id, competency, saved_by, created_at
+        FROM pipeline_steps
+        WHERE module IS NOT NULL
+    """
+    params: list[Any] = []
+    if competency:
+        query += " AND competency = ?"
+        params.append(competency)
+    if module:
+        query += " AND module = ?"
+        params.append(module)
+    if participant_id:
+        query += " AND participant_id = ?"
+        params.append(participant_id)
+    date_clauses, date_params = _date_filters("created_at", date_from, date_to)
+    for clause in date_clauses:
+        query += f" AND {clause}"
+    params.extend(date_params)
+    if cursor:
+        query += " AND id < ?"
+        params.extend(decode_cursor(cursor, 1))
+
+    page_size = max(1, min(limit, 1000))
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(page_size + 1)
+
+    async with get_connection(read_only=True) as conn:
+        rows = await conn.execute_fetchall(query, tuple(params))
+
+    next_cursor = encode_cursor([rows[page_size - 1]["id"]]) if len(rows) > page_size else None
+    items = [
+        {
+            "filename": f"run_{row['id']}.json",
+            "saved_at": row["created_at"],
+            "saved_by": row["saved_by"],
+            "participant_id": row["participant_id"],
+            "competency": row["competency"],
+            "module": row["module"],
+        }
+        for row in rows[:page_size]
+    ]
+    return items, next_cursor
 
 
 async def get_run_by_ref(run_ref: str) -> Optional[dict[str, Any]]:
@@ -289,13 +457,13 @@ async def get_run_by_ref(run_ref: str) -> Optional[dict[str, Any]]:
     if run_id is None:
         return None
 
-    async with get_connection() as conn:
+    async with get_connection(read_only=True) as conn:
         row = await _fetchone(
             conn,
             """
-            SELECT id, step_name, input_data, output_data, created_at
+            SELECT id, module, participant_id, competency, saved_by, output_data, created_at
             FROM pipeline_steps
-            WHERE id = ? AND step_name LIKE 'run:%'
+            WHERE id = ? AND module IS NOT NULL
             """,
             (run_id,),
         )
@@ -303,16 +471,13 @@ async def get_run_by_ref(run_ref: str) -> Optional[dict[str, Any]]:
     if not row:
         return None
 
-    input_data = _loads(row["input_data"], {})
-    run_data = _loads(row["output_data"], {})
-    module_name = row["step_name"].replace("run:", "", 1)
     return {
         "saved_at": row["created_at"],
-        "saved_by": input_data.get("saved_by"),
-        "participant_id": input_data.get("participant_id"),
-        "competency": input_data.get("competency"),
-        "module": module_name,
-        "run": run_data,
+        "saved_by": row["saved_by"],
+        "participant_id": row["participant_id"],
+        "competency": row["competency"],
+        "module": row["module"],
+        "run": _loads(row["output_data"], {}),
     }
 
 
@@ -320,10 +485,31 @@ async def list_assessments(
     competency: Optional[str] = None,
     participant_id: Optional[str] = None,
     limit: int = 200,
+    text_hash: Optional[str] = None,
 ) -> list[dict[str, Any]]:
+    items, _ = await list_assessments_page(
+        competency=competency, participant_id=participant_id, limit=limit, text_hash=text_hash
+    )
+    return items
+
+
+async def list_assessments_page(
+    competency: Optional[str] = None,
+    participant_id: Optional[str] = None,
+    limit: int = 200,
+    text_hash: Optional[str] = None,
+    llm_model: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    score_min: Optional[float] = None,
+    score_max: Optional[float] = None,
+    cursor: Optional[str] = None,
+) -> tuple[list[dict[str, Any]], Optional[str]]:
+    """Strona listy ocen od najnowszych (keyset po created_at, id) i kursor następnej strony (None = koniec).
+    Filtry kompetencji, uczestnika i modelu mają indeksy złożone (kolumna, created_at, id)."""
     query = """
-        SELECT id, participant_id, run_name, competency, response_text, score, level, created_at, created_by, llm_model,
-               total_tokens, total_cost_usd
+        SELECT id, participant_id, run_name, competency, response_text_hash, response_text_len, score, level,
+               created_at, created_by, llm_model, total_tokens, total_cost_usd, reassessed_from
         FROM assessments
         WHERE 1 = 1
     """
@@ -334,18 +520,37 @@ async def list_assessments(
     if participant_id:
         query += " AND participant_id = ?"
         params.append(participant_id)
-
-    safe_limit = max(1, min(limit, 1000))
-    query += " ORDER BY id DESC LIMIT ?"
-    params.append(safe_limit)
-
-    async with get_connection() as conn:
+    if llm_model:
+        query += " AND llm_model = ?"
+        params.append(llm_model)
+    if text_hash:
+        # Oceny tego samego tekstu odpowiedzi (indeks idx_assessments_text_hash)
+        query += " AND response_text_hash = ?"
+        params.append(text_hash)
+    if score_min is not None:
+        query += " AND score >= ?"
+        params.append(score_min)
+    if score_max is not None:
+        query += " AND score <= ?"
+        params.append(score_max)
+    date_clauses, date_params = _date_filters("created_at", date_from, date_to)
+    for clause in date_clauses:
+        query += f" AND {clause}"
+    params.extend(date_params)
+    if cursor:
+        query += " AND (created_at, id) < (?, ?)"
+        params.extend(decode_cursor(cursor, 2))
+
+    page_size = max(1, min(limit, 1000))
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(page_size + 1)
+
+    async with get_connection(read_only=True) as conn:
         rows = await conn.execute_fetchall(query, tuple(params))
 
+    next_cursor = encode_cursor([rows[page_size - 1]["created_at"], rows[page_size - 1]["id"]]) if len(rows) > page_size else None
     result = []
-    for row in rows:
-        text = row["response_text"] or ""
-        text_hash = hashlib.md5(text.encode()).hexdigest()[:12] if text else ""
+    for row in rows[:page_size]:
         result.append({
             "id": row["id"],
             "filename": f"session_{row['id']}.json",
@@ -359,19 +564,20 @@ async def list_assessments(
             "llm_model": row["llm_model"],
             "total_tokens": row["total_tokens"] or 0,
             "total_cost_usd": row["total_cost_usd"] or 0.0,
-            "response_text_hash": text_hash,
-            "response_text_len": len(text),
+            "reassessed_from": row["reassessed_from"],
+            "response_text_hash": row["response_text_hash"] or "",
+            "response_text_len": row["response_text_len"] or 0,
         })
-    return result
+    return result, next_cursor
 
 
 async def get_assessment_by_id(assessment_id: int) -> Optional[dict[str, Any]]:
-    async with get_connection() as conn:
+    async with get_connection(read_only=True) as conn:
         assessment = await _fetchone(
             conn,
             """
             SELECT id, participant_id, competency, response_text, score, level, created_at, created_by,
-                   llm_model, prompt_versions, total_tokens, total_cost_usd
+                   llm_model, prompt_versions, total_tokens, total_cost_usd, reassessed_from
             FROM assessments
             WHERE id = ?
             """,
@@ -382,7 +588,7 @@ async def get_assessment_by_id(assessment_id: int) -> Optional[dict[str, Any]]:
 
         dimension_rows = await conn.execute_fetchall(
             """
-            SELECT dimension, score, weight, points, justification
+            SELECT dimension, score, weight, points, justification, spread, samples
             FROM dimension_scores
             WHERE assessment_id = ?
             ORDER BY id ASC
@@ -425,6 +631,8 @@ async def get_assessment_by_id(assessment_id: int) -> Optional[dict[str, Any]]:
             "waga": row["weight"],
             "punkty": row["points"],
             "uzasadnienie": row["justification"],
+            "rozrzut": row["spread"],
+            "liczba_probek": row["samples"] if row["samples"] is not None else 1,
         }
 
     evidence_map: dict[str, list[str]] = {}
@@ -452,6 +660,8 @@ async def get_assessment_by_id(assessment_id: int) -> Optional[dict[str, Any]]:
     if total_tokens == 0 or total_cost_usd == 0.0:
         for step_name in ("parse", "map", "score", "feedback"):
             step_data = steps.get(step_name, {})
+            if step_data.get("_reused_from"):
+                continue
             usage = step_data.get("_usage")
             if usage:
                 total_tokens += int(usage.get("total_tokens", 0))
@@ -474,6 +684,7 @@ async def get_assessment_by_id(assessment_id: int) -> Optional[dict[str, Any]]:
         "level": assessment["level"],
         "llm_model": assessment["llm_model"],
         "prompt_versions": _loads(assessment["prompt_versions"], {}),
+        "reassessed_from": assessment["reassessed_from"],
         "total_tokens": total_tokens,
         "total_cost_usd": total_cost_usd,
         "usage_per_step": usage_per_step,
@@ -516,6 +727,8 @@ def _extract_session_compare_data(session: dict[str, Any]) -> dict[str, Any]:
         # Przelicz z kroków pipeline
         for step_name in ("parse", "map", "score", "feedback"):
             step_data = steps.get(step_name, {})
+            if step_data.get("_reused_from"):
+                continue
             usage = step_data.get("_usage")
             if usage:
                 total_tokens += int(usage.get("total_tokens", 0))
@@ -613,7 +826,7 @@ async def compare_assessments(a_ref: str, b_ref: str) -> Optional[dict[str, Any]
 
 
 async def delete_assessment(assessment_id: int) -> bool:
-    async with get_connection() as conn:
+    async def write(conn) -> bool:
         row = await _fetchone(conn, "SELECT id FROM assessments WHERE id = ?", (assessment_id,))
         if not row:
             return False
@@ -623,9 +836,9 @@ async def delete_assessment(assessment_id: int) -> bool:
         await conn.execute("DELETE FROM feedback WHERE assessment_id = ?", (assessment_id,))
         await conn.execute("DELETE FROM pipeline_steps WHERE assessment_id = ?", (assessment_id,))
         await conn.execute("DELETE FROM assessments WHERE id = ?", (assessment_id,))
-        await conn.commit()
+        return True
 
-    return True
+    return await run_write(write)
 
 
 async def delete_assessment_by_ref(assessment_ref: str) -> bool:
@@ -636,7 +849,7 @@ async def delete_assessment_by_ref(assessment_ref: str) -> bool:
 
 
 async def get_assessment_stats() -> dict[str, Any]:
-    async with get_connection() as conn:
+    async with get_connection(read_only=True) as conn:
         total_row = await _fetchone(conn, "SELECT COUNT(*) AS count FROM assessments")
         average_row = await _fetchone(conn, "SELECT AVG(score) AS avg_score FROM assessments")
         competency_rows = await conn.execute_fetchall(
@@ -662,3 +875,418 @@ async def get_assessment_stats() -> dict[str, Any]:
         ],
         "latest_assessment_at": latest_row["created_at"] if latest_row else None,
     }
+
+
+# ---------------------------------------------------------------------------
+# Pipeline runs - wyniki etapów przechowywane po stronie serwera
+# ---------------------------------------------------------------------------
+
+async def create_pipeline_run(
+    *,
+    participant_id: str,
+    competency: str,
+    response_text: str,
+    created_by: str,
+    input_sections: Optional[dict[str, str]] = None,
+    parent_run_id: Optional[str] = None,
+) -> dict[str, Any]:
+    run_id = uuid.uuid4().hex
+    created_at = _now_iso()
+
+    async def write(conn) -> None:
+        await conn.execute(
+            """
+            INSERT INTO pipeline_runs (
+                id, participant_id, competency, response_text, input_sections, parent_run_id,
+                created_by, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                run_id,
+                participant_id,
+                competency,
+                response_text,
+                _dumps(input_sections) if input_sections else None,
+                parent_run_id,
+                created_by,
+                created_at,
+                created_at,
+            ),
+        )
+
+    await run_write(write)
+
+    return {
+        "id": run_id,
+        "participant_id": participant_id,
+        "competency": competency,
+        "parent_run_id": parent_run_id,
+        "created_by": created_by,
+        "created_at": created_at,
+        "stages": [],
+    }
+
+
+async def get_pipeline_run(run_id: str) -> Optional[dict[str, Any]]:
+    async with get_connection(read_only=True) as conn:
+        row = await _fetchone(conn, "SELECT * FROM pipeline_runs WHERE id = ?", (run_id,))
+        if not row:
+            return None
+        stage_rows = await conn.execute_fetchall(
+            "SELECT stage, output_data, duration_ms, created_at FROM pipeline_run_stages WHERE run_id = ?",
+            (run_id,),
+        )
+
+    return {
+        "id": row["id"],
+        "participant_id": row["participant_id"],
+        "competency": row["competency"],
+        "response_text": row["response_text"],
+        "input_sections": _loads(row["input_sections"], None),
+        "parent_run_id": row["parent_run_id"],
+        "assessment_id": row["assessment_id"],
+        "created_by": row["created_by"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "stages": {stage_row["stage"]: _loads(stage_row["output_data"], {}) for stage_row in stage_rows},
+        "timing": {f"{stage_row['stage']}_ms": stage_row["duration_ms"] for stage_row in stage_rows},
+    }
+
+
+async def save_pipeline_stage(
+    run_id: str,
+    stage: str,
+    output: dict[str, Any],
+    duration_ms: Optional[int],
+    invalidate: list[str],
+) -> None:
+    """Zapisuje wynik etapu i usuwa wyniki etapów zależnych (ich wejście się zmieniło)."""
+    updated_at = _now_iso()
+
+    async def write(conn) -> None:
+        await conn.execute(
+            """
+            INSERT OR REPLACE INTO pipeline_run_stages (run_id, stage, output_data, duration_ms, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (run_id, stage, _dumps(output), duration_ms, updated_at),
+        )
+        if invalidate:
+            placeholders = ", ".join("?" for _ in invalidate)
+            await conn.execute(
+                f"DELETE FROM pipeline_run_stages WHERE run_id = ? AND stage IN ({placeholders})",
+                (run_id, *invalidate),
+            )
+        await conn.execute(
+            "UPDATE pipeline_runs SET updated_at = ?, assessment_id = NULL WHERE id = ?",
+            (updated_at, run_id),
+        )
+
+    await run_write(write)
+
+
+async def save_pipeline_stages(run_id: str, stages: dict[str, tuple[dict[str, Any], Optional[int]]]) -> None:
+    """Zapisuje wyniki kilku etapów naraz (stage -> (wynik, czas ms)) w jednej transakcji."""
+    updated_at = _now_iso()
+
+    async def write(conn) -> None:
+        await conn.executemany(
+            """
+            INSERT OR REPLACE INTO pipeline_run_stages (run_id, stage, output_data, duration_ms, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(run_id, stage, _dumps(output), duration_ms, updated_at) for stage, (output, duration_ms) in stages.items()],
+        )
+        await conn.execute("UPDATE pipeline_runs SET updated_at = ? WHERE id = ?", (updated_at, run_id))
+
+    await run_write(write)
+
+
+async def list_pipeline_runs(created_by: Optional[str] = None, limit: int = 100) -> list[dict[str, Any]]:
+    query = """
+        SELECT r.id, r.participant_id, r.competency, r.assessment_id, r.created_by, r.created_at, r.updated_at,
+               GROUP_CONCAT(s.stage) AS stages
+        FROM pipeline_runs r
+        LEFT JOIN pipeline_run_stages s ON s.run_id = r.id
+    """
+    params: list[Any] = []
+    if created_by:
+        query += " WHERE r.created_by = ?"
+        params.append(created_by)
+    query += " GROUP BY r.id ORDER BY r.created_at DESC LIMIT ?"
+    params.append(limit)
+
+    async with get_connection(read_only=True) as conn:
+        rows = await conn.execute_fetchall(query, tuple(params))
+
+    return [
+        {
+            "id": row["id"],
+            "participant_id": row["participant_id"],
+            "competency": row["competency"],
+            "assessment_id": row["assessment_id"],
+            "created_by": row["created_by"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "stages": [stage for stage in ("parse", "map", "score", "feedback") if stage in (row["stages"] or "").split(",")],
+        }
+        for row in rows
+    ]
+
+
+async def save_pipeline_run_assessment(
+    run: dict[str, Any],
+    *,
+    created_by: str,
+    prompt_versions: Optional[dict[str, Any]] = None,
+    run_name: str = "",
+) -> dict[str, Any]:
+    """Zapisuje run jako ocenę (assessments + tabele zależne) w jednej transakcji."""
+    created_at = _now_iso()
+    steps = {
+        "response_text": run["response_text"],
+        **run["stages"],
+        "timing": run.get("timing", {}),
+    }
+
+    async def write(conn) -> int:
+        assessment_id = await _insert_assessment(
+            conn,
+            participant_id=run["participant_id"],
+            run_name=run_name,
+            competency=run["competency"],
+            steps=steps,
+            created_by=created_by,
+            prompt_versions=prompt_versions,
+            created_at=created_at,
+        )
+        await conn.execute(
+            "UPDATE pipeline_runs SET assessment_id = ?, updated_at = ? WHERE id = ?",
+            (assessment_id, created_at, run["id"]),
+        )
+        return assessment_id
+
+    assessment_id = await run_write(write)
+
+    return {
+        "id": assessment_id,
+        "filename": f"session_{assessment_id}.json",
+        "saved_at": created_at,
+        "saved_by": created_by,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Zadania w tle (np. ponowna ocena wielu assessmentów)
+# ---------------------------------------------------------------------------
+
+_JOB_FIELDS = ("status", "total", "done", "failed", "skipped", "result", "error", "status_reason")
+_JOB_ACTIVE_STATUSES = ("queued", "waiting", "paused", "running")
+
+
+def _job_row_to_dict(row, include_items: bool = False) -> dict[str, Any]:
+    job = {
+        "id": row["id"],
+        "kind": row["kind"],
+        "params": _loads(row["params"], {}),
+        "schedule": _loads(row["schedule"], None),
+        "status": row["status"],
+        "status_reason": row["status_reason"],
+        "total": row["total"],
+        "done": row["done"],
+        "failed": row["failed"],
+        "skipped": row["skipped"],
+        "result": _loads(row["result"], None),
+        "error": row["error"],
+        "lease_owner": row["lease_owner"],
+        "lease_until": row["lease_until"],
+        "created_by": row["created_by"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+    if include_items:
+        job["items"] = _loads(row["items"], [])
+    return job
+
+
+async def create_job(
+    *,
+    kind: str,
+    params: dict[str, Any],
+    items: list[Any],
+    created_by: str,
+    schedule: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    job_id = uuid.uuid4().hex
+    created_at = _now_iso()
+
+    async def write(conn):
+        await conn.execute(
+            """
+            INSERT INTO background_jobs
+                (id, kind, params, schedule, items, status, total, created_by, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+            """,
+            (job_id, kind, _dumps(params), _dumps(schedule) if schedule else None, _dumps(items),
+             len(items), created_by, created_at, created_at),
+        )
+        return await _fetchone(conn, "SELECT * FROM background_jobs WHERE id = ?", (job_id,))
+
+    return _job_row_to_dict(await run_write(write))
+
+
+async def update_job(job_id: str, **fields: Any) -> None:
+    unknown = set(fields) - set(_JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"Nieznane pola zadania: {sorted(unknown)}")
+    if "result" in fields:
+        fields["result"] = _dumps(fields["result"])
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+
+    async def write(conn) -> None:
+        await conn.execute(
+            f"UPDATE background_jobs SET {assignments}, updated_at = ? WHERE id = ?",
+            (*fields.values(), _now_iso(), job_id),
+        )
+
+    await run_write(write)
+
+
+async def save_job_item_result(job_id: str, entry: dict[str, Any], **counters: Any) -> None:
+    """Punkt kontrolny jednego elementu: jego wynik i liczniki zadania w jednej transakcji
+    (zapis nie rośnie z liczbą przetworzonych elementów, w przeciwieństwie do update_job(result=...))."""
+    unknown = set(counters) - {"done", "failed", "skipped"}
+    if unknown:
+        raise ValueError(f"Nieznane liczniki zadania: {sorted(unknown)}")
+    assignments = "".join(f", {name} = ?" for name in counters)
+
+    async def write(conn) -> None:
+        await conn.execute(
+            "INSERT OR REPLACE INTO background_job_results (job_id, item_index, entry) VALUES (?, ?, ?)",
+            (job_id, entry["index"], _dumps(entry)),
+        )
+        await conn.execute(
+            f"UPDATE background_jobs SET updated_at = ?{assignments} WHERE id = ?",
+            (_now_iso(), *counters.values(), job_id),
+        )
+
+    await run_write(write)
+
+
+async def _attach_job_results(conn, jobs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Uzupełnia `result` zadań o wyniki elementów z background_job_results (kolejność wg indeksu).
+    Wyniki zapisane wcześniej w kolumnie result (zadania sprzed tabeli) są zachowane."""
+    if not jobs:
+        return jobs
+    rows = await conn.execute_fetchall(
+        f"""
+        SELECT job_id, entry FROM background_job_results
+        WHERE job_id IN ({", ".join("?" * len(jobs))})
+        ORDER BY job_id, item_index
+        """,
+        tuple(job["id"] for job in jobs),
+    )
+    entries: dict[str, list[dict[str, Any]]] = {}
+    for row in rows:
+        entries.setdefault(row["job_id"], []).append(_loads(row["entry"], {}))
+    for job in jobs:
+        if job["id"] in entries:
+            merged = (job["result"] or []) + entries[job["id"]]
+            job["result"] = sorted(merged, key=lambda entry: entry.get("index", -1))
+    return jobs
+
+
+async def claim_job(job_id: str, owner: str, lease_seconds: int) -> Optional[dict[str, Any]]:
+    """Atomowo przejmuje zadanie (dzierżawa w bazie - jeden worker na zadanie).
+    Udaje się, gdy zadanie jest aktywne i nie ma ważnej dzierżawy innego workera."""
+    now = datetime.now(timezone.utc)
+    until = datetime.fromtimestamp(now.timestamp() + lease_seconds, timezone.utc).isoformat()
+
+    async def write(conn):
+        cursor = await conn.execute(
+            f"""
+            UPDATE background_jobs SET lease_owner = ?, lease_until = ?, updated_at = ?
+            WHERE id = ? AND status IN ({", ".join("?" * len(_JOB_ACTIVE_STATUSES))})
+              AND (lease_owner IS NULL OR lease_owner = ? OR lease_until < ?)
+            """,
+            (owner, until, now.isoformat(), job_id, *_JOB_ACTIVE_STATUSES, owner, now.isoformat()),
+        )
+        if cursor.rowcount == 0:
+            return None
+        row = await _fetchone(conn, "SELECT * FROM background_jobs WHERE id = ?", (job_id,))
+        return (await _attach_job_results(conn, [_job_row_to_dict(row, include_items=True)]))[0]
+
+    return await run_write(write)
+
+
+async def renew_job_lease(job_id: str, owner: str, lease_seconds: int) -> bool:
+    until = datetime.fromtimestamp(datetime.now(timezone.utc).timestamp() + lease_seconds, timezone.utc).isoformat()
+
+    async def write(conn) -> bool:
+        cursor = await conn.execute(
+            "UPDATE background_jobs SET lease_until = ? WHERE id = ? AND lease_owner = ?",
+            (until, job_id, owner),
+        )
+        return cursor.rowcount > 0
+
+    return await run_write(write)
+
+
+async def release_job_lease(job_id: str, owner: str) -> None:
+    async def write(conn) -> None:
+        await conn.execute(
+            "UPDATE background_jobs SET lease_owner = NULL, lease_until = NULL WHERE id = ? AND lease_owner = ?",
+            (job_id, owner),
+        )
+
+    await run_write(write)
+
+
+async def list_schedulable_jobs() -> list[dict[str, Any]]:
+    """Aktywne zadania bez ważnej dzierżawy (oczekujące, wstrzymane lub osierocone po awarii workera)."""
+    now = _now_iso()
+    async with get_connection(read_only=True) as conn:
+        rows = await conn.execute_fetchall(
+            f"""
+            SELECT * FROM background_jobs
+            WHERE status IN ({", ".join("?" * len(_JOB_ACTIVE_STATUSES))})
+              AND (lease_owner IS NULL OR lease_until < ?)
+            ORDER BY created_at ASC
+            """,
+            (*_JOB_ACTIVE_STATUSES, now),
+        )
+    return [_job_row_to_dict(row) for row in rows]
+
+
+async def list_active_jobs() -> list[dict[str, Any]]:
+    async with get_connection(read_only=True) as conn:
+        rows = await conn.execute_fetchall(
+            f"""
+            SELECT * FROM background_jobs
+            WHERE status IN ({", ".join("?" * len(_JOB_ACTIVE_STATUSES))})
+            ORDER BY created_at ASC
+            """,
+            _JOB_ACTIVE_STATUSES,
+        )
+    return [_job_row_to_dict(row) for row in rows]
+
+
+async def get_job(job_id: str) -> Optional[dict[str, Any]]:
+    async with get_connection(read_only=True) as conn:
+        row = await _fetchone(conn, "SELECT * FROM background_jobs WHERE id = ?", (job_id,))
+        if not row:
+            return None
+        return (await _attach_job_results(conn, [_job_row_to_dict(row)]))[0]
+
+
+async def list_jobs(kind: Optional[str] = None, limit: int = 50) -> list[dict[str, Any]]:
+    query = "SELECT * FROM background_jobs"
+    params: list[Any] = []
+    if kind:
+        query += " WHERE kind = ?"
+        params.append(kind)
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(max(1, min(limit, 500)))
+    async with get_connection(read_only=True) as conn:
+        rows = await conn.execute_fetchall(query, tuple(params))
+        return await _attach_job_results(conn, [_job_row_to_dict(row) for row in rows])
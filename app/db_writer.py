@@ -0,0 +1,197 @@
+"""
+Jeden zapisujący do SQLite na proces.
+Wszystkie zapisy (db_models, próbki odpowiedzi) trafiają do kolejki jako operacje `async (conn) -> wynik`;
+task zapisujący grupuje oczekujące operacje w jedną transakcję (BEGIN IMMEDIATE ... COMMIT), każdą
+w osobnym SAVEPOINT - błąd jednej operacji wycofuje tylko ją. Wywołujący czeka na własny future.
+
+Między workerami gunicorna zapisy koordynuje blokada pliku `<baza>.writer.lock` (fcntl) trzymana
+przez czas transakcji, więc workery czekają w kolejce na blokadę zamiast trafiać na "database is
+locked" po busy_timeout. Odczyty nie przechodzą przez kolejkę - korzystają z puli (get_connection).
+
+Operacja nie może sama wołać run_write ani get_connection() do zapisu (połączenie zapisujące
+jest zajęte przez task) i nie wywołuje commit.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import app.database as database
+
+try:
+    import fcntl
+except ImportError:  # Windows (dev) - pozostaje BEGIN IMMEDIATE + busy_timeout
+    fcntl = None
+
+logger = logging.getLogger("lem.db_writer")
+
+DEFAULT_MAX_BATCH = 64
+
+WriteOp = Callable[[Any], Awaitable[Any]]
+
+
+class _FileLock:
+    """Blokada międzyprocesowa na pliku obok bazy."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644) if fcntl else None
+
+    async def acquire(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Inny worker zapisuje - czekaj w wątku, nie blokując pętli
+            await asyncio.to_thread(fcntl.flock, self._fd, fcntl.LOCK_EX)
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class DbWriter:
+    """Kolejka operacji zapisu z jednym taskiem wykonującym je partiami w transakcjach."""
+
+    def __init__(self, max_batch: Optional[int] = None):
+        if max_batch is None:
+            max_batch = int(os.getenv("LEM_DB_WRITER_MAX_BATCH", str(DEFAULT_MAX_BATCH)))
+        self.max_batch = max(1, max_batch)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[_FileLock] = None
+        self.ops = 0
+        self.failed = 0
+        self.batches = 0
+        self.lock_wait_ms_total = 0.0
+        self.lock_wait_ms_max = 0.0
+        self.commit_ms_total = 0.0
+        self.commit_ms_max = 0.0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Kolejka i task są związane z pętlą zdarzeń (testy tworzą nową pętlę na test)
+            self._loop, self._queue, self._task = loop, asyncio.Queue(), None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._queue
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Wykonuje operację zapisu w najbliższej transakcji i zwraca jej wynik (lub rzuca jej wyjątek)."""
+        queue = self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((op, future))
+        return await future
+
+    def _file_lock(self) -> _FileLock:
+        path = database.DB_PATH.as_posix() + ".writer.lock"
+        if self._lock is None or self._lock.path != path:
+            if self._lock is not None:
+                self._lock.close()
+            database.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+            self._lock = _FileLock(path)
+        return self._lock
+
+    async def _run(self) -> None:
+        # Task kończy się, gdy kolejka jest pusta - submit uruchamia go ponownie
+        queue = self._queue
+        while not queue.empty():
+            batch = [queue.get_nowait()]
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            # Anulowani wywołujący nie potrzebują już wyniku
+            batch = [(op, future) for op, future in batch if not future.done()]
+            if batch:
+                await self._execute(batch)
+
+    async def _execute(self, batch: list[tuple[WriteOp, asyncio.Future]]) -> None:
+        lock = self._file_lock()
+        locked = False
+        results: list[tuple[asyncio.Future, bool, Any]] = []
+        try:
+            started = time.perf_counter()
+            await lock.acquire()
+            locked = True
+            lock_wait_ms = (time.perf_counter() - started) * 1000
+            async with database.get_connection() as conn:
+                await conn.execute("BEGIN IMMEDIATE")
+                for index, (op, future) in enumerate(batch):
+                    savepoint = f"op_{index}"
+                    await conn.execute(f"SAVEPOINT {savepoint}")
+                    try:
+                        result = await op(conn)
+                    except Exception as exc:
+                        await conn.execute(f"ROLLBACK TO {savepoint}")
+                        results.append((future, False, exc))
+                    else:
+                        results.append((future, True, result))
+                    await conn.execute(f"RELEASE {savepoint}")
+                commit_started = time.perf_counter()
+                await conn.commit()
+                commit_ms = (time.perf_counter() - commit_started) * 1000
+        except Exception as exc:
+            logger.exception("Transakcja zapisu (%d operacji) nieudana", len(batch))
+            self.failed += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            if locked:
+                lock.release()
+
+        self.batches += 1
+        self.ops += len(batch)
+        self.lock_wait_ms_total += lock_wait_ms
+        self.lock_wait_ms_max = max(self.lock_wait_ms_max, lock_wait_ms)
+        self.commit_ms_total += commit_ms
+        self.commit_ms_max = max(self.commit_ms_max, commit_ms)
+        for future, ok, value in results:
+            if not ok:
+                self.failed += 1
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def stop(self) -> None:
+        """Czeka na wykonanie operacji już zakolejkowanych (shutdown workera)."""
+        task, self._task = self._task, None
+        if task is not None and not task.done() and self._loop is asyncio.get_running_loop():
+            await task
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "ops": self.ops,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch_size": round(self.ops / self.batches, 1) if self.batches else 0.0,
+            "avg_lock_wait_ms": round(self.lock_wait_ms_total / self.batches, 2) if self.batches else 0.0,
+            "max_lock_wait_ms": round(self.lock_wait_ms_max, 1),
+            "avg_commit_ms": round(self.commit_ms_total / self.batches, 2) if self.batches else 0.0,
+            "max_commit_ms": round(self.commit_ms_max, 1),
+            "cross_process_lock": fcntl is not None,
+        }
+
+
+DB_WRITER = DbWriter()
+
+
+async def run_write(op: WriteOp) -> Any:
+    return await DB_WRITER.submit(op)
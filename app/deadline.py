@@ -0,0 +1,152 @@
+"""
+Deadline żądań i anulowanie pracy LLM po rozłączeniu klienta.
+Budżet czasu żądania dzielony jest między etapy pipeline'u proporcjonalnie do wag,
+a niedokończone wywołania LLM są anulowane (zwalniają sloty GPU / limit OpenAI).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Optional
+
+from fastapi import Request
+
+from app.admission import ADMISSION
+
+logger = logging.getLogger("lem.deadline")
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+DISCONNECT_POLL_INTERVAL = 0.5
+MIN_DEADLINE_MS = 1000
+MAX_DEADLINE_MS = 15 * 60 * 1000
+
+# Udział etapu w pozostałym budżecie (feedback i map generują najdłuższe odpowiedzi)
+STAGE_WEIGHTS = {
+    "parse": 0.15,
+    "map": 0.30,
+    "score": 0.20,
+    "feedback": 0.35,
+}
+PIPELINE_STAGES = ["parse", "map", "score", "feedback"]
+
+
+class PipelineAborted(Exception):
+    """Bazowy wyjątek przerwania pipeline'u (mapowany na status HTTP)."""
+    status_code = 500
+
+
+class DeadlineExceeded(PipelineAborted):
+    status_code = 504
+
+    def __init__(self, stage: str, budget_ms: float):
+        self.stage = stage
+        self.budget_ms = budget_ms
+        super().__init__(f"Przekroczono deadline żądania na etapie '{stage}' (budżet {budget_ms:.0f} ms)")
+
+
+class ClientDisconnected(PipelineAborted):
+    # 499 = konwencja nginx "client closed request"
+    status_code = 499
+
+    def __init__(self, label: str):
+        self.label = label
+        super().__init__(f"Klient rozłączył się - anulowano: {label}")
+
+
+def _env_default_deadline_ms() -> Optional[int]:
+    raw = os.getenv("LEM_REQUEST_DEADLINE_MS", "").strip()
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        logger.warning("Nieprawidłowa wartość LEM_REQUEST_DEADLINE_MS: %s", raw)
+        return None
+
+
+class Deadline:
+    """Budżet czasu żądania. budget_ms=None oznacza brak limitu."""
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        if budget_ms is not None:
+            budget_ms = max(MIN_DEADLINE_MS, min(MAX_DEADLINE_MS, float(budget_ms)))
+        self.budget_ms = budget_ms
+        self.started_at = time.monotonic()
+
+    @classmethod
+    def from_request(cls, http_request: Optional[Request], body_deadline_ms: Optional[int] = None) -> "Deadline":
+        """Pole żądania ma pierwszeństwo przed nagłówkiem, nagłówek przed LEM_REQUEST_DEADLINE_MS."""
+        budget = body_deadline_ms
+        if budget is None and http_request is not None:
+            raw = http_request.headers.get(DEADLINE_HEADER)
+            if raw:
+                try:
+                    budget = int(raw)
+                except ValueError:
+                    logger.warning("Ignoruję nieprawidłowy nagłówek %s: %s", DEADLINE_HEADER, raw)
+        if budget is None:
+            budget = _env_default_deadline_ms()
+        return cls(budget)
+
+    @property
+    def is_unbounded(self) -> bool:
+        return self.budget_ms is None
+
+    def remaining(self) -> Optional[float]:
+        """Pozostały czas w sekundach (None = bez limitu)."""
+        if self.budget_ms is None:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return max(0.0, self.budget_ms / 1000.0 - elapsed)
+
+    def stage_timeout(self, stage: str, pending_stages: Optional[list[str]] = None) -> Optional[float]:
+        """Część pozostałego budżetu przypadająca na etap (proporcjonalnie do wag etapów pozostałych)."""
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        pending = pending_stages or [stage]
+        total_weight = sum(STAGE_WEIGHTS.get(s, 0.25) for s in pending)
+        share = STAGE_WEIGHTS.get(stage, 0.25) / total_weight if total_weight else 1.0
+        return remaining * share
+
+    async def run_stage(self, stage: str, awaitable: Awaitable[Any], pending_stages: Optional[list[str]] = None) -> Any:
+        """Uruchamia etap z limitem czasu; po przekroczeniu anuluje wywołania LLM etapu."""
+        timeout = self.stage_timeout(stage, pending_stages)
+        started = time.monotonic()
+        try:
+            if timeout is None:
+                result = await awaitable
+            else:
+                result = await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Deadline: anulowano etap '%s' po %.0f ms (budżet żądania %.0f ms)",
+                stage, timeout * 1000, self.budget_ms,
+            )
+            raise DeadlineExceeded(stage, timeout * 1000)
+        ADMISSION.record_stage(stage, (time.monotonic() - started) * 1000)
+        return result
+
+
+async def cancel_on_disconnect(http_request: Optional[Request], awaitable: Awaitable[Any], label: str) -> Any:
+    """Wykonuje awaitable, anulując je gdy klient zamknie połączenie."""
+    if http_request is None:
+        return await awaitable
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.warning("Klient rozłączony - anuluję %s", label)
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+                raise ClientDisconnected(label)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
@@ -0,0 +1,77 @@
+"""
+Ocena przyrostowa poprawionej odpowiedzi: porównanie sekcji z poprzednim runem,
+ponowne mapowanie tylko wymiarów, których sekcje źródłowe się zmieniły, i ponowny scoring
+tylko wymiarów ze zmienionymi dowodami.
+"""
+
+from typing import Any
+
+from app.models import WymiarEvidence
+from app.modules.evidence_prefilter import RubricIndex, analyze, dimension_candidate_sections
+from app.singleflight import normalize_text
+
+MIN_CITATION_OVERLAP = 0.5
+
+
+def changed_sections(old_sections: dict[str, str], new_sections: dict[str, str]) -> set[str]:
+    """Sekcje, których treść różni się po normalizacji białych znaków."""
+    keys = set(old_sections) | set(new_sections)
+    return {
+        key for key in keys
+        if normalize_text(old_sections.get(key, "")) != normalize_text(new_sections.get(key, ""))
+    }
+
+
+def citation_sections(citation: str, sections: dict[str, str]) -> set[str]:
+    """Sekcje, z których pochodzi cytat. Cytat sparafrazowany przez LLM przypisywany jest
+    sekcji o największym pokryciu rdzeni; bez pewnego dopasowania - wszystkim sekcjom."""
+    needle = normalize_text(citation).lower()
+    if not needle:
+        return set()
+    exact = {key for key, text in sections.items() if needle in normalize_text(text).lower()}
+    if exact:
+        return exact
+
+    terms = set(analyze(citation))
+    if terms:
+        overlaps = {key: len(terms & set(analyze(text))) / len(terms) for key, text in sections.items()}
+        best = max(overlaps, key=overlaps.get)
+        if overlaps[best] >= MIN_CITATION_OVERLAP:
+            return {best}
+    return set(sections)
+
+
+def dimensions_to_remap(
+    old_sections: dict[str, str],
+    new_sections: dict[str, str],
+    old_evidence: dict[str, dict[str, Any]],
+    index: RubricIndex,
+    changed: set[str],
+) -> tuple[set[str], dict[str, set[str]]]:
+    """Wymiary do ponownego mapowania i ich sekcje źródłowe.
+
+    Sekcje źródłowe wymiaru = sekcje poprzednich cytatów + sekcje zdań-kandydatów BM25
+    w starej i nowej wersji (nowy fragment może dopiero wnieść dowód).
+    """
+    old_candidates = dimension_candidate_sections(old_sections, index)
+    new_candidates = dimension_candidate_sections(new_sections, index)
+    supporting: dict[str, set[str]] = {}
+    for dimension in index.docs:
+        sources = set(old_candidates.get(dimension, set())) | set(new_candidates.get(dimension, set()))
+        for citation in (old_evidence.get(dimension) or {}).get("znalezione_fragmenty", []):
+            sources |= citation_sections(citation, old_sections)
+        supporting[dimension] = sources
+
+    remap = {dimension for dimension, sources in supporting.items() if sources & changed}
+    # Wymiar bez poprzedniego wyniku zawsze jest mapowany
+    remap |= {dimension for dimension in index.docs if dimension not in old_evidence}
+    return remap, supporting
+
+
+def evidence_changed(old: dict[str, Any], new: WymiarEvidence) -> bool:
+    """Czy dowody wymiaru zmieniły się na tyle, że potrzebny jest nowy scoring."""
+    if bool(old.get("czy_obecny")) != bool(new.czy_obecny):
+        return True
+    old_citations = [normalize_text(c) for c in old.get("znalezione_fragmenty", [])]
+    new_citations = [normalize_text(c) for c in new.znalezione_fragmenty]
+    return old_citations != new_citations
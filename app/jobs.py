@@ -0,0 +1,320 @@
+"""
+Zadania w tle: przetwarzanie listy elementów poza cyklem żądania HTTP.
+Stan, elementy i postęp zadania zapisywane są w tabeli background_jobs (widoczne z każdego workera).
+Zadanie wykonuje worker, który trzyma jego dzierżawę w bazie; dzierżawa jest odnawiana w trakcie pracy,
+więc po awarii workera zadanie przejmuje inny i wznawia je od punktu kontrolnego (lista wyników).
+
+Harmonogram zadania (schedule):
+- now    - od razu (domyślnie),
+- window - tylko w oknie czasu lokalnego serwera, np. "22:00-06:00",
+- idle   - gdy od idle_seconds nie ma ruchu interactive/api w żadnym workerze (wspólny znacznik
+           schedulera LLM - serwer LLM obsługuje wszystkie workery).
+Po zamknięciu okna lub powrocie ruchu zadanie kończy elementy w toku i przechodzi w stan paused;
+pętla schedulera wznawia je, gdy warunek znów jest spełniony.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, time as dt_time, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from app.db_models import (
+    claim_job,
+    create_job,
+    list_schedulable_jobs,
+    release_job_lease,
+    renew_job_lease,
+    save_job_item_result,
+    update_job,
+)
+from app.llm_scheduler import LLM_SCHEDULER, set_llm_priority
+
+logger = logging.getLogger("lem.jobs")
+
+JOB_CONCURRENCY = 2
+JOB_LEASE_SECONDS = 60
+SCHEDULER_INTERVAL_SECONDS = 30
+DEFAULT_IDLE_SECONDS = 120
+SCHEDULE_POLICIES = ("now", "window", "idle")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Zadanie zwraca "done" / "skipped" albo wynik do listy results; wyjątek = "failed"
+ItemWorker = Callable[[Any], Awaitable[Optional[dict[str, Any]]]]
+# Fabryka workera z (params, created_by) - potrzebna do wznowienia zadania w dowolnym procesie
+WorkerFactory = Callable[[dict[str, Any], str], ItemWorker]
+
+_FACTORIES: dict[str, WorkerFactory] = {}
+_RUNNING: dict[str, asyncio.Task] = {}
+_scheduler_task: Optional[asyncio.Task] = None
+
+
+def register_job_kind(kind: str, factory: WorkerFactory) -> None:
+    _FACTORIES[kind] = factory
+
+
+# ---------------------------------------------------------------------------
+# Harmonogram
+# ---------------------------------------------------------------------------
+
+def parse_window(window: str) -> tuple[dt_time, dt_time]:
+    """"22:00-06:00" -> (22:00, 06:00). Okno może przechodzić przez północ."""
+    try:
+        start_raw, end_raw = (part.strip() for part in window.split("-"))
+        start = datetime.strptime(start_raw, "%H:%M").time()
+        end = datetime.strptime(end_raw, "%H:%M").time()
+    except ValueError:
+        raise ValueError(f"Nieprawidłowe okno czasu: {window!r} (oczekiwano HH:MM-HH:MM)")
+    if start == end:
+        raise ValueError("Okno czasu nie może mieć zerowej długości")
+    return start, end
+
+
+def in_window(window: str, now: datetime) -> bool:
+    start, end = parse_window(window)
+    current = now.time()
+    if start < end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+def next_window_start(window: str, now: datetime) -> datetime:
+    start, _ = parse_window(window)
+    candidate = datetime.combine(now.date(), start)
+    return candidate if candidate > now else candidate + timedelta(days=1)
+
+
+def validate_schedule(schedule: Optional[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    """Normalizuje harmonogram (None = od razu); ValueError przy błędnej konfiguracji."""
+    if not schedule or schedule.get("policy", "now") == "now":
+        return None
+    policy = schedule.get("policy")
+    if policy not in SCHEDULE_POLICIES:
+        raise ValueError(f"Nieznana polityka harmonogramu: {policy}. Dostępne: {list(SCHEDULE_POLICIES)}")
+    if policy == "window":
+        if not schedule.get("window"):
+            raise ValueError("Polityka window wymaga pola window (HH:MM-HH:MM)")
+        parse_window(schedule["window"])
+        return {"policy": "window", "window": schedule["window"]}
+    idle_seconds = schedule.get("idle_seconds")
+    return {"policy": "idle", "idle_seconds": int(DEFAULT_IDLE_SECONDS if idle_seconds is None else idle_seconds)}
+
+
+def can_run(schedule: Optional[dict[str, Any]], now: Optional[datetime] = None) -> tuple[bool, Optional[str]]:
+    """Czy zadanie może teraz przetwarzać elementy; drugi element - powód wstrzymania."""
+    if not schedule:
+        return True, None
+    if schedule["policy"] == "window":
+        if in_window(schedule["window"], now or datetime.now()):
+            return True, None
+        return False, f"poza oknem {schedule['window']}"
+    idle = LLM_SCHEDULER.foreground_idle_seconds()
+    if idle > 0 and idle >= schedule["idle_seconds"]:
+        return True, None
+    return False, f"ruch interaktywny (bezczynność {idle:.0f}/{schedule['idle_seconds']} s)"
+
+
+def describe_schedule(schedule: Optional[dict[str, Any]], now: Optional[datetime] = None) -> dict[str, Any]:
+    now = now or datetime.now()
+    runnable, reason = can_run(schedule, now)
+    info: dict[str, Any] = {"policy": (schedule or {}).get("policy", "now"), "runnable_now": runnable, "reason": reason}
+    if schedule and schedule["policy"] == "window":
+        info["window"] = schedule["window"]
+        if not runnable:
+            info["next_start"] = next_window_start(schedule["window"], now).isoformat(timespec="minutes")
+    elif schedule:
+        info["idle_seconds"] = schedule["idle_seconds"]
+    return info
+
+
+# ---------------------------------------------------------------------------
+# Uruchamianie zadań
+# ---------------------------------------------------------------------------
+
+async def start_job(
+    *,
+    kind: str,
+    params: dict[str, Any],
+    items: list[Any],
+    worker: ItemWorker,
+    created_by: str,
+    concurrency: int = JOB_CONCURRENCY,
+    priority: str = "batch",
+    schedule: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    """Tworzy rekord zadania. Zadanie bez harmonogramu startuje od razu w tym procesie,
+    z harmonogramem - uruchamia je pętla schedulera (w dowolnym workerze), gdy warunek jest spełniony.
+    Wywołania LLM zadania mają klasę priorytetu `priority` (domyślnie batch)."""
+    schedule = validate_schedule(schedule)
+    job = await create_job(kind=kind, params=params, items=items, created_by=created_by, schedule=schedule)
+    if schedule is None:
+        claimed = await claim_job(job["id"], WORKER_ID, JOB_LEASE_SECONDS)
+        if claimed:
+            _spawn(claimed, worker, concurrency, priority)
+        return job
+
+    runnable, reason = can_run(schedule)
+    if runnable:
+        await schedule_pending_jobs()
+    else:
+        await update_job(job["id"], status="waiting", status_reason=reason)
+        job.update(status="waiting", status_reason=reason)
+    ensure_scheduler()
+    return job
+
+
+def _spawn(job: dict[str, Any], worker: ItemWorker, concurrency: int, priority: str) -> None:
+    task = asyncio.create_task(_run_job(job, worker, concurrency, priority))
+    _RUNNING[job["id"]] = task
+    task.add_done_callback(lambda _t, job_id=job["id"]: _RUNNING.pop(job_id, None))
+
+
+def cancel_job(job_id: str) -> bool:
+    """Anuluje zadanie działające w tym procesie."""
+    task = _RUNNING.get(job_id)
+    if task is None or task.done():
+        return False
+    task.cancel()
+    return True
+
+
+def running_jobs() -> list[str]:
+    return list(_RUNNING)
+
+
+def _item_label(item: Any) -> Any:
+    if isinstance(item, dict):
+        return item.get("label") or item.get("participant_id")
+    return item
+
+
+async def _keep_lease(job_id: str, job_task: asyncio.Task) -> None:
+    """Odnawia dzierżawę; jej utrata (przejęcie przez inny worker) przerywa zadanie."""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        if not await renew_job_lease(job_id, WORKER_ID, JOB_LEASE_SECONDS):
+            logger.warning("[job %s] Utracono dzierżawę - przerywam", job_id[:8])
+            job_task.cancel()
+            return
+
+
+async def _run_job(job: dict[str, Any], worker: ItemWorker, concurrency: int, priority: str) -> None:
+    # Task ma własną kopię kontekstu - priorytet nie wpływa na żądanie, które utworzyło zadanie
+    set_llm_priority(priority)
+    job_id = job["id"]
+    schedule = job.get("schedule")
+    processed = {entry["index"] for entry in job.get("result") or [] if "index" in entry}
+    counters = {key: job.get(key) or 0 for key in ("done", "failed", "skipped")}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    progress_lock = asyncio.Lock()
+    heartbeat = asyncio.create_task(_keep_lease(job_id, asyncio.current_task()))
+
+    async def process(index: int, item: Any) -> None:
+        try:
+            outcome = await worker(item)
+            key = "skipped" if outcome is None else "done"
+            entry = {"index": index, "item": _item_label(item), **(outcome or {"status": "skipped"})}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("[job %s] Element %s: %s", job_id[:8], _item_label(item), e)
+            key = "failed"
+            entry = {"index": index, "item": _item_label(item), "status": "failed", "error": str(e)}
+        finally:
+            semaphore.release()
+        async with progress_lock:
+            counters[key] += 1
+            # Punkt kontrolny: wynik elementu (wznowienie pomija jego indeks) i liczniki
+            await save_job_item_result(job_id, entry, **counters)
+
+    if processed:
+        logger.info("[job %s] Wznawiam od punktu kontrolnego (%d/%d)", job_id[:8], len(processed), job["total"])
+    await update_job(job_id, status="running", status_reason=None)
+    tasks: list[asyncio.Task] = []
+    pause_reason: Optional[str] = None
+    try:
+        for index, item in enumerate(job.get("items") or []):
+            if index in processed:
+                continue
+            await semaphore.acquire()
+            runnable, pause_reason = can_run(schedule)
+            if not runnable:
+                semaphore.release()
+                break
+            tasks.append(asyncio.create_task(process(index, item)))
+        # Przy wstrzymaniu elementy w toku są kończone
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        lease_lost = heartbeat.done() and not heartbeat.cancelled()
+        if not lease_lost:
+            await update_job(job_id, status="cancelled", **counters)
+        raise
+    except Exception as e:
+        logger.error("[job %s] Przerwane: %s", job_id[:8], e)
+        await update_job(job_id, status="failed", error=str(e), **counters)
+        return
+    finally:
+        heartbeat.cancel()
+        await release_job_lease(job_id, WORKER_ID)
+
+    if pause_reason:
+        await update_job(job_id, status="paused", status_reason=pause_reason, **counters)
+        logger.info("[job %s] Wstrzymane (%s): %s", job_id[:8], pause_reason, counters)
+        return
+    await update_job(job_id, status="completed", status_reason=None, **counters)
+    logger.info("[job %s] Zakończone: %s", job_id[:8], counters)
+
+
+# ---------------------------------------------------------------------------
+# Pętla schedulera (w każdym workerze; dzierżawa w bazie rozstrzyga, kto wykonuje zadanie)
+# ---------------------------------------------------------------------------
+
+async def schedule_pending_jobs() -> list[str]:
+    """Jeden przebieg: uruchamia lub wznawia zadania, których harmonogram na to pozwala."""
+    started = []
+    for job in await list_schedulable_jobs():
+        if job["id"] in _RUNNING or job["kind"] not in _FACTORIES:
+            continue
+        runnable, reason = can_run(job["schedule"])
+        if not runnable:
+            if job["status"] != "paused" and (job["status"], job["status_reason"]) != ("waiting", reason):
+                await update_job(job["id"], status="waiting", status_reason=reason)
+            continue
+        claimed = await claim_job(job["id"], WORKER_ID, JOB_LEASE_SECONDS)
+        if claimed is None:
+            continue
+        worker = _FACTORIES[job["kind"]](claimed["params"], claimed["created_by"])
+        _spawn(claimed, worker, JOB_CONCURRENCY, "batch")
+        started.append(job["id"])
+        logger.info("[job %s] Uruchomiono z harmonogramu (poprzedni stan: %s)", job["id"][:8], job["status"])
+    return started
+
+
+async def _scheduler_loop() -> None:
+    while True:
+        try:
+            LLM_SCHEDULER.publish_foreground()
+            await schedule_pending_jobs()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Scheduler zadań: błąd przebiegu", exc_info=True)
+        await asyncio.sleep(SCHEDULER_INTERVAL_SECONDS)
+
+
+def ensure_scheduler() -> None:
+    """Uruchamia pętlę schedulera w tym procesie (idempotentne)."""
+    global _scheduler_task
+    if _scheduler_task is None or _scheduler_task.done():
+        _scheduler_task = asyncio.create_task(_scheduler_loop())
+
+
+def stop_scheduler() -> None:
+    global _scheduler_task
+    if _scheduler_task is not None:
+        _scheduler_task.cancel()
+        _scheduler_task = None
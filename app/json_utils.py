@@ -75,3 +75,114 @@ def extract_json_from_text(text: str) -> dict:
                 pass
     
     raise ValueError(f"Nie udało się wyciągnąć JSON z odpowiedzi LLM. Początek odpowiedzi: {text[:200]}")
+
+
+class JsonFieldStream:
+    """
+    Przyrostowy czytnik obiektu JSON z odpowiedzi strumieniowanej przez LLM.
+
+    Obsługuje tylko to, czego potrzebuje feedback: pola tekstowe najwyższego poziomu
+    (kolejne fragmenty + wartość po zamknięciu) i elementy tekstowe list najwyższego poziomu.
+    Tekst przed pierwszym `{` (np. ```json) jest pomijany. Pełna odpowiedź i tak jest na końcu
+    parsowana przez extract_json_from_text - czytnik służy tylko do wczesnego przekazywania treści.
+
+    feed() zwraca listę zdarzeń:
+        ("delta", pole, fragment)  - kolejny fragment pola tekstowego
+        ("field", pole, wartość)   - pole tekstowe kompletne
+        ("item", pole, wartość)    - kompletny element listy
+    """
+
+    def __init__(self):
+        self._started = False
+        self._done = False
+        self._stack: list[str] = []
+        self._expect_key = False
+        self._key: str | None = None
+        self._in_string = False
+        self._escape = False
+        self._raw: list[str] = []
+        self._emitted = 0
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> list[tuple[str, str, str]]:
+        events: list[tuple[str, str, str]] = []
+        for char in chunk:
+            if self._done:
+                break
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._stack.append("{")
+                    self._expect_key = True
+                continue
+            if self._in_string:
+                self._string_char(char, events)
+                continue
+            if char == '"':
+                self._in_string = True
+                self._raw = []
+                self._emitted = 0
+            elif char in "{[":
+                self._stack.append(char)
+                self._expect_key = char == "{"
+            elif char in "}]":
+                self._stack.pop()
+                self._expect_key = False
+                if not self._stack:
+                    self._done = True
+            elif char == ",":
+                self._expect_key = self._stack[-1] == "{"
+            elif char == ":":
+                self._expect_key = False
+        if self._in_string and self._is_field_value():
+            self._emit_delta(events)
+        return events
+
+    def _is_field_value(self) -> bool:
+        return self._stack == ["{"] and not self._expect_key
+
+    def _string_char(self, char: str, events: list) -> None:
+        if self._escape:
+            self._escape = False
+            self._raw.append(char)
+            return
+        if char == "\\":
+            self._escape = True
+            self._raw.append(char)
+            return
+        if char != '"':
+            self._raw.append(char)
+            return
+
+        self._in_string = False
+        value = self._decode("".join(self._raw))
+        if self._stack == ["{"] and self._expect_key:
+            self._key = value
+        elif self._is_field_value():
+            self._emit_delta(events)
+            events.append(("field", self._key, value))
+        elif self._stack == ["{", "["]:
+            events.append(("item", self._key, value))
+
+    def _emit_delta(self, events: list) -> None:
+        raw = "".join(self._raw)
+        # Nie dekoduj niedokończonej sekwencji ucieczki (\, \u00)
+        cut = raw.rfind("\\")
+        if cut != -1:
+            backslashes = len(raw[:cut + 1]) - len(raw[:cut + 1].rstrip("\\"))
+            if backslashes % 2 == 1 and (len(raw) == cut + 1 or (raw[cut + 1] == "u" and len(raw) < cut + 6)):
+                raw = raw[:cut]
+        text = self._decode(raw)
+        if len(text) > self._emitted:
+            events.append(("delta", self._key, text[self._emitted:]))
+            self._emitted = len(text)
+
+    @staticmethod
+    def _decode(raw: str) -> str:
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return raw
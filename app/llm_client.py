@@ -3,14 +3,18 @@ Centralny klient LLM - przełączanie między local-server i OpenAI API.
 Konfiguracja persystowana do pliku JSON, żeby była współdzielona między workerami.
 """
 
+import asyncio
 import json
 import logging
 import os
 import time
 from pathlib import Path
-from typing import Literal
+from typing import Any, AsyncIterator, Literal
 from openai import AsyncOpenAI
 
+from app.admission import ADMISSION
+from app.llm_scheduler import LLM_SCHEDULER, current_priority
+
 logger = logging.getLogger("lem.llm")
 
 LlmProvider = Literal["local", "openai"]
@@ -168,6 +172,46 @@ def get_llm_client() -> AsyncOpenAI:
     )
 
 
+async def create_chat_completion(client: AsyncOpenAI, **kwargs):
+    """Wywołanie chat.completions z logowaniem anulowań (deadline / rozłączenie klienta).
+    Wywołanie czeka na slot schedulera LLM zgodnie z klasą priorytetu bieżącego kontekstu.
+
+    Anulowanie taska zamyka połączenie HTTP, więc serwer LLM przerywa generowanie.
+    """
+    started = time.monotonic()
+    try:
+        async with LLM_SCHEDULER.slot():
+            with ADMISSION.llm_call():
+                return await client.chat.completions.create(**kwargs)
+    except asyncio.CancelledError:
+        logger.warning(
+            "Anulowano wywołanie LLM (model=%s, priorytet=%s) po %.0f ms",
+            kwargs.get("model"), current_priority(), (time.monotonic() - started) * 1000,
+        )
+        raise
+
+
+async def stream_chat_completion(client: AsyncOpenAI, **kwargs) -> AsyncIterator[Any]:
+    """Strumieniowe chat.completions: zwraca kolejne chunki odpowiedzi.
+    Slot schedulera LLM jest trzymany do końca strumienia (generowanie trwa, dopóki czytamy);
+    ostatni chunk niesie usage (stream_options.include_usage)."""
+    started = time.monotonic()
+    try:
+        async with LLM_SCHEDULER.slot():
+            with ADMISSION.llm_call():
+                stream = await client.chat.completions.create(
+                    stream=True, stream_options={"include_usage": True}, **kwargs
+                )
+                async for chunk in stream:
+                    yield chunk
+    except asyncio.CancelledError:
+        logger.warning(
+            "Anulowano strumień LLM (model=%s, priorytet=%s) po %.0f ms",
+            kwargs.get("model"), current_priority(), (time.monotonic() - started) * 1000,
+        )
+        raise
+
+
 def get_model_name() -> str:
     runtime = _runtime()
     provider: LlmProvider = runtime["provider"]
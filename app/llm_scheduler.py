@@ -0,0 +1,369 @@
+"""
+Kolejkowanie wywołań LLM według klas priorytetu.
+Liczba równoległych wywołań na proces jest ograniczona (LEM_LLM_CONCURRENCY); wywołania ponad limit
+czekają w kolejkach klas i są wydawane według priorytetu: interactive > api > batch > calibration.
+Praca w tle (batch, calibration) ma zarezerwowaną część slotów, więc nie głoduje przy ruchu z UI,
+ale ponad rezerwę dostaje sloty tylko wtedy, gdy nie czeka nic ważniejszego.
+
+W obrębie klasy sloty dzielone są sprawiedliwie między użytkowników (deficit round-robin z wagami
+ról, LEM_LLM_ROLE_WEIGHTS) - duże zadanie jednego oceniającego nie blokuje pozostałych.
+
+Klasa priorytetu i użytkownik przekazywane są przez contextvary (ustawiane w middleware;
+zadania w tle dziedziczą użytkownika z żądania, które je utworzyło).
+
+Kolejka działa w procesie serwera - obejmuje tylko wywołania LLM z żądań i zadań w tle workera.
+Skrypty uruchamiane osobno (np. calibration/run_calibration.py) mają własny proces i nie dzielą
+z serwerem slotów ani priorytetów.
+"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+import app.database as database
+
+logger = logging.getLogger("lem.llm_scheduler")
+
+PRIORITY_CLASSES = ["interactive", "api", "batch", "calibration"]
+BACKGROUND_CLASSES = {"batch", "calibration"}
+DEFAULT_PRIORITY = "api"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_BACKGROUND_SHARE = 0.25
+DEFAULT_ROLE_WEIGHTS = {"admin": 1.0, "user": 1.0}
+MIN_WEIGHT = 0.1
+
+_PRIORITY: contextvars.ContextVar[str] = contextvars.ContextVar("lem_llm_priority", default=DEFAULT_PRIORITY)
+_USER: contextvars.ContextVar[tuple[str, str]] = contextvars.ContextVar("lem_llm_user", default=("system", "admin"))
+
+
+def current_priority() -> str:
+    return _PRIORITY.get()
+
+
+def set_llm_priority(priority: str) -> contextvars.Token:
+    """Ustawia klasę priorytetu dla bieżącego kontekstu (i tasków z niego utworzonych)."""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Nieznana klasa priorytetu: {priority}. Dostępne: {PRIORITY_CLASSES}")
+    return _PRIORITY.set(priority)
+
+
+def current_user() -> tuple[str, str]:
+    """(username, rola) właściciela bieżących wywołań LLM."""
+    return _USER.get()
+
+
+def set_llm_user(username: str, role: str) -> contextvars.Token:
+    return _USER.set((username, role))
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    token = set_llm_priority(priority)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def _env_number(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        logger.warning("Nieprawidłowa wartość %s: %s", name, raw)
+        return default
+
+
+def _env_role_weights() -> dict[str, float]:
+    """LEM_LLM_ROLE_WEIGHTS w formacie "admin=2,user=1"."""
+    weights = dict(DEFAULT_ROLE_WEIGHTS)
+    for item in os.getenv("LEM_LLM_ROLE_WEIGHTS", "").split(","):
+        if not item.strip():
+            continue
+        role, _, value = item.partition("=")
+        try:
+            weights[role.strip()] = float(value)
+        except ValueError:
+            logger.warning("Nieprawidłowa waga roli w LEM_LLM_ROLE_WEIGHTS: %s", item)
+    return weights
+
+
+# Ruch interactive/api widoczny dla wszystkich workerów (serwer LLM jest wspólny): mtime pliku
+# znacznika obok bazy. Odświeżany przy przydziale i zwolnieniu slotu (najwyżej raz na
+# FOREGROUND_MARK_INTERVAL s) oraz przez publish_foreground, gdy wywołania w toku trwają długo.
+FOREGROUND_MARK_INTERVAL = 1.0
+
+
+class _ForegroundMarker:
+    def __init__(self, path: Callable[[], str]):
+        self._path = path
+        self._marked_at = 0.0
+
+    def touch(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._marked_at < FOREGROUND_MARK_INTERVAL:
+            return
+        self._marked_at = now
+        path = self._path()
+        try:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                open(path, "a").close()
+        except OSError:
+            logger.debug("Nie można odświeżyć znacznika ruchu %s", path, exc_info=True)
+
+    def idle_seconds(self) -> Optional[float]:
+        """Sekundy od ostatniego ruchu w dowolnym workerze; None - brak znacznika."""
+        try:
+            return max(0.0, time.time() - os.stat(self._path()).st_mtime)
+        except OSError:
+            return None
+
+
+# Element kolejki: (future przydziału, czas wejścia do kolejki, (username, rola))
+_Entry = tuple[asyncio.Future, float, tuple[str, str]]
+
+
+class _FairQueue:
+    """Kolejka klasy: osobna kolejka FIFO na użytkownika, wybór deficit round-robin.
+    Każde wywołanie kosztuje 1; użytkownik dostaje w rundzie kwant równy wadze swojej roli."""
+
+    def __init__(self):
+        self._users: dict[str, deque[_Entry]] = {}
+        self._ring: deque[str] = deque()
+        self._deficit: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._users.values())
+
+    def push(self, entry: _Entry) -> None:
+        username = entry[2][0]
+        if username not in self._users:
+            self._users[username] = deque()
+            self._ring.append(username)
+            self._deficit[username] = 0.0
+        self._users[username].append(entry)
+
+    def remove(self, entry: _Entry) -> None:
+        queue = self._users.get(entry[2][0])
+        if queue is not None and entry in queue:
+            queue.remove(entry)
+            if not queue:
+                self._drop(entry[2][0])
+
+    def _drop(self, username: str) -> None:
+        del self._users[username]
+        del self._deficit[username]
+        self._ring.remove(username)
+
+    def pop(self, weights: dict[str, float]) -> Optional[_Entry]:
+        while self._ring:
+            username = self._ring[0]
+            queue = self._users[username]
+            while queue and queue[0][0].done():  # anulowane w kolejce
+                queue.popleft()
+            if not queue:
+                self._drop(username)
+                continue
+            if self._deficit[username] < 1:
+                # Nowa runda użytkownika: kwant = waga roli
+                role = queue[0][2][1]
+                self._deficit[username] += max(MIN_WEIGHT, weights.get(role, 1.0))
+                if self._deficit[username] < 1:
+                    self._ring.rotate(-1)
+                    continue
+            self._deficit[username] -= 1
+            entry = queue.popleft()
+            if not queue:
+                self._drop(username)
+            elif self._deficit[username] < 1:
+                self._ring.rotate(-1)
+            return entry
+        return None
+
+    def queued_by_user(self) -> dict[str, int]:
+        return {
+            username: sum(1 for entry in queue if not entry[0].done())
+            for username, queue in self._users.items()
+        }
+
+
+class _ClassStats:
+    def __init__(self):
+        self.dispatched = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def record(self, wait_ms: float) -> None:
+        self.dispatched += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+
+class LlmScheduler:
+    """Semafor wywołań LLM z kolejkami per klasa priorytetu."""
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        background_share: Optional[float] = None,
+        role_weights: Optional[dict[str, float]] = None,
+        shared_marker: Optional[Callable[[], str]] = None,
+    ):
+        if capacity is None:
+            capacity = int(_env_number("LEM_LLM_CONCURRENCY", DEFAULT_CONCURRENCY))
+        if background_share is None:
+            background_share = _env_number("LEM_LLM_BACKGROUND_SHARE", DEFAULT_BACKGROUND_SHARE)
+        self.capacity = max(1, capacity)
+        share = min(1.0, max(0.0, background_share))
+        self.background_reserved = min(self.capacity, math.ceil(self.capacity * share)) if share > 0 else 0
+        self.role_weights = role_weights if role_weights is not None else _env_role_weights()
+        self._queues: dict[str, _FairQueue] = {cls: _FairQueue() for cls in PRIORITY_CLASSES}
+        self._in_flight: dict[str, int] = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._user_in_flight: dict[str, int] = {}
+        self._foreground_active_at = time.monotonic()
+        self._marker = _ForegroundMarker(shared_marker) if shared_marker else None
+        self._stats: dict[str, _ClassStats] = {cls: _ClassStats() for cls in PRIORITY_CLASSES}
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._in_flight.values())
+
+    def _background_in_flight(self) -> int:
+        return sum(self._in_flight[cls] for cls in BACKGROUND_CLASSES)
+
+    def _pick_class(self) -> Optional[str]:
+        waiting = [cls for cls in PRIORITY_CLASSES if self._queues[cls]]
+        if not waiting:
+            return None
+        background_waiting = [cls for cls in waiting if cls in BACKGROUND_CLASSES]
+        if background_waiting and self._background_in_flight() < self.background_reserved:
+            return background_waiting[0]
+        return waiting[0]
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.capacity:
+            cls = self._pick_class()
+            if cls is None:
+                return
+            entry = self._queues[cls].pop(self.role_weights)
+            if entry is None:
+                continue
+            future, enqueued_at, user = entry
+            self._grant(cls, user, enqueued_at)
+            future.set_result(None)
+
+    def _foreground_busy(self) -> bool:
+        return any(self._in_flight[cls] or self._queues[cls] for cls in PRIORITY_CLASSES if cls not in BACKGROUND_CLASSES)
+
+    def _mark_foreground(self, force: bool = False) -> None:
+        self._foreground_active_at = time.monotonic()
+        if self._marker is not None:
+            self._marker.touch(force)
+
+    def foreground_idle_seconds(self) -> float:
+        """Od ilu sekund nie ma wywołań interactive/api (w toku ani w kolejce); 0 = jest ruch.
+        Ze wspólnym znacznikiem - najkrótsza bezczynność spośród wszystkich workerów."""
+        if self._foreground_busy():
+            return 0.0
+        idle = time.monotonic() - self._foreground_active_at
+        shared = self._marker.idle_seconds() if self._marker is not None else None
+        return idle if shared is None else min(idle, shared)
+
+    def publish_foreground(self) -> None:
+        """Odświeża wspólny znacznik, gdy w tym workerze trwa ruch interactive/api - długie wywołanie
+        nie może wyglądać dla innych workerów na bezczynność (wołane okresowo przez scheduler zadań)."""
+        if self._marker is not None and self._foreground_busy():
+            self._mark_foreground(force=True)
+
+    def _grant(self, cls: str, user: tuple[str, str], enqueued_at: float) -> None:
+        if cls not in BACKGROUND_CLASSES:
+            self._mark_foreground()
+        self._in_flight[cls] += 1
+        self._user_in_flight[user[0]] = self._user_in_flight.get(user[0], 0) + 1
+        self._stats[cls].record((time.monotonic() - enqueued_at) * 1000)
+
+    async def acquire(self, priority: str, user: tuple[str, str]) -> None:
+        enqueued_at = time.monotonic()
+        if self.in_flight < self.capacity and not any(self._queues.values()):
+            self._grant(priority, user, enqueued_at)
+            return
+        entry = (asyncio.get_running_loop().create_future(), enqueued_at, user)
+        self._queues[priority].push(entry)
+        self._dispatch()
+        try:
+            await entry[0]
+        except asyncio.CancelledError:
+            if entry[0].done() and not entry[0].cancelled():
+                # Slot przydzielony w chwili anulowania - oddaj go
+                self.release(priority, user)
+            else:
+                self._queues[priority].remove(entry)
+            raise
+
+    def release(self, priority: str, user: tuple[str, str]) -> None:
+        if priority not in BACKGROUND_CLASSES:
+            self._mark_foreground()
+        self._in_flight[priority] = max(0, self._in_flight[priority] - 1)
+        remaining = self._user_in_flight.get(user[0], 0) - 1
+        if remaining > 0:
+            self._user_in_flight[user[0]] = remaining
+        else:
+            self._user_in_flight.pop(user[0], None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, user: Optional[tuple[str, str]] = None) -> AsyncIterator[None]:
+        priority = priority or current_priority()
+        user = user or current_user()
+        await self.acquire(priority, user)
+        try:
+            yield
+        finally:
+            self.release(priority, user)
+
+    def stats(self) -> dict:
+        classes = {}
+        for cls in PRIORITY_CLASSES:
+            stats = self._stats[cls]
+            classes[cls] = {
+                "in_flight": self._in_flight[cls],
+                "queued": sum(self._queues[cls].queued_by_user().values()),
+                "dispatched": stats.dispatched,
+                "avg_wait_ms": round(stats.wait_ms_total / stats.dispatched, 1) if stats.dispatched else 0.0,
+                "max_wait_ms": round(stats.wait_ms_max, 1),
+            }
+        return {
+            "capacity": self.capacity,
+            "background_reserved": self.background_reserved,
+            "in_flight": self.in_flight,
+            "foreground_idle_s": round(self.foreground_idle_seconds(), 1),
+            "classes": classes,
+        }
+
+    def user_stats(self) -> dict:
+        """Wywołania w toku i oczekujące per użytkownik (oczekujące - także per klasa)."""
+        users: dict[str, dict] = {
+            username: {"in_flight": count, "queued": 0, "queued_by_class": {}}
+            for username, count in self._user_in_flight.items()
+        }
+        for cls in PRIORITY_CLASSES:
+            for username, count in self._queues[cls].queued_by_user().items():
+                if not count:
+                    continue
+                entry = users.setdefault(username, {"in_flight": 0, "queued": 0, "queued_by_class": {}})
+                entry["queued"] += count
+                entry["queued_by_class"][cls] = count
+        return {"role_weights": self.role_weights, "users": users}
+
+
+LLM_SCHEDULER = LlmScheduler(shared_marker=lambda: database.DB_PATH.as_posix() + ".foreground")
@@ -3,14 +3,17 @@ FastAPI aplikacja - System Oceny Kompetencji LEM
 Obsługa 4 kompetencji menedżerskich z izolowanym cyklem per kompetencja
 """
 
+import asyncio
 import json
 import logging
 import os
+import time
 import traceback
+from datetime import datetime, timezone
 from pathlib import Path
 from fastapi import FastAPI, HTTPException, Request, Response, Cookie
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
@@ -26,10 +29,10 @@ from app.models import (
     WymiarEvidence,
     DimensionScore,
 )
-from app.modules.parser import ResponseParser
+from app.modules.parser import ResponseParser, get_parse_stats
 from app.modules.mapper import ResponseMapper
 from app.modules.scorer import CompetencyScorer
-from app.modules.feedback import FeedbackGenerator
+from app.modules.feedback import FeedbackGenerator, get_feedback_stats
 from app.rubric import (
     get_available_competencies,
     get_competency_info,
@@ -55,6 +58,10 @@ from app.prompt_manager import (
     get_system_prompt as pm_get_system_prompt,
 )
 from app.llm_client import get_llm_runtime, set_llm_runtime
+from app.deadline import Deadline, PipelineAborted, PIPELINE_STAGES, cancel_on_disconnect
+from app.admission import ADMISSION, Rejected as AdmissionRejected, route_stages
+from app.llm_scheduler import LLM_SCHEDULER, current_priority, set_llm_priority, set_llm_user
+from app.singleflight import SingleFlight, make_flight_key, normalize_text
 from app.cost_calculator import (
     list_model_pricing,
     estimate_evaluation_cost,
@@ -62,19 +69,44 @@ from app.cost_calculator import (
     calculate_cost_breakdown,
 )
 from app.exporters import export_report, get_content_type, get_filename
-from app.database import init_db
+from app.database import close_pool, get_pool_stats, init_db
+from app.db_writer import DB_WRITER
 from app.db_models import (
     save_assessment as db_save_assessment,
     list_assessments as db_list_assessments,
+    list_assessments_page as db_list_assessments_page,
     get_assessment_by_ref as db_get_assessment_by_ref,
     get_assessment_by_id as db_get_assessment_by_id,
     compare_assessments as db_compare_assessments,
     get_assessment_stats as db_get_assessment_stats,
     delete_assessment_by_ref as db_delete_assessment_by_ref,
     save_run as db_save_run,
-    list_runs as db_list_runs,
+    list_runs_page as db_list_runs_page,
     get_run_by_ref as db_get_run_by_ref,
+    create_pipeline_run as db_create_pipeline_run,
+    get_pipeline_run as db_get_pipeline_run,
+    list_pipeline_runs as db_list_pipeline_runs,
+    save_pipeline_stage as db_save_pipeline_stage,
+    save_pipeline_stages as db_save_pipeline_stages,
+    save_pipeline_run_assessment as db_save_pipeline_run_assessment,
+    get_job as db_get_job,
+    list_jobs as db_list_jobs,
+    list_active_jobs as db_list_active_jobs,
+    update_job as db_update_job,
 )
+from app.jobs import (
+    WORKER_ID as JOB_WORKER_ID,
+    cancel_job,
+    describe_schedule,
+    ensure_scheduler,
+    register_job_kind,
+    running_jobs,
+    start_job,
+)
+from app.reassessment import plan_reassessment, execute_reassessment
+from app.write_behind import WRITE_BEHIND, persist_assess_enabled
+from app.incremental import changed_sections, dimensions_to_remap, evidence_changed
+from app.modules.evidence_prefilter import get_rubric_index
 
 load_dotenv()
 
@@ -87,6 +119,9 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Kursor następnej strony list (keyset) - wystawiony w CORS, by klienci z innych originów mogli stronicować
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -97,11 +132,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 PUBLIC_API_PATHS = {"/health", "/api/health", "/api/auth/login", "/api/auth/logout", "/api/samples"}
 
 
+@app.middleware("http")
+async def llm_priority_middleware(request: Request, call_next):
+    """Klasa priorytetu wywołań LLM: UI (/api/...) - interactive, zewnętrzne API (/assess) - api.
+    Użytkownik z auth_middleware (zarejestrowany później, więc działa wcześniej) - do fair-share."""
+    path = request.url.path
+    set_llm_priority("interactive" if path.startswith("/api/") else "api")
+    user = getattr(request.state, "user", None) or {}
+    set_llm_user(user.get("username", "anonymous"), user.get("role", "user"))
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    """Szybkie 429 dla żądań LLM, których szacowany czas odpowiedzi przekracza SLO.
+    Zarejestrowany przed auth_middleware, więc działa już po uwierzytelnieniu."""
+    stages = route_stages(request.method, request.url.path)
+    if stages is None:
+        return await call_next(request)
+    try:
+        ticket = ADMISSION.admit(stages, Deadline.from_request(request).budget_ms)
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(e), "estimate_ms": round(e.estimate_ms), "slo_ms": round(e.slo_ms)},
+            headers={"Retry-After": str(e.retry_after_s)},
+        )
+    try:
+        return await call_next(request)
+    finally:
+        ADMISSION.release(ticket)
+
+
 @app.middleware("http")
 async def auth_middleware(request: Request, call_next):
     path = request.url.path
@@ -120,6 +188,16 @@ async def auth_middleware(request: Request, call_next):
 async def startup():
     ensure_admin_exists()
     await init_db()
+    # Zadania z harmonogramem i osierocone po restarcie workera
+    ensure_scheduler()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Oceny z /assess czekające na zapis write-behind
+    await WRITE_BEHIND.flush_and_stop()
+    await DB_WRITER.stop()
+    await close_pool()
 
 
 # ---------------------------------------------------------------------------
@@ -267,6 +345,15 @@ async def api_admin_sessions(request: Request):
     return list_active_sessions()
 
 
+@app.get("/api/admin/llm/users")
+async def api_admin_llm_users(request: Request):
+    """Wywołania LLM w toku i w kolejce per użytkownik (per worker)."""
+    user = getattr(request.state, "user", None)
+    if not user or user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Tylko admin")
+    return {"pid": os.getpid(), **LLM_SCHEDULER.user_stats()}
+
+
 @app.get("/api/llm/config")
 async def get_llm_config(request: Request):
     return get_llm_runtime()
@@ -356,6 +443,83 @@ def _build_usage_cost(usage: dict | None) -> dict:
     }
 
 
+# Współdzielenie identycznych, równoległych wykonań (np. warsztaty - ta sama próbka)
+ASSESS_FLIGHTS = SingleFlight("assess")
+STAGE_FLIGHTS = SingleFlight("diagnostic")
+
+
+def _flight_key(stage: str, competency: str, payload: Any, deadline: Deadline) -> str:
+    """Klucz coalescingu: etap + kompetencja + wejście + aktywne wersje promptów + model.
+
+    Wspólne wykonanie działa z deadline'em i klasą priorytetu LLM pierwszego żądania, więc
+    w kluczu są też budżet czasu i klasa priorytetu - żądanie z dłuższym (lub bez) deadline'em
+    nie dostanie cudzego 504, a żądanie z UI nie dołączy do wykonania z priorytetem batch.
+    """
+    llm_runtime = get_llm_runtime()
+    return make_flight_key(
+        stage,
+        competency,
+        payload,
+        pm_get_active_versions(competency),
+        llm_runtime.get("provider"),
+        llm_runtime.get("model"),
+        deadline.budget_ms,
+        current_priority(),
+    )
+
+
+async def _run_shared_stage(key: str, module: Any, run: Any) -> tuple[Any, Optional[dict], dict]:
+    """Wykonuje etap raz dla wszystkich identycznych żądań; zwraca (wynik, usage, metadane wykonania)."""
+    async def _execute():
+        result = await run()
+        return result, module.last_usage, dict(getattr(module, "last_meta", {}) or {})
+
+    return await STAGE_FLIGHTS.do(key, _execute)
+
+
+def _evidence_out(evidence: Dict[str, WymiarEvidence]) -> dict:
+    return {
+        key: {
+            "wymiar": ev.wymiar,
+            "znalezione_fragmenty": ev.znalezione_fragmenty,
+            "czy_obecny": ev.czy_obecny,
+            "notatki": ev.notatki,
+        }
+        for key, ev in evidence.items()
+    }
+
+
+def _dimension_scores_out(scoring: ScoringResult) -> dict:
+    return {
+        key: {
+            "wymiar": ds.wymiar,
+            "ocena": ds.ocena,
+            "waga": ds.waga,
+            "punkty": ds.punkty,
+            "uzasadnienie": ds.uzasadnienie,
+            "rozrzut": ds.rozrzut,
+            "liczba_probek": ds.liczba_probek,
+        }
+        for key, ds in scoring.dimension_scores.items()
+    }
+
+
+def _request_user(http_request: Optional[Request]) -> dict:
+    """Użytkownik żądania; etapy uruchamiane w tle (bez żądania HTTP) działają jako 'system'."""
+    if http_request is None:
+        return {"username": "system", "role": "admin"}
+    return getattr(http_request.state, "user", {})
+
+
+def _check_section_keys(parser: ResponseParser, sections: dict) -> None:
+    unknown = [key for key in sections if key not in parser.sections_def["keys"]]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Nieznane sekcje: {unknown}. Dostępne: {parser.sections_def['keys']}",
+        )
+
+
 def get_modules(competency: str = "delegowanie"):
     """Factory: nowe instancje modułów pipeline dla danej kompetencji."""
     competency = resolve_competency(competency)
@@ -383,6 +547,25 @@ async def health():
     return HealthResponse(status="healthy", version="2.0.0")
 
 
+@app.get("/api/metrics")
+async def get_metrics(request: Request):
+    """Metryki wydajnościowe procesu (per worker)."""
+    return {
+        "pid": os.getpid(),
+        "singleflight": {
+            "assess": ASSESS_FLIGHTS.stats(),
+            "diagnostic": STAGE_FLIGHTS.stats(),
+        },
+        "parse": get_parse_stats(),
+        "feedback": get_feedback_stats(),
+        "admission": ADMISSION.stats(),
+        "llm_scheduler": LLM_SCHEDULER.stats(),
+        "write_behind": WRITE_BEHIND.stats(),
+        "db_pool": get_pool_stats(),
+        "db_writer": DB_WRITER.stats(),
+    }
+
+
 # ---------------------------------------------------------------------------
 # COMPETENCIES API
 # ---------------------------------------------------------------------------
@@ -434,49 +617,127 @@ async def get_competency_dimensions(name: str, request: Request, detail: bool =
 # ---------------------------------------------------------------------------
 
 @app.post("/assess", response_model=AssessmentResponse)
-async def assess_competency(request: AssessmentRequest):
+async def assess_competency(request: AssessmentRequest, http_request: Request):
     """Pełny pipeline oceny kompetencji (izolowany cykl per kompetencja)."""
+    deadline = Deadline.from_request(http_request, request.deadline_ms)
+    key = _flight_key("assess", request.competency, {
+        "text": normalize_text(request.response_text),
+        "sections": request.sections,
+    }, deadline)
     try:
-        competency = request.competency
-        parser, mapper, scorer, feedback_gen = get_modules(competency)
+        shared, steps = await cancel_on_disconnect(
+            http_request,
+            ASSESS_FLIGHTS.do(key, lambda: _run_assess_pipeline(request, deadline)),
+            label=f"/assess ({request.competency}, {request.participant_id})",
+        )
+        if persist_assess_enabled():
+            WRITE_BEHIND.enqueue({
+                "participant_id": request.participant_id,
+                "competency": shared.competency,
+                "steps": steps,
+                "created_by": _request_user(http_request).get("username", "api"),
+                "prompt_versions": pm_get_active_versions(shared.competency),
+                "run_name": "api",
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            })
+        return shared.model_copy(update={"participant_id": request.participant_id})
+    except HTTPException:
+        raise
+    except PipelineAborted as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Błąd przetwarzania: {str(e)}")
 
-        parsed_response = await parser.parse(request.response_text)
 
-        is_valid, missing = parser.validate_parsed_response(parsed_response)
-        if not is_valid:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Odpowiedź niekompletna. Brakujące sekcje: {', '.join(missing)}"
-            )
+async def _run_assess_pipeline(
+    request: AssessmentRequest,
+    deadline: Deadline,
+) -> tuple[AssessmentResponse, dict[str, Any]]:
+    """Pełny pipeline; zwraca (odpowiedź API, kroki w formacie save_assessment do zapisu write-behind)."""
+    competency = request.competency
+    parser, mapper, scorer, feedback_gen = get_modules(competency)
+    timing: dict[str, int] = {}
+
+    if request.sections:
+        _check_section_keys(parser, request.sections)
+    start = time.perf_counter()
+    parsed_response = await deadline.run_stage(
+        "parse", parser.parse(request.response_text, request.sections), PIPELINE_STAGES
+    )
+    timing["parse_ms"] = int((time.perf_counter() - start) * 1000)
 
-        mapped_response = await mapper.map(parsed_response)
-        scoring_result = await scorer.score(mapped_response)
-        feedback = await feedback_gen.generate(scoring_result)
+    is_valid, missing = parser.validate_parsed_response(parsed_response)
+    if not is_valid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Odpowiedź niekompletna. Brakujące sekcje: {', '.join(missing)}"
+        )
 
-        evidence_dict = {
-            k: v.znalezione_fragmenty
-            for k, v in mapped_response.evidence.items()
-        }
-        dimension_scores_dict = {
-            k: v.ocena
-            for k, v in scoring_result.dimension_scores.items()
-        }
+    start = time.perf_counter()
+    mapped_response = await deadline.run_stage("map", mapper.map(parsed_response), PIPELINE_STAGES[1:])
+    timing["map_ms"] = int((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    scoring_result = await deadline.run_stage("score", scorer.score(mapped_response), PIPELINE_STAGES[2:])
+    timing["score_ms"] = int((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    feedback = await deadline.run_stage("feedback", feedback_gen.generate(scoring_result), PIPELINE_STAGES[3:])
+    timing["feedback_ms"] = int((time.perf_counter() - start) * 1000)
+
+    evidence_dict = {
+        k: v.znalezione_fragmenty
+        for k, v in mapped_response.evidence.items()
+    }
+    dimension_scores_dict = {
+        k: v.ocena
+        for k, v in scoring_result.dimension_scores.items()
+    }
 
-        return AssessmentResponse(
-            participant_id=request.participant_id,
-            competency=competency,
-            score=scoring_result.ocena,
-            level=scoring_result.poziom,
-            evidence=evidence_dict,
-            feedback=feedback,
-            dimension_scores=dimension_scores_dict,
-            scoring_details=scoring_result,
-        )
+    llm_runtime = get_llm_runtime()
+    steps = {
+        "response_text": request.response_text,
+        "parse": {
+            "sections": parsed_response.sections,
+            "raw_text": parsed_response.raw_text,
+            "_parse_meta": parser.last_meta,
+            "_prompt_meta": _prompt_meta("parse", competency),
+            "_llm": llm_runtime,
+            **_build_usage_cost(parser.last_usage),
+        },
+        "map": {
+            "evidence": _evidence_out(mapped_response.evidence),
+            "_map_meta": mapper.last_meta,
+            "_prompt_meta": _prompt_meta("map", competency),
+            "_llm": llm_runtime,
+            **_build_usage_cost(mapper.last_usage),
+        },
+        "score": {
+            "ocena": scoring_result.ocena,
+            "poziom": scoring_result.poziom,
+            "dimension_scores": _dimension_scores_out(scoring_result),
+            "_prompt_meta": _prompt_meta("score", competency),
+            "_llm": llm_runtime,
+            **_build_usage_cost(scorer.last_usage),
+        },
+        "feedback": {
+            **feedback.model_dump(),
+            "_feedback_meta": feedback_gen.last_meta,
+            "_prompt_meta": _prompt_meta("feedback", competency),
+            "_llm": llm_runtime,
+            **_build_usage_cost(feedback_gen.last_usage),
+        },
+        "timing": timing,
+    }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Błąd przetwarzania: {str(e)}")
+    return AssessmentResponse(
+        participant_id=request.participant_id,
+        competency=competency,
+        score=scoring_result.ocena,
+        level=scoring_result.poziom,
+        evidence=evidence_dict,
+        feedback=feedback,
+        dimension_scores=dimension_scores_dict,
+        scoring_details=scoring_result,
+    ), steps
 
 
 # ---------------------------------------------------------------------------
@@ -488,14 +749,14 @@ SAMPLE_RESPONSES_DIR = Path(__file__).resolve().parents[1]
 
 async def _migrate_file_samples():
     """Jednorazowa migracja plików odpowiedz_*.md do bazy jako GEN_AI."""
-    from app.database import get_connection
+    from app.db_writer import run_write
     from datetime import datetime, timezone
 
-    async with get_connection() as conn:
+    async def write(conn) -> int:
         row = await conn.execute("SELECT COUNT(*) AS c FROM sample_responses")
         count = (await row.fetchone())["c"]
         if count > 0:
-            return
+            return 0
 
         for f in sorted(SAMPLE_RESPONSES_DIR.glob("odpowiedz_*.md")):
             raw = f.read_text(encoding="utf-8")
@@ -509,7 +770,11 @@ async def _migrate_file_samples():
                 """,
                 (title, body, datetime.now(timezone.utc).isoformat()),
             )
-        await conn.commit()
+            count += 1
+        return count
+
+    count = await run_write(write)
+    if count:
         logger.info("Migrated %d file samples to DB", count)
 
 
@@ -534,7 +799,7 @@ async def list_sample_responses():
 
     samples = []
     try:
-        async with get_connection() as conn:
+        async with get_connection(read_only=True) as conn:
             rows = await conn.execute_fetchall(
                 "SELECT id, label, response_type, created_at, created_by FROM sample_responses ORDER BY id ASC"
             )
@@ -562,7 +827,7 @@ async def get_sample_response(sample_id: str):
 
     if sample_id.startswith("db_"):
         db_id = int(sample_id.removeprefix("db_"))
-        async with get_connection() as conn:
+        async with get_connection(read_only=True) as conn:
             cursor = await conn.execute(
                 "SELECT id, label, content, response_type, created_by FROM sample_responses WHERE id = ?", (db_id,)
             )
@@ -584,7 +849,7 @@ async def get_sample_response(sample_id: str):
 @app.post("/api/samples")
 async def create_sample_response(req: CreateSampleRequest, http_request: Request):
     """Zapisz nową odpowiedź testową do bazy."""
-    from app.database import get_connection
+    from app.db_writer import run_write
     from datetime import datetime, timezone
 
     if req.response_type not in ("REAL", "GEN_AI", "GEN_HUMAN"):
@@ -593,7 +858,7 @@ async def create_sample_response(req: CreateSampleRequest, http_request: Request
     user = getattr(http_request.state, "user", {})
     created_by = user.get("username", "anonymous")
 
-    async with get_connection() as conn:
+    async def write(conn) -> int:
         cursor = await conn.execute(
             """
             INSERT INTO sample_responses (label, content, response_type, created_at, created_by)
@@ -601,8 +866,9 @@ async def create_sample_response(req: CreateSampleRequest, http_request: Request
             """,
             (req.label, req.content, req.response_type, datetime.now(timezone.utc).isoformat(), created_by),
         )
-        new_id = cursor.lastrowid
-        await conn.commit()
+        return cursor.lastrowid
+
+    new_id = await run_write(write)
 
     log_activity(action="sample_create", actor=created_by, details={"sample_id": new_id, "label": req.label, "response_type": req.response_type})
     return {"ok": True, "id": f"db_{new_id}", "label": req.label, "response_type": req.response_type}
@@ -611,7 +877,7 @@ async def create_sample_response(req: CreateSampleRequest, http_request: Request
 @app.delete("/api/samples/{sample_id}")
 async def delete_sample_response(sample_id: str, http_request: Request):
     """Usuń odpowiedź testową z bazy."""
-    from app.database import get_connection
+    from app.db_writer import run_write
 
     if not sample_id.startswith("db_"):
         raise HTTPException(status_code=400, detail="Cannot delete file-based samples")
@@ -620,13 +886,12 @@ async def delete_sample_response(sample_id: str, http_request: Request):
     user = getattr(http_request.state, "user", {})
     actor = user.get("username", "anonymous")
 
-    async with get_connection() as conn:
-        cursor = await conn.execute("SELECT id FROM sample_responses WHERE id = ?", (db_id,))
-        row = await cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Sample not found")
-        await conn.execute("DELETE FROM sample_responses WHERE id = ?", (db_id,))
-        await conn.commit()
+    async def write(conn) -> int:
+        cursor = await conn.execute("DELETE FROM sample_responses WHERE id = ?", (db_id,))
+        return cursor.rowcount
+
+    if not await run_write(write):
+        raise HTTPException(status_code=404, detail="Sample not found")
 
     log_activity(action="sample_delete", actor=actor, details={"sample_id": sample_id})
     return {"ok": True, "id": sample_id}
@@ -639,6 +904,12 @@ async def delete_sample_response(sample_id: str, http_request: Request):
 class DiagnosticParseRequest(BaseModel):
     response_text: str = Field(..., min_length=50)
     competency: str = Field(default="delegowanie")
+    deadline_ms: Optional[int] = Field(default=None, ge=1)
+    sections: Optional[Dict[str, str]] = Field(default=None)
+    competencies: Optional[List[str]] = Field(
+        default=None,
+        description="Wszystkie kompetencje oceniane dla tego tekstu - jeden wspólny podział na sekcje (cache per tekst)",
+    )
 
 
 class ExportRequest(BaseModel):
@@ -652,15 +923,47 @@ class ExportRequest(BaseModel):
 @app.post("/api/diagnostic/parse")
 async def diagnostic_parse(request: DiagnosticParseRequest, http_request: Request):
     """Krok 1: Strukturyzacja odpowiedzi na sekcje"""
+    return await _diagnostic_parse(request, http_request)
+
+
+async def _diagnostic_parse(
+    request: DiagnosticParseRequest,
+    http_request: Optional[Request],
+    previous_sections: Optional[Dict[str, str]] = None,
+) -> dict:
+    """previous_sections (revise): podział poprzedniej wersji odpowiedzi - niezmienione akapity
+    zachowują sekcje, LLM klasyfikuje tylko zmienione (ResponseParser.reparse)."""
     try:
-        user = getattr(http_request.state, "user", {})
+        user = _request_user(http_request)
         log_activity(action="diagnostic_parse", actor=user.get("username", "?"), details={"competency": request.competency})
         parser, _, _, _ = get_modules(request.competency)
         llm_runtime = get_llm_runtime()
         active_prompt = pm_get_prompt("parse", competency=request.competency)
         prompt_sent = parser.prompt_template.format(response_text=request.response_text)
-        parsed = await parser.parse(request.response_text)
-        uc = _build_usage_cost(parser.last_usage)
+        deadline = Deadline.from_request(http_request, request.deadline_ms)
+        if request.sections:
+            _check_section_keys(parser, request.sections)
+        try:
+            shared_competencies = [resolve_competency(c) for c in request.competencies or []]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        key = _flight_key("parse", request.competency, {
+            "text": normalize_text(request.response_text),
+            "sections": request.sections,
+            "previous_sections": previous_sections,
+        }, deadline)
+
+        def run_parse():
+            if previous_sections is not None:
+                return parser.reparse(request.response_text, previous_sections, request.sections)
+            return parser.parse(request.response_text, request.sections, shared_competencies)
+
+        parsed, usage, parse_meta = await cancel_on_disconnect(
+            http_request,
+            _run_shared_stage(key, parser, lambda: deadline.run_stage("parse", run_parse())),
+            "diagnostic_parse",
+        )
+        uc = _build_usage_cost(usage)
         return {
             "sections": parsed.sections,
             "raw_text": parsed.raw_text,
@@ -675,9 +978,15 @@ async def diagnostic_parse(request: DiagnosticParseRequest, http_request: Reques
                 "active_version": active_prompt.get("version"),
                 "active_template": active_prompt.get("content"),
             },
+            "_parse_meta": parse_meta,
             "_llm": llm_runtime,
             **uc,
         }
+    except HTTPException:
+        raise
+    except PipelineAborted as e:
+        logger.warning("diagnostic_parse aborted: %s", e)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error("diagnostic_parse FAILED:\n%s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
@@ -686,9 +995,13 @@ async def diagnostic_parse(request: DiagnosticParseRequest, http_request: Reques
 @app.post("/api/diagnostic/map")
 async def diagnostic_map(request: dict, http_request: Request):
     """Krok 2: Ekstrakcja dowodów dla wymiarów"""
+    return await _diagnostic_map(request, http_request)
+
+
+async def _diagnostic_map(request: dict, http_request: Optional[Request]) -> dict:
     try:
         competency = request.get("competency", "delegowanie")
-        user = getattr(http_request.state, "user", {})
+        user = _request_user(http_request)
         log_activity(action="diagnostic_map", actor=user.get("username", "?"), details={"competency": competency})
         _, mapper, _, _ = get_modules(competency)
         llm_runtime = get_llm_runtime()
@@ -705,38 +1018,42 @@ async def diagnostic_map(request: dict, http_request: Request):
                     sections[key] = request[key]
 
         parsed = ParsedResponse(sections=sections, raw_text=raw_text)
-        sections_text = "\n\n".join(
-            f"{k.upper().replace('_', ' ')}:\n{v}" for k, v in parsed.sections.items() if v
+        if mapper.mode == "per_dimension":
+            dimension_prompts, _ = mapper.build_dimension_prompts(parsed)
+            prompt_out = {"system": mapper.system_prompt, "per_dimension": dimension_prompts}
+        else:
+            prompt_sent, _ = mapper.build_prompt(parsed)
+            prompt_out = {"system": mapper.system_prompt, "user": prompt_sent}
+        deadline = Deadline.from_request(http_request, request.get("deadline_ms"))
+        key = _flight_key("map", competency, {
+            "mode": mapper.mode,
+            "sections": {k: normalize_text(v) for k, v in parsed.sections.items()},
+        }, deadline)
+        mapped, usage, map_meta = await cancel_on_disconnect(
+            http_request,
+            _run_shared_stage(key, mapper, lambda: deadline.run_stage("map", mapper.map(parsed))),
+            "diagnostic_map",
         )
-        prompt_sent = mapper.prompt_template.format(parsed_response=sections_text)
-        mapped = await mapper.map(parsed)
-        uc = _build_usage_cost(mapper.last_usage)
-
-        evidence_out = {}
-        for key, ev in mapped.evidence.items():
-            evidence_out[key] = {
-                "wymiar": ev.wymiar,
-                "znalezione_fragmenty": ev.znalezione_fragmenty,
-                "czy_obecny": ev.czy_obecny,
-                "notatki": ev.notatki,
-            }
+        uc = _build_usage_cost(usage)
+
         return {
-            "evidence": evidence_out,
+            "evidence": _evidence_out(mapped.evidence),
             "parsed_response": {"sections": parsed.sections, "raw_text": parsed.raw_text},
             "competency": competency,
-            "_prompt": {
-                "system": mapper.system_prompt,
-                "user": prompt_sent,
-            },
+            "_prompt": prompt_out,
             "_prompt_meta": {
                 "module": "map",
                 "competency": competency,
                 "active_version": active_prompt.get("version"),
                 "active_template": active_prompt.get("content"),
             },
+            "_map_meta": map_meta,
             "_llm": llm_runtime,
             **uc,
         }
+    except PipelineAborted as e:
+        logger.warning("diagnostic_map aborted: %s", e)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error("diagnostic_map FAILED:\n%s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
@@ -745,9 +1062,13 @@ async def diagnostic_map(request: dict, http_request: Request):
 @app.post("/api/diagnostic/score")
 async def diagnostic_score(request: dict, http_request: Request):
     """Krok 3: Scoring - ocena wymiarów i wynik końcowy"""
+    return await _diagnostic_score(request, http_request)
+
+
+async def _diagnostic_score(request: dict, http_request: Optional[Request]) -> dict:
     try:
         competency = request.get("competency", "delegowanie")
-        user = getattr(http_request.state, "user", {})
+        user = _request_user(http_request)
         log_activity(action="diagnostic_score", actor=user.get("username", "?"), details={"competency": competency})
         _, _, scorer, _ = get_modules(competency)
         llm_runtime = get_llm_runtime()
@@ -792,29 +1113,24 @@ async def diagnostic_score(request: dict, http_request: Request):
             else:
                 score_prompts[wymiar_key] = "(wymiar nieobecny – pominięty, ocena = 0.0)"
 
-        scoring = await scorer.score(mapped)
-        uc = _build_usage_cost(scorer.last_usage)
-        dim_out = {}
-        for key, ds in scoring.dimension_scores.items():
-            dim_out[key] = {
-                "wymiar": ds.wymiar,
-                "ocena": ds.ocena,
-                "waga": ds.waga,
-                "punkty": ds.punkty,
-                "uzasadnienie": ds.uzasadnienie,
-            }
+        deadline = Deadline.from_request(http_request, request.get("deadline_ms"))
+        key = _flight_key("score", competency, {
+            "evidence": {k: v.model_dump() for k, v in evidence_dict.items()},
+            "weights": scorer.weights,
+        }, deadline)
+        scoring, usage, _ = await cancel_on_disconnect(
+            http_request,
+            _run_shared_stage(key, scorer, lambda: deadline.run_stage("score", scorer.score(mapped))),
+            "diagnostic_score",
+        )
+        uc = _build_usage_cost(usage)
         return {
             "ocena": scoring.ocena,
             "ocena_delegowanie": scoring.ocena,  # backward compat
             "poziom": scoring.poziom,
-            "dimension_scores": dim_out,
+            "dimension_scores": _dimension_scores_out(scoring),
             "competency": competency,
-            "evidence": {k: {
-                "wymiar": v.wymiar,
-                "znalezione_fragmenty": v.znalezione_fragmenty,
-                "czy_obecny": v.czy_obecny,
-                "notatki": v.notatki,
-            } for k, v in mapped.evidence.items()},
+            "evidence": _evidence_out(mapped.evidence),
             "parsed_response": {"sections": parsed.sections, "raw_text": parsed.raw_text},
             "_prompt": {
                 "system": scorer.system_prompt,
@@ -829,6 +1145,9 @@ async def diagnostic_score(request: dict, http_request: Request):
             "_llm": llm_runtime,
             **uc,
         }
+    except PipelineAborted as e:
+        logger.warning("diagnostic_score aborted: %s", e)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error("diagnostic_score FAILED:\n%s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
@@ -837,82 +1156,457 @@ async def diagnostic_score(request: dict, http_request: Request):
 @app.post("/api/diagnostic/feedback")
 async def diagnostic_feedback(request: dict, http_request: Request):
     """Krok 4: Generowanie feedbacku rozwojowego"""
+    return await _diagnostic_feedback(request, http_request)
+
+
+def _feedback_scoring(request: dict) -> ScoringResult:
+    """ScoringResult z ciała żądania feedbacku (wynik kroku score + dowody + sparsowana odpowiedź)."""
+    pr_data = request.get("parsed_response", {})
+    sections = pr_data.get("sections", {})
+    raw_text = pr_data.get("raw_text", "")
+
+    if not sections:
+        sections = {}
+        for key in ["przygotowanie", "przebieg", "decyzje", "efekty"]:
+            if key in pr_data:
+                sections[key] = pr_data[key]
+
+    parsed = ParsedResponse(sections=sections, raw_text=raw_text)
+
+    evidence_dict = {}
+    for key, ev_data in request.get("evidence", {}).items():
+        evidence_dict[key] = WymiarEvidence(
+            wymiar=ev_data.get("wymiar", key),
+            znalezione_fragmenty=ev_data.get("znalezione_fragmenty", []),
+            czy_obecny=ev_data.get("czy_obecny", False),
+            notatki=ev_data.get("notatki"),
+        )
+    mapped = MappedResponse(evidence=evidence_dict, parsed_response=parsed)
+
+    dim_scores = {}
+    for key, ds_data in request.get("dimension_scores", {}).items():
+        dim_scores[key] = DimensionScore(
+            wymiar=ds_data.get("wymiar", key),
+            ocena=ds_data.get("ocena", 0.0),
+            waga=ds_data.get("waga", 0.0),
+            punkty=ds_data.get("punkty", 0.0),
+            uzasadnienie=ds_data.get("uzasadnienie", ""),
+            rozrzut=ds_data.get("rozrzut"),
+            liczba_probek=ds_data.get("liczba_probek", 1),
+        )
+
+    ocena = request.get("ocena", request.get("ocena_delegowanie", 0.0))
+    return ScoringResult(
+        ocena=ocena,
+        poziom=request.get("poziom", ""),
+        dimension_scores=dim_scores,
+        mapped_response=mapped,
+    )
+
+
+def _feedback_out(
+    feedback: Feedback,
+    fg: FeedbackGenerator,
+    scoring: ScoringResult,
+    competency: str,
+    usage: Optional[dict],
+    feedback_meta: dict,
+) -> dict:
+    active_prompt = pm_get_prompt("feedback", competency=competency)
+    prompt_sent = fg.prompt_template.format(
+        score=scoring.ocena,
+        level=scoring.poziom,
+        dimension_scores=fg._format_dimension_scores(scoring),
+        evidence=fg._format_evidence(scoring),
+    )
+    return {
+        "summary": feedback.summary,
+        "recommendation": feedback.recommendation,
+        "mocne_strony": feedback.mocne_strony,
+        "obszary_rozwoju": feedback.obszary_rozwoju,
+        "competency": competency,
+        "_prompt": {
+            "system": fg.system_prompt,
+            "user": prompt_sent,
+        },
+        "_prompt_meta": {
+            "module": "feedback",
+            "competency": competency,
+            "active_version": active_prompt.get("version"),
+            "active_template": active_prompt.get("content"),
+        },
+        "_feedback_meta": feedback_meta,
+        "_llm": get_llm_runtime(),
+        **_build_usage_cost(usage),
+    }
+
+
+async def _diagnostic_feedback(request: dict, http_request: Optional[Request]) -> dict:
     try:
         competency = request.get("competency", "delegowanie")
-        user = getattr(http_request.state, "user", {})
+        user = _request_user(http_request)
         log_activity(action="diagnostic_feedback", actor=user.get("username", "?"), details={"competency": competency})
         _, _, _, fg = get_modules(competency)
-        llm_runtime = get_llm_runtime()
-        active_prompt = pm_get_prompt("feedback", competency=competency)
+        scoring = _feedback_scoring(request)
+        deadline = Deadline.from_request(http_request, request.get("deadline_ms"))
+        key = _flight_key("feedback", competency, {
+            "ocena": scoring.ocena,
+            "poziom": scoring.poziom,
+            "dimension_scores": {k: v.model_dump() for k, v in scoring.dimension_scores.items()},
+            "evidence": {k: v.model_dump() for k, v in scoring.mapped_response.evidence.items()},
+        }, deadline)
+        feedback, usage, feedback_meta = await cancel_on_disconnect(
+            http_request,
+            _run_shared_stage(key, fg, lambda: deadline.run_stage("feedback", fg.generate(scoring))),
+            "diagnostic_feedback",
+        )
+        return _feedback_out(feedback, fg, scoring, competency, usage, feedback_meta)
+    except PipelineAborted as e:
+        logger.warning("diagnostic_feedback aborted: %s", e)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        logger.error("diagnostic_feedback FAILED:\n%s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
 
-        pr_data = request.get("parsed_response", {})
-        sections = pr_data.get("sections", {})
-        raw_text = pr_data.get("raw_text", "")
 
-        if not sections:
-            sections = {}
-            for key in ["przygotowanie", "przebieg", "decyzje", "efekty"]:
-                if key in pr_data:
-                    sections[key] = pr_data[key]
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-        parsed = ParsedResponse(sections=sections, raw_text=raw_text)
 
-        evidence_dict = {}
-        for key, ev_data in request.get("evidence", {}).items():
-            evidence_dict[key] = WymiarEvidence(
-                wymiar=ev_data.get("wymiar", key),
-                znalezione_fragmenty=ev_data.get("znalezione_fragmenty", []),
-                czy_obecny=ev_data.get("czy_obecny", False),
-                notatki=ev_data.get("notatki"),
-            )
-        mapped = MappedResponse(evidence=evidence_dict, parsed_response=parsed)
+@app.post("/api/diagnostic/feedback/stream")
+async def diagnostic_feedback_stream(request: dict, http_request: Request):
+    """Krok 4 strumieniowo (Server-Sent Events): fragmenty summary w miarę generowania, kompletne pola
+    i elementy list, na końcu zdarzenie `done` z tym samym wynikiem co /api/diagnostic/feedback.
+    Bez współdzielenia wykonania z identycznymi żądaniami (każdy klient dostaje własny strumień)."""
+    competency = request.get("competency", "delegowanie")
+    user = _request_user(http_request)
+    log_activity(action="diagnostic_feedback_stream", actor=user.get("username", "?"), details={"competency": competency})
+    try:
+        _, _, _, fg = get_modules(competency)
+        scoring = _feedback_scoring(request)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    deadline = Deadline.from_request(http_request, request.get("deadline_ms"))
+
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(deadline.run_stage("feedback", fg.generate(scoring, on_event=queue.put_nowait)))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (event := await queue.get()) is not None:
+                yield _sse(event.pop("type"), event)
+            try:
+                feedback = task.result()
+            except PipelineAborted as e:
+                logger.warning("diagnostic_feedback_stream aborted: %s", e)
+                yield _sse("error", {"status": e.status_code, "detail": str(e)})
+                return
+            except Exception as e:
+                logger.error("diagnostic_feedback_stream FAILED:\n%s", traceback.format_exc())
+                yield _sse("error", {"status": 500, "detail": str(e)})
+                return
+            yield _sse("done", _feedback_out(feedback, fg, scoring, competency, fg.last_usage, fg.last_meta))
+        finally:
+            # Rozłączenie klienta zamyka generator - przerwij generowanie po stronie LLM
+            task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        dim_scores = {}
-        for key, ds_data in request.get("dimension_scores", {}).items():
-            dim_scores[key] = DimensionScore(
-                wymiar=ds_data.get("wymiar", key),
-                ocena=ds_data.get("ocena", 0.0),
-                waga=ds_data.get("waga", 0.0),
-                punkty=ds_data.get("punkty", 0.0),
-                uzasadnienie=ds_data.get("uzasadnienie", ""),
-            )
 
-        ocena = request.get("ocena", request.get("ocena_delegowanie", 0.0))
-        scoring = ScoringResult(
-            ocena=ocena,
-            poziom=request.get("poziom", ""),
-            dimension_scores=dim_scores,
-            mapped_response=mapped,
+# ---------------------------------------------------------------------------
+# PIPELINE RUNS - wyniki etapów trzymane po stronie serwera, kolejne kroki po id
+# ---------------------------------------------------------------------------
+
+class CreatePipelineRunRequest(BaseModel):
+    response_text: str = Field(..., min_length=50)
+    competency: str = Field(default="delegowanie")
+    participant_id: str = Field(default="P001")
+    sections: Optional[Dict[str, str]] = Field(default=None)
+
+
+class RunStageRequest(BaseModel):
+    deadline_ms: Optional[int] = Field(default=None, ge=1)
+
+
+class SavePipelineRunRequest(BaseModel):
+    run_name: str = ""
+
+
+_STAGE_HANDLERS = {
+    "map": _diagnostic_map,
+    "score": _diagnostic_score,
+    "feedback": _diagnostic_feedback,
+}
+
+
+async def _get_owned_run(run_id: str, request: Request) -> dict:
+    user = getattr(request.state, "user", {})
+    run = await db_get_pipeline_run(run_id)
+    if not run or (run["created_by"] != user.get("username") and user.get("role") != "admin"):
+        raise HTTPException(status_code=404, detail="Run nie znaleziony")
+    return run
+
+
+@app.post("/api/pipeline/runs")
+async def create_pipeline_run(req: CreatePipelineRunRequest, request: Request):
+    """Tworzy run pipeline'u; etapy uruchamia się potem po id (bez przesyłania wyników)."""
+    competency = resolve_competency(req.competency)
+    if competency not in get_available_competencies():
+        raise HTTPException(status_code=400, detail=f"Nieznana kompetencja: {req.competency}")
+    if req.sections:
+        parser, _, _, _ = get_modules(competency)
+        _check_section_keys(parser, req.sections)
+    user = getattr(request.state, "user", {})
+    return await db_create_pipeline_run(
+        participant_id=req.participant_id,
+        competency=competency,
+        response_text=req.response_text,
+        created_by=user.get("username", "anonymous"),
+        input_sections=req.sections,
+    )
+
+
+@app.get("/api/pipeline/runs")
+async def list_pipeline_runs(request: Request, limit: int = 100):
+    """Lista runów użytkownika (admin widzi wszystkie)."""
+    user = getattr(request.state, "user", {})
+    created_by = None if user.get("role") == "admin" else user.get("username")
+    return await db_list_pipeline_runs(created_by=created_by, limit=max(1, min(limit, 500)))
+
+
+@app.get("/api/pipeline/runs/{run_id}")
+async def get_pipeline_run(run_id: str, request: Request):
+    return await _get_owned_run(run_id, request)
+
+
+@app.post("/api/pipeline/runs/{run_id}/stages/{stage}")
+async def run_pipeline_stage(run_id: str, stage: str, request: Request, req: Optional[RunStageRequest] = None):
+    """Uruchamia (lub ponawia) jeden etap na wejściu z poprzedniego etapu zapisanego w runie.
+    Wyniki etapów zależnych są unieważniane."""
+    if stage not in PIPELINE_STAGES:
+        raise HTTPException(status_code=404, detail=f"Nieznany etap: {stage}")
+    run = await _get_owned_run(run_id, request)
+    deadline_ms = req.deadline_ms if req else None
+    index = PIPELINE_STAGES.index(stage)
+
+    start = time.perf_counter()
+    if stage == "parse":
+        output = await _diagnostic_parse(
+            DiagnosticParseRequest(
+                response_text=run["response_text"],
+                competency=run["competency"],
+                deadline_ms=deadline_ms,
+                sections=run["input_sections"],
+            ),
+            request,
         )
-        prompt_sent = fg.prompt_template.format(
-            score=scoring.ocena,
-            level=scoring.poziom,
-            dimension_scores=fg._format_dimension_scores(scoring),
-            evidence=fg._format_evidence(scoring),
+    else:
+        previous = PIPELINE_STAGES[index - 1]
+        if previous not in run["stages"]:
+            raise HTTPException(status_code=409, detail=f"Najpierw uruchom etap {previous}")
+        payload = {**run["stages"][previous], "competency": run["competency"], "deadline_ms": deadline_ms}
+        output = await _STAGE_HANDLERS[stage](payload, request)
+    duration_ms = int((time.perf_counter() - start) * 1000)
+
+    invalidated = [s for s in PIPELINE_STAGES[index + 1:] if s in run["stages"]]
+    await db_save_pipeline_stage(run_id, stage, output, duration_ms, invalidate=list(PIPELINE_STAGES[index + 1:]))
+    return {**output, "_run": {"id": run_id, "stage": stage, "duration_ms": duration_ms, "invalidated": invalidated}}
+
+
+@app.post("/api/pipeline/runs/{run_id}/save")
+async def save_pipeline_run(run_id: str, request: Request, req: Optional[SavePipelineRunRequest] = None):
+    """Zapisuje kompletny run jako ocenę - jedna transakcja, bez przesyłania wyników przez klienta."""
+    run = await _get_owned_run(run_id, request)
+    missing = [stage for stage in PIPELINE_STAGES if stage not in run["stages"]]
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Run niekompletny, brak etapów: {missing}")
+    user = getattr(request.state, "user", {})
+    username = user.get("username", "anonymous")
+    try:
+        result = await db_save_pipeline_run_assessment(
+            run,
+            created_by=username,
+            prompt_versions=pm_get_active_versions(run["competency"]),
+            run_name=req.run_name if req else "",
         )
-        feedback = await fg.generate(scoring)
-        uc = _build_usage_cost(fg.last_usage)
-        return {
+    except Exception as e:
+        logger.error("save_pipeline_run FAILED:\n%s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    log_activity(
+        action="session_save",
+        actor=username,
+        details={"participant": run["participant_id"], "competency": run["competency"], "session_id": result["id"], "run_id": run_id},
+    )
+    return {"ok": True, "filename": result["filename"], "id": result["id"]}
+
+
+class ReviseRunRequest(BaseModel):
+    response_text: str = Field(..., min_length=50)
+    sections: Optional[Dict[str, str]] = Field(default=None)
+    feedback: bool = True
+    deadline_ms: Optional[int] = Field(default=None, ge=1)
+
+
+def _prompt_meta(module: str, competency: str) -> dict:
+    return {
+        "module": module,
+        "competency": competency,
+        "active_version": pm_get_prompt(module, competency=competency).get("version"),
+    }
+
+
+async def _revise_run(previous: dict, new_run: dict, req: ReviseRunRequest, http_request: Request) -> dict:
+    competency = previous["competency"]
+    deadline = Deadline.from_request(http_request, req.deadline_ms)
+    llm_runtime = get_llm_runtime()
+    timing: dict[str, int] = {}
+
+    # PARSE - poprzedni podział przenoszony tylko przy tej samej wersji promptu parse
+    start = time.perf_counter()
+    previous_parse = previous["stages"]["parse"]
+    old_sections = previous_parse.get("sections", {})
+    same_prompt = (previous_parse.get("_prompt_meta") or {}).get("active_version") == (
+        pm_get_prompt("parse", competency=competency).get("version")
+    )
+    parse_out = await _diagnostic_parse(
+        DiagnosticParseRequest(response_text=req.response_text, competency=competency, sections=req.sections),
+        http_request,
+        previous_sections=old_sections if same_prompt else None,
+    )
+    timing["parse_ms"] = int((time.perf_counter() - start) * 1000)
+
+    new_sections = parse_out["sections"]
+    parsed = ParsedResponse(sections=new_sections, raw_text=req.response_text)
+    changed = changed_sections(old_sections, new_sections)
+
+    # MAP - tylko wymiary, których sekcje źródłowe się zmieniły
+    start = time.perf_counter()
+    _, mapper, scorer, fg = get_modules(competency)
+    old_evidence = previous["stages"]["map"].get("evidence", {})
+    remap, supporting = dimensions_to_remap(
+        old_sections, new_sections, old_evidence, get_rubric_index(competency, mapper.wymiary), changed,
+    )
+    remapped = {}
+    map_usage = None
+    if remap:
+        remapped = await deadline.run_stage("map", mapper.map_dimensions(parsed, remap), PIPELINE_STAGES[1:])
+        map_usage = mapper.last_usage
+    evidence = {
+        key: remapped[key] if key in remapped else WymiarEvidence(**{"wymiar": key, **old_evidence[key]})
+        for key in mapper.wymiary
+    }
+    mapped = MappedResponse(evidence=evidence, parsed_response=parsed)
+    timing["map_ms"] = int((time.perf_counter() - start) * 1000)
+
+    # SCORE - tylko wymiary ze zmienionymi dowodami
+    start = time.perf_counter()
+    rescored = {key for key, ev in remapped.items() if evidence_changed(old_evidence.get(key, {}), ev)}
+    previous_dimensions = previous["stages"]["score"].get("dimension_scores", {})
+    previous_scores = {key: value.get("ocena", 0.0) for key, value in previous_dimensions.items()}
+    previous_samples = {
+        key: (value.get("rozrzut"), value.get("liczba_probek", 1)) for key, value in previous_dimensions.items()
+    }
+    scoring = await deadline.run_stage(
+        "score", scorer.rescore(mapped, previous_scores, rescored, previous_samples), PIPELINE_STAGES[2:]
+    )
+    timing["score_ms"] = int((time.perf_counter() - start) * 1000)
+
+    # FEEDBACK - nowy tylko gdy zmieniły się dowody lub oceny
+    start = time.perf_counter()
+    previous_feedback = previous["stages"].get("feedback")
+    feedback_out = None
+    if req.feedback and (rescored or not previous_feedback):
+        feedback = await deadline.run_stage("feedback", fg.generate(scoring), PIPELINE_STAGES[3:])
+        feedback_out = {
             "summary": feedback.summary,
             "recommendation": feedback.recommendation,
             "mocne_strony": feedback.mocne_strony,
             "obszary_rozwoju": feedback.obszary_rozwoju,
             "competency": competency,
-            "_prompt": {
-                "system": fg.system_prompt,
-                "user": prompt_sent,
-            },
-            "_prompt_meta": {
-                "module": "feedback",
-                "competency": competency,
-                "active_version": active_prompt.get("version"),
-                "active_template": active_prompt.get("content"),
-            },
+            "_prompt_meta": _prompt_meta("feedback", competency),
+            "_feedback_meta": dict(fg.last_meta),
             "_llm": llm_runtime,
-            **uc,
+            **_build_usage_cost(fg.last_usage),
         }
+    elif req.feedback and previous_feedback:
+        feedback_out = {**previous_feedback, "_usage": None, "_cost": None, "_reused_from_run": previous["id"]}
+    timing["feedback_ms"] = int((time.perf_counter() - start) * 1000)
+
+    parsed_out = {"sections": parsed.sections, "raw_text": parsed.raw_text}
+    incremental = {
+        "previous_run_id": previous["id"],
+        "changed_sections": sorted(changed),
+        "remapped": sorted(remap),
+        "rescored": sorted(rescored),
+        "feedback_regenerated": bool(req.feedback and (rescored or not previous_feedback)),
+        "supporting_sections": {key: sorted(value) for key, value in supporting.items()},
+    }
+    stages = {
+        "parse": parse_out,
+        "map": {
+            "evidence": _evidence_out(evidence),
+            "parsed_response": parsed_out,
+            "competency": competency,
+            "_prompt_meta": _prompt_meta("map", competency),
+            "_map_meta": {**mapper.last_meta, "incremental": incremental} if remap else {"incremental": incremental},
+            "_llm": llm_runtime,
+            **_build_usage_cost(map_usage),
+        },
+        "score": {
+            "ocena": scoring.ocena,
+            "ocena_delegowanie": scoring.ocena,
+            "poziom": scoring.poziom,
+            "dimension_scores": _dimension_scores_out(scoring),
+            "competency": competency,
+            "evidence": _evidence_out(evidence),
+            "parsed_response": parsed_out,
+            "_prompt_meta": _prompt_meta("score", competency),
+            "_llm": llm_runtime,
+            **_build_usage_cost(scorer.last_usage),
+        },
+    }
+    if feedback_out is not None:
+        stages["feedback"] = feedback_out
+
+    await db_save_pipeline_stages(
+        new_run["id"], {stage: (output, timing.get(f"{stage}_ms")) for stage, output in stages.items()},
+    )
+    return {"run_id": new_run["id"], "stages": stages, "timing": timing, "_incremental": incremental}
+
+
+@app.post("/api/pipeline/runs/{run_id}/revise")
+async def revise_pipeline_run(run_id: str, req: ReviseRunRequest, request: Request):
+    """Ocena przyrostowa poprawionej odpowiedzi względem poprzedniego runu.
+    Tworzy nowy run (parent_run_id = run_id); niezmienione wymiary biorą wyniki z poprzedniego runu."""
+    previous = await _get_owned_run(run_id, request)
+    missing = [stage for stage in ("parse", "map", "score") if stage not in previous["stages"]]
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Poprzedni run nie ma etapów: {missing}")
+    if req.sections:
+        parser, _, _, _ = get_modules(previous["competency"])
+        _check_section_keys(parser, req.sections)
+
+    user = getattr(request.state, "user", {})
+    new_run = await db_create_pipeline_run(
+        participant_id=previous["participant_id"],
+        competency=previous["competency"],
+        response_text=req.response_text,
+        created_by=user.get("username", "anonymous"),
+        input_sections=req.sections,
+        parent_run_id=run_id,
+    )
+    try:
+        return await cancel_on_disconnect(request, _revise_run(previous, new_run, req, request), f"revise {run_id}")
+    except HTTPException:
+        raise
+    except PipelineAborted as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
-        logger.error("diagnostic_feedback FAILED:\n%s", traceback.format_exc())
+        logger.error("revise_pipeline_run FAILED:\n%s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -983,10 +1677,35 @@ async def save_run(req: SaveRunRequest, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Stronicowanie list (keyset): odpowiedź to strona wyników, kursor następnej strony w nagłówku
+# NEXT_CURSOR_HEADER (brak nagłówka = ostatnia strona). Kolejna strona: ten sam URL z ?cursor=<wartość nagłówka>.
+async def _list_page(response: Response, fetch, **filters) -> list[dict]:
+    try:
+        items, next_cursor = await fetch(**filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
+
+
 @app.get("/api/runs")
-async def list_runs(request: Request, competency: Optional[str] = None, module: Optional[str] = None):
-    """Lista zapisanych runów prompt/result z opcjonalnym filtrem."""
-    return await db_list_runs(competency=competency, module=module)
+async def list_runs(
+    request: Request,
+    response: Response,
+    competency: Optional[str] = None,
+    module: Optional[str] = None,
+    participant_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+):
+    """Lista zapisanych runów prompt/result z opcjonalnym filtrem, stronicowana kursorem."""
+    return await _list_page(
+        response, db_list_runs_page, competency=competency, module=module, participant_id=participant_id,
+        date_from=date_from, date_to=date_to, limit=limit, cursor=cursor,
+    )
 
 
 @app.get("/api/runs/{filename}")
@@ -999,9 +1718,25 @@ async def get_run_file(filename: str, request: Request):
 
 
 @app.get("/api/sessions")
-async def list_sessions(request: Request, competency: Optional[str] = None):
-    """Lista zapisanych sesji diagnostycznych. Opcjonalny filtr po kompetencji."""
-    return await db_list_assessments(competency=competency)
+async def list_sessions(
+    request: Request,
+    response: Response,
+    competency: Optional[str] = None,
+    participant_id: Optional[str] = None,
+    llm_model: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    score_min: Optional[float] = None,
+    score_max: Optional[float] = None,
+    limit: int = 200,
+    cursor: Optional[str] = None,
+):
+    """Lista zapisanych sesji diagnostycznych od najnowszych, z filtrami i stronicowaniem kursorem."""
+    return await _list_page(
+        response, db_list_assessments_page, competency=competency, participant_id=participant_id,
+        llm_model=llm_model, date_from=date_from, date_to=date_to, score_min=score_min, score_max=score_max,
+        limit=limit, cursor=cursor,
+    )
 
 
 @app.get("/api/sessions/compare")
@@ -1034,15 +1769,24 @@ async def delete_session(filename: str, request: Request):
 @app.get("/api/db/assessments")
 async def list_db_assessments(
     request: Request,
+    response: Response,
     competency: Optional[str] = None,
     participant_id: Optional[str] = None,
+    llm_model: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    score_min: Optional[float] = None,
+    score_max: Optional[float] = None,
     limit: int = 200,
+    text_hash: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
-    """Lista ocen z bazy danych z opcjonalnym filtrowaniem."""
-    return await db_list_assessments(
-        competency=competency,
-        participant_id=participant_id,
-        limit=limit,
+    """Lista ocen z bazy danych z opcjonalnym filtrowaniem (text_hash - oceny tego samego tekstu)
+    i stronicowaniem kursorem."""
+    return await _list_page(
+        response, db_list_assessments_page, competency=competency, participant_id=participant_id,
+        llm_model=llm_model, date_from=date_from, date_to=date_to, score_min=score_min, score_max=score_max,
+        limit=limit, text_hash=text_hash, cursor=cursor,
     )
 
 
@@ -1055,6 +1799,287 @@ async def get_db_assessment(assessment_id: int, request: Request):
     return assessment
 
 
+# ---------------------------------------------------------------------------
+# REASSESSMENT - ponowna ocena tylko unieważnionych etapów
+# ---------------------------------------------------------------------------
+
+class ReassessRequest(BaseModel):
+    dry_run: bool = False
+    force_from: Optional[str] = Field(default=None, pattern="^(parse|map|score|feedback)$")
+
+
+class JobSchedule(BaseModel):
+    policy: str = Field(default="now", pattern="^(now|window|idle)$")
+    window: Optional[str] = Field(default=None, description="Okno czasu lokalnego, np. 22:00-06:00")
+    idle_seconds: Optional[int] = Field(default=None, ge=0)
+
+
+class ReassessJobRequest(ReassessRequest):
+    competency: Optional[str] = None
+    participant_id: Optional[str] = None
+    assessment_ids: Optional[List[int]] = None
+    limit: int = Field(default=200, ge=1, le=1000)
+    schedule: Optional[JobSchedule] = None
+
+
+def _current_pipeline_state(competency: str) -> dict:
+    """Aktualne wersje promptów, model i wagi - porównywane z zapisanymi w ocenie."""
+    weights_path = Path(__file__).parent.parent / "config" / "weights.json"
+    with open(weights_path, "r", encoding="utf-8") as f:
+        weights_data = json.load(f)
+    return {
+        "prompt_versions": pm_get_active_versions(competency),
+        "model": get_llm_runtime().get("model"),
+        "weights": weights_data.get(competency, {}),
+    }
+
+
+async def _run_stage_detached(stage: str, payload: dict) -> dict:
+    """Etap pipeline'u poza żądaniem HTTP (zadania w tle, ponowna ocena)."""
+    if stage == "parse":
+        return await _diagnostic_parse(
+            DiagnosticParseRequest(
+                response_text=payload["response_text"],
+                competency=payload["competency"],
+                competencies=payload.get("competencies"),
+            ),
+            None,
+        )
+    return await _STAGE_HANDLERS[stage](payload, None)
+
+
+async def _reassess_assessment(
+    assessment_id: int,
+    created_by: str,
+    force_from: Optional[str] = None,
+    dry_run: bool = False,
+) -> dict:
+    assessment = await db_get_assessment_by_id(assessment_id)
+    if not assessment:
+        raise LookupError(f"Ocena {assessment_id} nie istnieje")
+    state = _current_pipeline_state(assessment["competency"])
+    plan = plan_reassessment(assessment, state, force_from)
+    if dry_run or plan["up_to_date"]:
+        return {"plan": plan, "new_assessment": None}
+
+    steps = await execute_reassessment(assessment, plan, _run_stage_detached, state["weights"])
+    saved = await db_save_assessment(
+        participant_id=assessment["participant_id"],
+        competency=assessment["competency"],
+        steps={**steps, "response_text": assessment["response_text"]},
+        created_by=created_by,
+        prompt_versions=state["prompt_versions"],
+        run_name=f"reassess #{assessment_id}",
+        reassessed_from=assessment_id,
+    )
+    return {"plan": plan, "new_assessment": saved}
+
+
+def _reassess_job_worker(params: dict, created_by: str):
+    async def worker(assessment_id: int) -> Optional[dict]:
+        result = await _reassess_assessment(assessment_id, created_by, params.get("force_from"), params.get("dry_run", False))
+        if params.get("dry_run"):
+            return {"status": "planned", "actions": result["plan"]["actions"]}
+        if result["new_assessment"] is None:
+            return None
+        return {"status": "done", "new_assessment_id": result["new_assessment"]["id"], "actions": result["plan"]["actions"]}
+    return worker
+
+
+register_job_kind("reassess", _reassess_job_worker)
+
+
+@app.post("/api/db/assessments/{assessment_id}/reassess")
+async def reassess_db_assessment(assessment_id: int, request: Request, req: Optional[ReassessRequest] = None):
+    """Ponowna ocena: uruchamia tylko etapy unieważnione zmianą promptów/modelu/wag (i zależne).
+    Wynik zapisywany jest jako nowa ocena z reassessed_from = assessment_id."""
+    req = req or ReassessRequest()
+    user = getattr(request.state, "user", {})
+    try:
+        result = await _reassess_assessment(assessment_id, user.get("username", "anonymous"), req.force_from, req.dry_run)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PipelineAborted as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        logger.error("reassess FAILED:\n%s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    if result["new_assessment"]:
+        log_activity(
+            action="reassess",
+            actor=user.get("username", "?"),
+            details={"assessment_id": assessment_id, "new_id": result["new_assessment"]["id"]},
+        )
+    return result
+
+
+@app.post("/api/reassess/jobs")
+async def create_reassess_job(req: ReassessJobRequest, request: Request):
+    """Ponowna ocena przefiltrowanego zbioru ocen w tle (tylko admin)."""
+    user = getattr(request.state, "user", None)
+    if not user or user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Tylko admin")
+    if req.assessment_ids:
+        ids = list(dict.fromkeys(req.assessment_ids))[:req.limit]
+    else:
+        rows = await db_list_assessments(competency=req.competency, participant_id=req.participant_id, limit=req.limit)
+        # Oceny, które mają już nowszą wersję, nie są oceniane ponownie
+        superseded = {row["reassessed_from"] for row in rows if row.get("reassessed_from")}
+        ids = [row["id"] for row in rows if row["id"] not in superseded]
+
+    params = req.model_dump(exclude={"schedule"})
+    try:
+        job = await start_job(
+            kind="reassess",
+            params=params,
+            items=ids,
+            worker=_reassess_job_worker(params, user["username"]),
+            created_by=user["username"],
+            schedule=req.schedule.model_dump() if req.schedule else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log_activity(action="reassess_job", actor=user["username"], details={"job_id": job["id"], "count": len(ids)})
+    return job
+
+
+@app.get("/api/reassess/jobs")
+async def list_reassess_jobs(request: Request, limit: int = 50):
+    user = getattr(request.state, "user", None)
+    if not user or user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Tylko admin")
+    return await db_list_jobs(kind="reassess", limit=limit)
+
+
+@app.get("/api/reassess/jobs/{job_id}")
+async def get_reassess_job(job_id: str, request: Request):
+    user = getattr(request.state, "user", None)
+    if not user or user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Tylko admin")
+    job = await db_get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Zadanie nie znalezione")
+    return job
+
+
+@app.post("/api/reassess/jobs/{job_id}/cancel")
+async def cancel_reassess_job(job_id: str, request: Request):
+    user = getattr(request.state, "user", None)
+    if not user or user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Tylko admin")
+    if cancel_job(job_id):
+        return {"ok": True, "id": job_id}
+    job = await db_get_job(job_id)
+    # Zadanie oczekujące na okno / bezczynność nie działa w żadnym procesie - wystarczy zmiana statusu
+    if job and job["status"] in ("queued", "waiting", "paused") and not job["lease_owner"]:
+        await db_update_job(job_id, status="cancelled", status_reason=f"anulowane przez {user['username']}")
+        return {"ok": True, "id": job_id}
+    raise HTTPException(status_code=409, detail="Zadanie nie działa w tym procesie lub zostało zakończone")
+
+
+# ---------------------------------------------------------------------------
+# BATCH JOBS - ocena wielu odpowiedzi w tle, harmonogram zadań
+# ---------------------------------------------------------------------------
+
+class BatchAssessItem(BaseModel):
+    participant_id: str = Field(..., min_length=1)
+    response_text: str = Field(..., min_length=50)
+    competency: str = "delegowanie"
+    label: Optional[str] = None
+
+
+class BatchAssessJobRequest(BaseModel):
+    items: List[BatchAssessItem] = Field(..., min_length=1, max_length=1000)
+    run_name: str = "batch"
+    schedule: Optional[JobSchedule] = None
+
+
+def _assess_job_worker(params: dict, created_by: str):
+    async def worker(item: dict) -> dict:
+        competency = item["competency"]
+        steps: dict[str, Any] = {}
+        previous: dict[str, Any] = {
+            "response_text": item["response_text"],
+            "competencies": item.get("shared_competencies"),
+        }
+        for stage in PIPELINE_STAGES:
+            steps[stage] = await _run_stage_detached(stage, {**previous, "competency": competency})
+            previous = steps[stage]
+        saved = await db_save_assessment(
+            participant_id=item["participant_id"],
+            competency=competency,
+            steps={**steps, "response_text": item["response_text"]},
+            created_by=created_by,
+            prompt_versions=pm_get_active_versions(competency),
+            run_name=params.get("run_name", "batch"),
+        )
+        return {"status": "done", "assessment_id": saved["id"], "score": steps["score"].get("ocena")}
+    return worker
+
+
+register_job_kind("assess", _assess_job_worker)
+
+
+@app.post("/api/jobs/assess")
+async def create_batch_assess_job(req: BatchAssessJobRequest, request: Request):
+    """Ocena wielu odpowiedzi w tle - od razu, w oknie czasu (np. nocą) lub gdy serwer LLM jest bezczynny."""
+    user = getattr(request.state, "user", {})
+    for item in req.items:
+        try:
+            resolve_competency(item.competency)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    # Ten sam tekst w kilku kompetencjach - jeden wspólny podział na sekcje zamiast parsowania per kompetencja
+    text_competencies: dict[str, list[str]] = {}
+    for item in req.items:
+        competencies = text_competencies.setdefault(item.response_text.strip(), [])
+        if resolve_competency(item.competency) not in competencies:
+            competencies.append(resolve_competency(item.competency))
+    items = [
+        {**item.model_dump(), "shared_competencies": text_competencies[item.response_text.strip()]}
+        for item in req.items
+    ]
+    params = {"run_name": req.run_name}
+    try:
+        job = await start_job(
+            kind="assess",
+            params=params,
+            items=items,
+            worker=_assess_job_worker(params, user.get("username", "anonymous")),
+            created_by=user.get("username", "anonymous"),
+            schedule=req.schedule.model_dump() if req.schedule else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log_activity(action="batch_assess_job", actor=user.get("username", "?"), details={"job_id": job["id"], "count": len(req.items)})
+    return job
+
+
+@app.get("/api/jobs/schedule")
+async def get_job_schedule(request: Request):
+    """Aktywne zadania w tle z harmonogramem: czy mogą teraz działać, powód wstrzymania, start okna."""
+    jobs = await db_list_active_jobs()
+    return {
+        "worker": JOB_WORKER_ID,
+        "running_here": running_jobs(),
+        "foreground_idle_s": round(LLM_SCHEDULER.foreground_idle_seconds(), 1),
+        "jobs": [
+            {
+                "id": job["id"],
+                "kind": job["kind"],
+                "status": job["status"],
+                "status_reason": job["status_reason"],
+                "progress": {key: job[key] for key in ("total", "done", "failed", "skipped")},
+                "lease_owner": job["lease_owner"],
+                "created_by": job["created_by"],
+                "created_at": job["created_at"],
+                "schedule": describe_schedule(job["schedule"]),
+            }
+            for job in jobs
+        ],
+    }
+
+
 @app.get("/api/db/stats")
 async def get_db_stats(request: Request):
     """Statystyki bazy danych ocen."""
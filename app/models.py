@@ -3,7 +3,7 @@ Modele Pydantic dla systemu oceny LEM
 Obsługuje 4 kompetencje: delegowanie, podejmowanie_decyzji, okreslanie_priorytetow, udzielanie_feedbacku
 """
 
-from pydantic import BaseModel, Field, field_validator, computed_field
+from pydantic import BaseModel, Field, field_validator, model_validator, computed_field
 from typing import Dict, List, Optional
 from datetime import datetime
 
@@ -22,6 +22,16 @@ class AssessmentRequest(BaseModel):
     response_text: str = Field(..., min_length=50, description="Odpowiedź uczestnika (min 50 znaków)")
     competency: str = Field(default="delegowanie", description="Oceniana kompetencja")
     case_id: str = Field(default="lem_v1", description="ID case'u")
+    deadline_ms: Optional[int] = Field(None, ge=1, description="Budżet czasu żądania w ms (dzielony między etapy)")
+    sections: Optional[Dict[str, str]] = Field(None, description="Odpowiedź już podzielona na sekcje (pomija etap parse)")
+
+    @model_validator(mode="before")
+    @classmethod
+    def fill_text_from_sections(cls, data):
+        """Dla wejścia z sekcjami response_text można pominąć - składany jest z sekcji."""
+        if isinstance(data, dict) and data.get("sections") and not data.get("response_text"):
+            data = {**data, "response_text": "\n\n".join(v for v in data["sections"].values() if v)}
+        return data
 
     @field_validator('response_text')
     @classmethod
@@ -81,6 +91,8 @@ class DimensionScore(BaseModel):
     waga: float = Field(..., ge=0.0, le=1.0, description="Waga wymiaru")
     punkty: float = Field(..., description="Punkty = ocena * waga")
     uzasadnienie: str = Field(..., description="Krótkie uzasadnienie oceny")
+    rozrzut: Optional[float] = Field(None, ge=0.0, le=1.0, description="Rozrzut próbek oceny (max-min); None dla jednej próbki")
+    liczba_probek: int = Field(1, ge=0, description="Liczba próbek LLM, z których policzono ocenę (0 = heurystyka/brak dowodów)")
 
 
 class ScoringResult(BaseModel):
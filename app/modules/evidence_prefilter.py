@@ -0,0 +1,225 @@
+"""
+Prefiltr dowodów dla mappera - lokalny ranking zdań względem wymiarów rubryki.
+Indeks BM25 budowany jest z opisów wymiarów (nazwa, opis, opisy poziomów i zachowania),
+tokeny polskie są sprowadzane do lekkiego rdzenia (bez diakrytyków, ucięte końcówki fleksyjne).
+Do LLM trafiają tylko najlepsze zdania-kandydaci dla każdego wymiaru.
+"""
+
+import hashlib
+import json
+import math
+import re
+from typing import Any, Optional
+
+from app.modules.section_splitter import fold_diacritics
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+STEM_LENGTH = 6
+MIN_STEM_LENGTH = 4
+
+# Końcówki fleksyjne i słowotwórcze (bez diakrytyków), od najdłuższych
+_SUFFIXES = sorted({
+    "owaniami", "owaniem", "owania", "owanie", "owaniu", "aniami", "eniami",
+    "aniem", "eniem", "ania", "enia", "anie", "enie", "aniu", "eniu",
+    "osciami", "oscia", "osci", "osc",
+    "ami", "ach", "ego", "emu", "owi", "ych", "ymi", "iej", "owa", "owe", "owy", "owej",
+    "om", "em", "ie", "a", "e", "i", "o", "u", "y",
+}, key=len, reverse=True)
+
+_STOPWORDS = {
+    "i", "oraz", "a", "ale", "lub", "albo", "czy", "nie", "tak", "to", "ten", "ta", "te", "tego", "tej",
+    "w", "we", "z", "ze", "na", "do", "od", "po", "za", "o", "u", "dla", "przez", "przy", "pod", "nad",
+    "jest", "sa", "byc", "bedzie", "sie", "jak", "co", "ktory", "ktora", "ktore", "jego", "jej", "ich",
+    "mnie", "mi", "ja", "ty", "on", "ona", "my", "wy", "go", "mu", "by", "tym", "tych", "jako", "tylko",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_LIST_ITEM_RE = re.compile(r"^(?:[-•*–]\s+|\d{1,2}[.)]\s+)")
+_BLOCK_END = (".", "!", "?", ":", '"', "”")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])(?<!\d\.)\s+(?=[\"„(A-ZĄĆĘŁŃÓŚŹŻ0-9])")
+
+_INDEX_CACHE: dict[str, "RubricIndex"] = {}
+
+
+def stem_pl(token: str) -> str:
+    """Lekki stemmer: obcina najdłuższą pasującą końcówkę, potem rdzeń do STEM_LENGTH znaków."""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            token = token[: -len(suffix)]
+            break
+    return token[:STEM_LENGTH]
+
+
+def analyze(text: str) -> list[str]:
+    """Tekst -> lista rdzeni (bez stopwords i bardzo krótkich tokenów)."""
+    return [
+        stem_pl(token)
+        for token in _TOKEN_RE.findall(fold_diacritics(text))
+        if token not in _STOPWORDS and len(token) > 2
+    ]
+
+
+def split_sentences(text: str) -> list[str]:
+    """Dzieli tekst sekcji na zdania. Linie złamane w środku zdania są sklejane,
+    punkty list i puste linie zawsze zaczynają nowy fragment."""
+    blocks: list[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            blocks.append("")
+            continue
+        if blocks and blocks[-1] and not _LIST_ITEM_RE.match(line) and not blocks[-1].endswith(_BLOCK_END):
+            blocks[-1] = f"{blocks[-1]} {line}"
+        else:
+            blocks.append(line)
+    sentences = []
+    for block in blocks:
+        sentences.extend(part.strip() for part in _SENTENCE_SPLIT_RE.split(block) if part.strip())
+    return sentences
+
+
+def _dimension_document(wymiar_def: dict) -> str:
+    parts = [wymiar_def.get("nazwa", ""), wymiar_def.get("opis", "")]
+    for level in wymiar_def.get("poziomy", {}).values():
+        parts.append(level.get("opis", ""))
+        parts.extend(level.get("zachowania", []))
+    return "\n".join(parts)
+
+
+class RubricIndex:
+    """Indeks BM25, w którym dokumentami są wymiary kompetencji."""
+
+    def __init__(self, wymiary: dict):
+        self.docs: dict[str, dict[str, int]] = {}
+        self.doc_len: dict[str, int] = {}
+        for key, wymiar_def in wymiary.items():
+            terms = analyze(_dimension_document(wymiar_def))
+            tf: dict[str, int] = {}
+            for term in terms:
+                tf[term] = tf.get(term, 0) + 1
+            self.docs[key] = tf
+            self.doc_len[key] = len(terms)
+        n_docs = len(self.docs)
+        self.avg_len = (sum(self.doc_len.values()) / n_docs) if n_docs else 0.0
+        df: dict[str, int] = {}
+        for tf in self.docs.values():
+            for term in tf:
+                df[term] = df.get(term, 0) + 1
+        self.idf = {
+            term: math.log(1 + (n_docs - count + 0.5) / (count + 0.5))
+            for term, count in df.items()
+        }
+
+    def score(self, query_terms: list[str], dimension: str) -> float:
+        tf = self.docs[dimension]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[dimension] / self.avg_len) if self.avg_len else BM25_K1
+        total = 0.0
+        for term in set(query_terms):
+            freq = tf.get(term)
+            if freq:
+                total += self.idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+        return total
+
+
+def get_rubric_index(competency: str, wymiary: dict) -> RubricIndex:
+    """Indeks z cache - klucz zawiera skrót definicji, więc edycja rubryki go unieważnia."""
+    digest = hashlib.sha1(json.dumps(wymiary, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+    cache_key = f"{competency}:{digest}"
+    index = _INDEX_CACHE.get(cache_key)
+    if index is None:
+        index = RubricIndex(wymiary)
+        _INDEX_CACHE[cache_key] = index
+    return index
+
+
+def _sentence_candidates(sections: dict[str, str]) -> list[tuple[str, int, str, list[str]]]:
+    candidates = []
+    for section_key, text in sections.items():
+        for position, sentence in enumerate(split_sentences(text or "")):
+            candidates.append((section_key, position, sentence, analyze(sentence)))
+    return candidates
+
+
+def _top_candidates(candidates: list, index: RubricIndex, dimension: str, top_k: int, min_score: float) -> list[tuple[float, int]]:
+    ranked = sorted(
+        ((index.score(terms, dimension), i) for i, (_, _, _, terms) in enumerate(candidates)),
+        reverse=True,
+    )
+    return [(score, i) for score, i in ranked[:top_k] if score >= min_score]
+
+
+def dimension_candidate_sections(
+    sections: dict[str, str],
+    index: RubricIndex,
+    *,
+    top_k: int = 3,
+    min_score: float = 0.5,
+) -> dict[str, set[str]]:
+    """Sekcje zawierające najlepsze zdania-kandydatów dla każdego wymiaru."""
+    candidates = _sentence_candidates(sections)
+    return {
+        dimension: {candidates[i][0] for _, i in _top_candidates(candidates, index, dimension, top_k, min_score)}
+        for dimension in index.docs
+    }
+
+
+def prefilter_sections(
+    sections: dict[str, str],
+    index: RubricIndex,
+    *,
+    top_k: int = 3,
+    max_sentences: int = 24,
+    min_score: float = 0.5,
+    max_ratio: float = 0.7,
+) -> tuple[Optional[dict[str, str]], dict[str, Any]]:
+    """Wybiera top_k zdań na wymiar (łącznie max max_sentences).
+
+    Zwraca (sekcje tylko z kandydatami, statystyki) albo (None, statystyki), gdy należy
+    wysłać pełny tekst: za mało trafień w rubryce lub zbyt mała oszczędność.
+    """
+    candidates = _sentence_candidates(sections)
+
+    chars_before = sum(len(text or "") for text in sections.values())
+    stats: dict[str, Any] = {
+        "applied": False,
+        "sentences_total": len(candidates),
+        "sentences_sent": len(candidates),
+        "chars_before": chars_before,
+        "chars_after": chars_before,
+        "dimensions_without_candidates": [],
+    }
+    if not candidates:
+        return None, stats
+
+    best_per_sentence: dict[int, float] = {}
+    uncovered = []
+    for dimension in index.docs:
+        chosen = _top_candidates(candidates, index, dimension, top_k, min_score)
+        if not chosen:
+            uncovered.append(dimension)
+        for score, i in chosen:
+            best_per_sentence[i] = max(best_per_sentence.get(i, 0.0), score)
+    stats["dimensions_without_candidates"] = uncovered
+
+    # Słabe dopasowanie do rubryki - bezpieczniej wysłać pełny tekst
+    if len(uncovered) * 2 > len(index.docs):
+        stats["fallback_reason"] = "low_rubric_coverage"
+        return None, stats
+
+    selected = sorted(best_per_sentence, key=lambda i: best_per_sentence[i], reverse=True)[:max_sentences]
+    selected_set = set(selected)
+    filtered: dict[str, list[str]] = {key: [] for key in sections}
+    for i, (section_key, _, sentence, _) in enumerate(candidates):
+        if i in selected_set:
+            filtered[section_key].append(sentence)
+
+    result = {key: "\n".join(sentences) for key, sentences in filtered.items()}
+    chars_after = sum(len(text) for text in result.values())
+    stats.update({"sentences_sent": len(selected_set), "chars_after": chars_after})
+    if chars_before and chars_after > chars_before * max_ratio:
+        stats.update({"sentences_sent": len(candidates), "chars_after": chars_before, "fallback_reason": "low_savings"})
+        return None, stats
+
+    stats["applied"] = True
+    return result, stats
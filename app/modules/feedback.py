@@ -4,13 +4,114 @@ Generuje spersonalizowany, zróżnicowany feedback rozwojowy (dynamicznie per ko
 """
 
 import json
-from typing import Any
-from app.llm_client import get_llm_client, get_model_name, max_tokens_param, temperature_param
-from app.json_utils import extract_json_from_text
+import logging
+import os
+import time
+from typing import Any, Callable
+from app.llm_client import (
+    create_chat_completion,
+    get_llm_client,
+    get_model_name,
+    max_tokens_param,
+    stream_chat_completion,
+    temperature_param,
+)
+from app.json_utils import JsonFieldStream, extract_json_from_text
 from app.models import ScoringResult, Feedback
 from app.rubric import get_wymiary_for_competency
 from app.prompt_manager import get_active_prompt_content, get_system_prompt
 
+logger = logging.getLogger("lem.feedback")
+
+# Naprawa pól, które nie przeszły kontroli jakości: krótki prompt tylko dla tych pól
+REPAIR_MAX_ATTEMPTS = int(os.getenv("LEM_FEEDBACK_REPAIR_ATTEMPTS", "2"))
+REPAIR_MAX_TOKENS = 400
+
+# pole -> (min, max) liczba słów (teksty) lub minimalna liczba punktów (listy)
+FIELD_LIMITS = {
+    "summary": (50, 150),
+    "recommendation": (10, 50),
+    "mocne_strony": (1, None),
+    "obszary_rozwoju": (1, None),
+}
+# Limit znaków pól tekstowych w app.models.Feedback (max_length)
+FIELD_MAX_CHARS = 1000
+
+FIELD_INSTRUCTIONS = {
+    "summary": "summary - podsumowanie oceny, 50-150 słów, 2-4 zdania, odwołanie do konkretnych wymiarów",
+    "recommendation": "recommendation - jedna konkretna akcja rozwojowa dla najsłabszego wymiaru, 10-50 słów",
+    "mocne_strony": "mocne_strony - lista 2-4 punktów \"Wymiar: krótki opis\" (wymiary z oceną > 0.6)",
+    "obszary_rozwoju": "obszary_rozwoju - lista 2-4 punktów \"Wymiar: czego brakuje\" (wymiary z oceną < 0.6)",
+}
+
+REPAIR_PROMPT_TEMPLATE = """Popraw wybrane pola feedbacku rozwojowego (kompetencja: {competency}).
+
+WYNIK: {score}/4.0, poziom: {level}
+OCENY WYMIARÓW:
+{dimension_scores}
+
+OBECNY FEEDBACK:
+{current}
+
+POPRAW TYLKO TE POLA (pozostałe są poprawne):
+{instructions}
+
+Zwróć TYLKO JSON z poprawionymi polami: {{{fields}}}"""
+
+
+# Opóźnienia generowania (per worker): liczba, suma czasu do pierwszego tokenu (tylko strumień) i całości
+_LATENCY_STATS: dict[str, dict[str, float]] = {
+    mode: {"count": 0, "ttft_ms_total": 0.0, "total_ms_total": 0.0} for mode in ("streamed", "blocking")
+}
+
+
+def get_feedback_stats() -> dict:
+    """Średni czas do pierwszego tokenu i całkowity czas generowania feedbacku."""
+    out = {}
+    for mode, stats in _LATENCY_STATS.items():
+        count = stats["count"]
+        out[mode] = {
+            "count": int(count),
+            "avg_ttft_ms": round(stats["ttft_ms_total"] / count) if count and mode == "streamed" else None,
+            "avg_total_ms": round(stats["total_ms_total"] / count) if count else None,
+        }
+    return out
+
+
+def field_ok(field: str, value: Any) -> bool:
+    """Czy wartość pola ma poprawny typ i mieści się w limitach FIELD_LIMITS."""
+    low, high = FIELD_LIMITS[field]
+    if field in ("summary", "recommendation"):
+        if not isinstance(value, str):
+            return False
+        size = len(value.split())
+    else:
+        if not isinstance(value, list) or not all(isinstance(item, str) and item.strip() for item in value):
+            return False
+        size = len(value)
+    return size >= low and (high is None or size <= high)
+
+
+def field_failures(feedback: Feedback | dict[str, Any]) -> list[str]:
+    """Pola feedbacku (obiekt albo surowy JSON z LLM) poza limitami FIELD_LIMITS."""
+    values = feedback.model_dump() if isinstance(feedback, Feedback) else feedback
+    return [field for field in FIELD_LIMITS if not field_ok(field, values.get(field))]
+
+
+def fallback_value(field: str, value: Any) -> Any:
+    """Wartość pola, które nie przeszło naprawy, sprowadzona do typu i limitów Feedback:
+    tekst przycięty (na granicy słowa) do maks. liczby słów i znaków, lista - tylko niepuste
+    punkty tekstowe."""
+    if field in ("summary", "recommendation"):
+        if isinstance(value, list):
+            value = " ".join(str(item) for item in value)
+        words = (value if isinstance(value, str) else "").split()[:FIELD_LIMITS[field][1]]
+        while len(" ".join(words)) > FIELD_MAX_CHARS:
+            words.pop()
+        return " ".join(words)
+    items = value if isinstance(value, list) else [value]
+    return [item.strip() for item in items if isinstance(item, str) and item.strip()]
+
 
 class FeedbackGenerator:
     """Generator spersonalizowanego feedbacku rozwojowego"""
@@ -23,6 +124,7 @@ class FeedbackGenerator:
         self.system_prompt = get_system_prompt("feedback")
         self.wymiary = get_wymiary_for_competency(competency)
         self.last_usage: dict[str, Any] | None = None
+        self.last_meta: dict[str, Any] = {}
 
     def _usage_to_dict(self, usage: Any) -> dict[str, Any]:
         if usage is None:
@@ -35,8 +137,17 @@ class FeedbackGenerator:
             return dict(usage.__dict__)
         return {}
 
-    async def generate(self, scoring_result: ScoringResult) -> Feedback:
-        """Generuje spersonalizowany feedback na podstawie wyniku scoringu."""
+    async def generate(
+        self,
+        scoring_result: ScoringResult,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+    ) -> Feedback:
+        """Generuje spersonalizowany feedback na podstawie wyniku scoringu.
+
+        Z `on_event` odpowiedź jest strumieniowana: callback dostaje fragmenty pól tekstowych
+        ({"type": "delta", "field", "value"}), kompletne pola ("field"), elementy list ("item")
+        i pola podmienione przez naprawę ("repair"). Zwracany Feedback jest ten sam co bez strumienia.
+        """
         dimension_scores_text = self._format_dimension_scores(scoring_result)
         evidence_text = self._format_evidence(scoring_result)
 
@@ -46,36 +157,163 @@ class FeedbackGenerator:
             dimension_scores=dimension_scores_text,
             evidence=evidence_text
         )
+        request = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            **temperature_param(0.7),
+            **max_tokens_param(3000),
+        }
 
+        started = time.perf_counter()
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                **temperature_param(0.7),
-                **max_tokens_param(3000)
-            )
-
-            self.last_usage = self._usage_to_dict(getattr(response, "usage", None))
-            result_text = response.choices[0].message.content
+            if on_event is None:
+                response = await create_chat_completion(self.client, **request)
+                self.last_usage = self._usage_to_dict(getattr(response, "usage", None))
+                result_text = response.choices[0].message.content
+                ttft_ms = None
+            else:
+                result_text, ttft_ms = await self._stream(request, on_event, started)
+            completion_ms = (time.perf_counter() - started) * 1000
             result_json = extract_json_from_text(result_text)
 
-            feedback = Feedback(
-                summary=result_json.get("summary", ""),
-                recommendation=result_json.get("recommendation", ""),
-                mocne_strony=result_json.get("mocne_strony", []),
-                obszary_rozwoju=result_json.get("obszary_rozwoju", [])
-            )
-
-            return feedback
+            # Kontrola i naprawa na surowym JSON - Feedback budowany dopiero z wartości końcowych
+            # (np. za długie summary nie może zatrzymać etapu na walidacji modelu przed naprawą)
+            values = {
+                "summary": result_json.get("summary", ""),
+                "recommendation": result_json.get("recommendation", ""),
+                "mocne_strony": result_json.get("mocne_strony", []),
+                "obszary_rozwoju": result_json.get("obszary_rozwoju", []),
+            }
+            repaired = await self._repair(values, scoring_result, dimension_scores_text)
+            if on_event is not None:
+                for field in self.last_meta["repair"]["repaired_fields"]:
+                    on_event({"type": "repair", "field": field, "value": getattr(repaired, field)})
+            self.last_meta["latency"] = {
+                "streamed": on_event is not None,
+                "ttft_ms": round(ttft_ms) if ttft_ms is not None else None,
+                "completion_ms": round(completion_ms),
+                "total_ms": round((time.perf_counter() - started) * 1000),
+            }
+            stats = _LATENCY_STATS["streamed" if on_event is not None else "blocking"]
+            stats["count"] += 1
+            stats["ttft_ms_total"] += ttft_ms or 0.0
+            stats["total_ms_total"] += self.last_meta["latency"]["total_ms"]
+            return repaired
 
         except json.JSONDecodeError as e:
             raise ValueError(f"Nie udało się sparsować JSON z odpowiedzi LLM: {e}")
         except Exception as e:
             raise ValueError(f"Błąd podczas generowania feedbacku: {e}")
 
+    async def _stream(
+        self,
+        request: dict[str, Any],
+        on_event: Callable[[dict[str, Any]], None],
+        started: float,
+    ) -> tuple[str, float | None]:
+        """Czyta odpowiedź strumieniowo; zwraca (pełny tekst, czas do pierwszego tokenu w ms)."""
+        reader = JsonFieldStream()
+        parts: list[str] = []
+        ttft_ms = None
+        self.last_usage = {}
+        async for chunk in stream_chat_completion(self.client, **request):
+            if getattr(chunk, "usage", None):
+                self.last_usage = self._usage_to_dict(chunk.usage)
+            for choice in getattr(chunk, "choices", None) or []:
+                text = getattr(choice.delta, "content", None)
+                if not text:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                parts.append(text)
+                for kind, field, value in reader.feed(text):
+                    on_event({"type": kind, "field": field, "value": value})
+        return "".join(parts), ttft_ms
+
+    async def _repair(
+        self, values: dict[str, Any], scoring_result: ScoringResult, dimension_scores_text: str,
+    ) -> Feedback:
+        """Regeneruje tylko pola, które nie przeszły kontroli jakości (maks. REPAIR_MAX_ATTEMPTS prób);
+        pola nadal niepoprawne po naprawie sprowadzane są do limitów przez fallback_value.
+        Oszczędność = koszt pełnej regeneracji (tokeny pierwszego wywołania) minus koszt napraw."""
+        initial_failing = field_failures(values)
+        full_tokens = int((self.last_usage or {}).get("total_tokens") or 0)
+        repair_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        failing = initial_failing
+        attempts = 0
+
+        while failing and attempts < REPAIR_MAX_ATTEMPTS:
+            attempts += 1
+            try:
+                repaired, usage = await self._repair_fields(values, failing, scoring_result, dimension_scores_text)
+            except Exception as e:
+                logger.warning("Naprawa feedbacku (próba %d) nieudana: %s", attempts, e)
+                continue
+            for key in repair_usage:
+                repair_usage[key] += int(usage.get(key) or 0)
+            # Nowa wartość zastępuje starą tylko gdy spełnia limity pola
+            for field in failing:
+                if field_ok(field, repaired.get(field)):
+                    values = {**values, field: repaired[field]}
+            failing = field_failures(values)
+
+        fallback = {field: fallback_value(field, values[field]) for field in failing}
+        values = {**values, **fallback}
+        feedback = Feedback(**values)
+
+        if attempts:
+            usage_total = dict(self.last_usage or {})
+            for key, value in repair_usage.items():
+                usage_total[key] = int(usage_total.get(key) or 0) + value
+            self.last_usage = usage_total
+        self.last_meta = {
+            "repair": {
+                "initial_failing": initial_failing,
+                "attempts": attempts,
+                "repaired_fields": [field for field in initial_failing if field not in failing],
+                "fallback_fields": [field for field, value in fallback.items() if field_ok(field, value)],
+                "still_failing": field_failures(feedback),
+                "repair_tokens": repair_usage["total_tokens"],
+                "tokens_saved": max(0, attempts * full_tokens - repair_usage["total_tokens"]),
+            }
+        }
+        if initial_failing:
+            logger.info("Naprawa feedbacku: %s", self.last_meta["repair"])
+        return feedback
+
+    async def _repair_fields(
+        self,
+        values: dict[str, Any],
+        fields: list[str],
+        scoring_result: ScoringResult,
+        dimension_scores_text: str,
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        prompt = REPAIR_PROMPT_TEMPLATE.format(
+            competency=self.competency,
+            score=scoring_result.ocena,
+            level=scoring_result.poziom,
+            dimension_scores=dimension_scores_text,
+            current=json.dumps(values, ensure_ascii=False, indent=2),
+            instructions="\n".join(f"- {FIELD_INSTRUCTIONS[field]}" for field in fields),
+            fields=", ".join(f'"{field}": ...' for field in fields),
+        )
+        response = await create_chat_completion(
+            self.client,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            **temperature_param(0.5),
+            **max_tokens_param(REPAIR_MAX_TOKENS)
+        )
+        usage = self._usage_to_dict(getattr(response, "usage", None))
+        result_json = extract_json_from_text(response.choices[0].message.content)
+        return {field: result_json[field] for field in fields if field in result_json}, usage
+
     def _format_dimension_scores(self, scoring_result: ScoringResult) -> str:
         """Formatuje oceny wymiarów do promptu."""
         lines = []
@@ -111,10 +349,6 @@ class FeedbackGenerator:
             "recommendation_length": len(feedback.recommendation.split()),
             "num_strengths": len(feedback.mocne_strony),
             "num_development_areas": len(feedback.obszary_rozwoju),
-            "is_valid": (
-                50 <= len(feedback.summary.split()) <= 150 and
-                10 <= len(feedback.recommendation.split()) <= 50 and
-                len(feedback.mocne_strony) >= 1 and
-                len(feedback.obszary_rozwoju) >= 1
-            )
+            "failing_fields": field_failures(feedback),
+            "is_valid": not field_failures(feedback),
         }
@@ -0,0 +1,150 @@
+"""
+Długie odpowiedzi: podział na ponumerowane akapity, okna z zakładką i scalanie przypisań do sekcji.
+Parser LLM dla długiego tekstu nie przepisuje treści do JSON (ucinanie przy limicie tokenów) -
+zwraca tylko numer akapitu -> klucz sekcji, a tekst sekcji składany jest lokalnie z oryginału.
+"""
+
+from typing import Optional
+
+from app.modules.evidence_prefilter import split_sentences
+
+CHARS_PER_TOKEN = 4
+MAX_UNIT_CHARS = 1200
+
+
+def estimate_tokens(text: str) -> int:
+    """Przybliżona liczba tokenów (~4 znaki na token)."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def split_units(text: str, max_unit_chars: int = MAX_UNIT_CHARS) -> list[str]:
+    """Dzieli tekst na akapity (puste linie); zbyt długie akapity - na grupy zdań."""
+    paragraphs = [p.strip() for p in text.replace("\r\n", "\n").split("\n\n") if p.strip()]
+    units: list[str] = []
+    for paragraph in paragraphs:
+        if len(paragraph) <= max_unit_chars:
+            units.append(paragraph)
+            continue
+        current = ""
+        for sentence in split_sentences(paragraph):
+            if current and len(current) + len(sentence) + 1 > max_unit_chars:
+                units.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            units.append(current)
+    return units
+
+
+def build_chunks(units: list[str], chunk_tokens: int, overlap_units: int = 1) -> list[list[int]]:
+    """Okna indeksów akapitów o rozmiarze ~chunk_tokens; kolejne okno zaczyna się
+    overlap_units akapitów przed końcem poprzedniego (kontekst na granicy sekcji)."""
+    chunks: list[list[int]] = []
+    start = 0
+    while start < len(units):
+        end = start
+        size = 0
+        while end < len(units) and (end == start or size + estimate_tokens(units[end]) <= chunk_tokens):
+            size += estimate_tokens(units[end])
+            end += 1
+        chunks.append(list(range(start, end)))
+        if end >= len(units):
+            break
+        start = max(end - overlap_units, start + 1)
+    return chunks
+
+
+def merge_assignments(
+    n_units: int,
+    chunks: list[list[int]],
+    chunk_labels: list[dict[int, str]],
+    section_keys: list[str],
+) -> list[str]:
+    """Scala przypisania z okien: większość głosów; remis - głos okna, w którym akapit
+    występuje po raz pierwszy, potem kolejność sekcji. Akapit bez głosu dziedziczy sekcję
+    poprzedniego (na początku - pierwszą sekcję)."""
+    order = {key: i for i, key in enumerate(section_keys)}
+    votes: list[dict[str, int]] = [{} for _ in range(n_units)]
+    first_vote: list[Optional[str]] = [None] * n_units
+    for chunk, labels in zip(chunks, chunk_labels):
+        for unit in chunk:
+            label = labels.get(unit)
+            if label not in order:
+                continue
+            votes[unit][label] = votes[unit].get(label, 0) + 1
+            if first_vote[unit] is None:
+                first_vote[unit] = label
+
+    assigned: list[str] = []
+    for unit in range(n_units):
+        if not votes[unit]:
+            assigned.append(assigned[-1] if assigned else section_keys[0])
+            continue
+        best = max(votes[unit].values())
+        winners = [key for key, count in votes[unit].items() if count == best]
+        if len(winners) == 1:
+            assigned.append(winners[0])
+        elif first_vote[unit] in winners:
+            assigned.append(first_vote[unit])
+        else:
+            assigned.append(min(winners, key=order.__getitem__))
+    return assigned
+
+
+def assemble_sections(units: list[str], assigned: list[str], section_keys: list[str]) -> dict[str, str]:
+    """Składa tekst sekcji z akapitów w oryginalnej kolejności."""
+    collected: dict[str, list[str]] = {key: [] for key in section_keys}
+    for unit, key in zip(units, assigned):
+        collected[key].append(unit)
+    return {key: "\n\n".join(parts) for key, parts in collected.items()}
+
+
+def _unit_key(unit: str) -> str:
+    return " ".join(unit.split())
+
+
+def reuse_assignments(
+    units: list[str],
+    previous_sections: dict[str, str],
+    section_keys: list[str],
+    max_unit_chars: int = MAX_UNIT_CHARS,
+) -> dict[int, str]:
+    """Przypisania akapitów przeniesione z poprzedniego podziału: akapit, który bez zmian
+    (po normalizacji białych znaków) występuje w dokładnie jednej poprzedniej sekcji, dostaje
+    tę sekcję. Akapity nowe, zmienione lub niejednoznaczne zostają bez przypisania."""
+    owners: dict[str, set[str]] = {}
+    for key in section_keys:
+        for unit in split_units(previous_sections.get(key) or "", max_unit_chars):
+            owners.setdefault(_unit_key(unit), set()).add(key)
+    known: dict[int, str] = {}
+    for i, unit in enumerate(units):
+        keys = owners.get(_unit_key(unit), set())
+        if len(keys) == 1:
+            known[i] = next(iter(keys))
+    return known
+
+
+def pending_chunks(
+    units: list[str],
+    known: dict[int, str],
+    chunk_tokens: int,
+    overlap_units: int = 1,
+) -> list[list[int]]:
+    """Okna tylko wokół akapitów bez przypisania: każdy ciąg takich akapitów z overlap_units
+    sąsiadami po obu stronach (kontekst granicy sekcji); za duże okna dzielone jak w build_chunks."""
+    windows: list[list[int]] = []
+    for i in range(len(units)):
+        if i in known:
+            continue
+        start, end = max(i - overlap_units, 0), min(i + overlap_units, len(units) - 1)
+        if windows and start <= windows[-1][-1] + 1:
+            windows[-1].extend(range(windows[-1][-1] + 1, end + 1))
+        else:
+            windows.append(list(range(start, end + 1)))
+
+    chunks: list[list[int]] = []
+    for window in windows:
+        for chunk in build_chunks([units[i] for i in window], chunk_tokens, overlap_units):
+            chunks.append([window[i] for i in chunk])
+    return chunks
@@ -3,13 +3,82 @@ Moduł 2: Mapper - Mapowanie na wymiary kompetencji
 Ekstrakcja cytatów-dowodów dla wymiarów (dynamicznie per kompetencja)
 """
 
+import asyncio
 import json
-from typing import Any
-from app.llm_client import get_llm_client, get_model_name, max_tokens_param, temperature_param
+import logging
+from pathlib import Path
+from typing import Any, Iterable, Optional
+from app.llm_client import (
+    create_chat_completion,
+    get_llm_client,
+    get_model_name,
+    max_tokens_param,
+    temperature_param,
+)
 from app.json_utils import extract_json_from_text
 from app.models import ParsedResponse, MappedResponse, WymiarEvidence
 from app.rubric import get_wymiary_for_competency
 from app.prompt_manager import get_active_prompt_content, get_system_prompt
+from app.modules.evidence_prefilter import get_rubric_index, prefilter_sections
+
+logger = logging.getLogger("lem.mapper")
+
+MAPPER_CONFIG_PATH = Path(__file__).parent.parent.parent / "config" / "mapper.json"
+MAPPER_MODES = ("single", "per_dimension")
+
+# Tryb per_dimension: odpowiedź jest na początku promptu, więc wywołania dla kolejnych
+# wymiarów mają wspólny prefiks (prefix caching po stronie serwera vLLM)
+DIMENSION_PROMPT_TEMPLATE = """SPARSOWANA ODPOWIEDŹ UCZESTNIKA:
+{parsed_response}
+
+WYMIAR DO ANALIZY: {wymiar_nazwa} ({wymiar_key})
+{wymiar_opis}
+
+POZIOMY WYMIARU:
+{poziomy}
+
+INSTRUKCJE:
+- Znajdź maksymalnie 2 NAJLEPSZE cytaty (dosłowne fragmenty tekstu, 1-3 zdania) świadczące o tym wymiarze
+- czy_obecny = true tylko gdy są konkretne dowody, nie ogólniki
+- Jeśli brak dowodów, znalezione_fragmenty = []
+- Dodaj krótką notatkę (1 zdanie)
+
+ZWRÓĆ TYLKO JSON:
+{{"znalezione_fragmenty": ["cytat 1"], "czy_obecny": true/false, "notatki": "krótka notatka"}}"""
+
+
+def get_mapper_config(competency: str, config_path: Path = MAPPER_CONFIG_PATH) -> dict:
+    """Ustawienia mappera: _default nadpisane ustawieniami kompetencji (płytko per sekcja)."""
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        data = {}
+    config = {key: dict(value) if isinstance(value, dict) else value for key, value in data.get("_default", {}).items()}
+    for key, value in data.get(competency, {}).items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key].update(value)
+        else:
+            config[key] = value
+    return config
+
+
+def dimension_problem(data: Any) -> Optional[str]:
+    """Powód odrzucenia wyniku mappera dla jednego wymiaru; None = wynik poprawny."""
+    if data is None:
+        return "brak wymiaru w odpowiedzi"
+    if not isinstance(data, dict):
+        return "wynik wymiaru nie jest obiektem"
+    if not isinstance(data.get("czy_obecny"), bool):
+        return "brak lub niepoprawne czy_obecny"
+    fragments = data.get("znalezione_fragmenty", [])
+    if not isinstance(fragments, list) or not all(isinstance(item, str) for item in fragments):
+        return "niepoprawne znalezione_fragmenty"
+    if data["czy_obecny"] and not any(item.strip() for item in fragments):
+        return "czy_obecny bez cytatów"
+    if data.get("notatki") is not None and not isinstance(data["notatki"], str):
+        return "niepoprawne notatki"
+    return None
 
 
 class ResponseMapper:
@@ -22,7 +91,12 @@ class ResponseMapper:
         self.prompt_template = get_active_prompt_content("map", competency)
         self.system_prompt = get_system_prompt("map")
         self.wymiary = get_wymiary_for_competency(competency)
+        self.config = get_mapper_config(competency)
+        self.mode = self.config.get("mode", "single")
+        if self.mode not in MAPPER_MODES:
+            raise ValueError(f"Nieznany tryb mappera '{self.mode}' dla {competency}. Dostępne: {MAPPER_MODES}")
         self.last_usage: dict[str, Any] | None = None
+        self.last_meta: dict[str, Any] = {}
 
     def _usage_to_dict(self, usage: Any) -> dict[str, Any]:
         if usage is None:
@@ -35,18 +109,87 @@ class ResponseMapper:
             return dict(usage.__dict__)
         return {}
 
-    async def map(self, parsed_response: ParsedResponse) -> MappedResponse:
-        """Mapuje sparsowaną odpowiedź na wymiary kompetencji."""
-        sections_text = "\n\n".join(
+    def _prefilter(self, sections: dict[str, str]) -> tuple[dict[str, str], dict[str, Any]]:
+        """Zawęża sekcje do zdań-kandydatów (BM25 względem rubryki); fallback do pełnego tekstu."""
+        settings = self.config.get("prefilter", {})
+        total_chars = sum(len(v or "") for v in sections.values())
+        if not settings.get("enabled") or total_chars < settings.get("min_chars", 0):
+            return sections, {"applied": False, "chars_before": total_chars, "chars_after": total_chars}
+        filtered, stats = prefilter_sections(
+            sections,
+            get_rubric_index(self.competency, self.wymiary),
+            top_k=settings.get("top_k", 3),
+            max_sentences=settings.get("max_sentences", 24),
+            min_score=settings.get("min_score", 0.5),
+            max_ratio=settings.get("max_ratio", 0.7),
+        )
+        return (filtered if filtered is not None else sections), stats
+
+    def _format_sections(self, sections: dict[str, str]) -> str:
+        return "\n\n".join(
             f"{key.upper().replace('_', ' ')}:\n{val}"
-            for key, val in parsed_response.sections.items()
+            for key, val in sections.items()
             if val
         )
 
-        prompt = self.prompt_template.format(parsed_response=sections_text)
+    def build_prompt(self, parsed_response: ParsedResponse) -> tuple[str, dict[str, Any]]:
+        """Buduje prompt mappera; zwraca (prompt, statystyki prefiltra)."""
+        sections, prefilter_stats = self._prefilter(parsed_response.sections)
+        return self.prompt_template.format(parsed_response=self._format_sections(sections)), prefilter_stats
+
+    def build_dimension_prompts(
+        self,
+        parsed_response: ParsedResponse,
+        dimensions: Optional[Iterable[str]] = None,
+    ) -> tuple[dict[str, str], dict[str, Any]]:
+        """Prompty trybu per_dimension (jeden na wymiar, opcjonalnie tylko wybrane wymiary);
+        zwraca (prompty, statystyki prefiltra)."""
+        sections, prefilter_stats = self._prefilter(parsed_response.sections)
+        sections_text = self._format_sections(sections)
+        selected = set(dimensions) if dimensions is not None else None
+        prompts = {}
+        for wymiar_key, wymiar_def in self.wymiary.items():
+            if selected is not None and wymiar_key not in selected:
+                continue
+            prompts[wymiar_key] = DIMENSION_PROMPT_TEMPLATE.format(
+                parsed_response=sections_text,
+                wymiar_key=wymiar_key,
+                wymiar_nazwa=wymiar_def.get("nazwa", wymiar_key),
+                wymiar_opis=wymiar_def.get("opis", ""),
+                poziomy="\n".join(
+                    f"Poziom {level}: {data.get('opis', '')}"
+                    for level, data in sorted(wymiar_def.get("poziomy", {}).items())
+                ),
+            )
+        return prompts, prefilter_stats
+
+    def _to_evidence(self, wymiar_key: str, wymiar_data: Any) -> WymiarEvidence:
+        if dimension_problem(wymiar_data) is not None:
+            # Wynik nienaprawiony - wymiar bez dowodów, z notatką zamiast cichego zera
+            return WymiarEvidence(
+                wymiar=wymiar_key,
+                znalezione_fragmenty=[],
+                czy_obecny=False,
+                notatki="Brak poprawnego wyniku mappera dla wymiaru",
+            )
+        return WymiarEvidence(
+            wymiar=wymiar_key,
+            znalezione_fragmenty=wymiar_data.get("znalezione_fragmenty", [])[:2],
+            czy_obecny=wymiar_data.get("czy_obecny", False),
+            notatki=wymiar_data.get("notatki", "")
+        )
+
+    async def map(self, parsed_response: ParsedResponse) -> MappedResponse:
+        """Mapuje sparsowaną odpowiedź na wymiary kompetencji."""
+        if self.mode == "per_dimension":
+            return await self._map_per_dimension(parsed_response)
+
+        prompt, prefilter_stats = self.build_prompt(parsed_response)
+        self.last_meta = {"mode": "single", "prefilter": prefilter_stats}
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": self.system_prompt},
@@ -58,17 +201,21 @@ class ResponseMapper:
 
             self.last_usage = self._usage_to_dict(getattr(response, "usage", None))
             result_text = response.choices[0].message.content
-            result_json = extract_json_from_text(result_text)
+            try:
+                result_json = extract_json_from_text(result_text)
+            except ValueError as e:
+                # Całość do naprawy wywołaniami per wymiar (nadal taniej niż ponowne mapowanie w całości)
+                logger.warning("Mapper %s: niepoprawny JSON (%s) - naprawa per wymiar", self.competency, e)
+                result_json = {}
+            if not isinstance(result_json, dict):
+                result_json = {}
+
+            results = {wymiar_key: result_json.get(wymiar_key) for wymiar_key in self.wymiary}
+            results = await self._validate_and_repair(parsed_response, results)
 
             evidence_dict = {}
             for wymiar_key in self.wymiary.keys():
-                wymiar_data = result_json.get(wymiar_key, {})
-                evidence_dict[wymiar_key] = WymiarEvidence(
-                    wymiar=wymiar_key,
-                    znalezione_fragmenty=wymiar_data.get("znalezione_fragmenty", [])[:2],
-                    czy_obecny=wymiar_data.get("czy_obecny", False),
-                    notatki=wymiar_data.get("notatki", "")
-                )
+                evidence_dict[wymiar_key] = self._to_evidence(wymiar_key, results[wymiar_key])
 
             mapped = MappedResponse(
                 evidence=evidence_dict,
@@ -82,6 +229,110 @@ class ResponseMapper:
         except Exception as e:
             raise ValueError(f"Błąd podczas mapowania odpowiedzi: {e}")
 
+    async def _map_dimension(self, wymiar_key: str, prompt: str) -> tuple[Any, dict[str, Any]]:
+        """Wywołanie dla jednego wymiaru; zwraca (surowy wynik wymiaru lub None, usage)."""
+        response = await create_chat_completion(
+            self.client,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            **temperature_param(0.1),
+            **max_tokens_param(int(self.config.get("per_dimension_max_tokens", 400)))
+        )
+        usage = self._usage_to_dict(getattr(response, "usage", None))
+        try:
+            result_json = extract_json_from_text(response.choices[0].message.content)
+        except ValueError:
+            return None, usage
+        # Model czasem owija wynik kluczem wymiaru jak w trybie single
+        if isinstance(result_json, dict) and isinstance(result_json.get(wymiar_key), dict):
+            result_json = result_json[wymiar_key]
+        return result_json, usage
+
+    def _add_usage(self, usage: dict[str, Any]) -> None:
+        total = dict(self.last_usage or {})
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            total[key] = int(total.get(key) or 0) + int(usage.get(key) or 0)
+        self.last_usage = total
+
+    async def _validate_and_repair(self, parsed_response: ParsedResponse, results: dict[str, Any]) -> dict[str, Any]:
+        """Sprawdza wyniki wymiarów i ponawia krótkie wywołania (prompt per wymiar) tylko dla
+        brakujących/niepoprawnych - maks. `repair_attempts` rund. Wymiary nadal niepoprawne
+        zostają bez dowodów (z notatką) i trafiają do last_meta["validation"]["still_invalid"]."""
+        invalid = {key: reason for key, value in results.items() if (reason := dimension_problem(value))}
+        problems = dict(invalid)
+        attempts = 0
+        repair_tokens = 0
+        while problems and attempts < int(self.config.get("repair_attempts", 1)):
+            attempts += 1
+            prompts, _ = self.build_dimension_prompts(parsed_response, problems.keys())
+            replies = await asyncio.gather(
+                *(self._map_dimension(key, prompt) for key, prompt in prompts.items()),
+                return_exceptions=True,
+            )
+            for wymiar_key, reply in zip(prompts, replies):
+                if isinstance(reply, BaseException):
+                    if not isinstance(reply, Exception):
+                        raise reply
+                    logger.warning("Naprawa wymiaru %s nieudana: %s", wymiar_key, reply)
+                    continue
+                value, usage = reply
+                self._add_usage(usage)
+                repair_tokens += int(usage.get("total_tokens") or 0)
+                if dimension_problem(value) is None:
+                    results[wymiar_key] = value
+            problems = {key: reason for key in problems if (reason := dimension_problem(results[key]))}
+
+        self.last_meta["validation"] = {
+            "invalid": invalid,
+            "repair_attempts": attempts,
+            "repaired": [key for key in invalid if key not in problems],
+            "still_invalid": sorted(problems),
+            "repair_tokens": repair_tokens,
+        }
+        if invalid:
+            logger.info("Mapper %s - walidacja wymiarów: %s", self.competency, self.last_meta["validation"])
+        return results
+
+    async def _map_per_dimension(self, parsed_response: ParsedResponse) -> MappedResponse:
+        """Tryb per_dimension: krótkie, równoległe wywołania - jedno na wymiar."""
+        evidence_dict = await self.map_dimensions(parsed_response, self.wymiary.keys())
+        return MappedResponse(evidence=evidence_dict, parsed_response=parsed_response)
+
+    async def map_dimensions(
+        self,
+        parsed_response: ParsedResponse,
+        dimensions: Iterable[str],
+    ) -> dict[str, WymiarEvidence]:
+        """Ekstrakcja dowodów tylko dla wybranych wymiarów (równolegle, wywołanie na wymiar)."""
+        prompts, prefilter_stats = self.build_dimension_prompts(parsed_response, dimensions)
+        self.last_meta = {"mode": "per_dimension", "calls": len(prompts), "prefilter": prefilter_stats}
+
+        tasks = [asyncio.ensure_future(self._map_dimension(k, p)) for k, p in prompts.items()]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException as e:
+            # Błąd jednego wymiaru (lub anulowanie) kończy też pozostałe wywołania
+            for task in tasks:
+                task.cancel()
+            if isinstance(e, json.JSONDecodeError):
+                raise ValueError(f"Nie udało się sparsować JSON z odpowiedzi LLM: {e}")
+            if isinstance(e, Exception):
+                raise ValueError(f"Błąd podczas mapowania odpowiedzi: {e}")
+            raise
+
+        usage_total = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        raw = {}
+        for wymiar_key, (value, usage) in zip(prompts, results):
+            raw[wymiar_key] = value
+            for key in usage_total:
+                usage_total[key] += int(usage.get(key) or 0)
+        self.last_usage = usage_total
+        raw = await self._validate_and_repair(parsed_response, raw)
+        return {wymiar_key: self._to_evidence(wymiar_key, value) for wymiar_key, value in raw.items()}
+
     def get_evidence_summary(self, mapped: MappedResponse) -> dict:
         """Zwraca podsumowanie znalezionych dowodów."""
         summary = {}
@@ -3,12 +3,37 @@ Moduł 1: Parser - Strukturyzacja odpowiedzi
 Rozbija narracyjną odpowiedź na logiczne sekcje (dynamicznie per kompetencja)
 """
 
+import asyncio
+import hashlib
 import json
-from typing import Any
-from app.llm_client import get_llm_client, get_model_name, max_tokens_param, temperature_param
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+from app.llm_client import (
+    create_chat_completion,
+    get_llm_client,
+    get_model_name,
+    max_tokens_param,
+    temperature_param,
+)
 from app.json_utils import extract_json_from_text
 from app.models import ParsedResponse
-from app.prompt_manager import get_active_prompt_content, get_system_prompt
+from app.prompt_manager import get_active_prompt_content, get_active_versions, get_system_prompt
+from app.singleflight import SingleFlight
+from app.modules.section_splitter import split_sections
+from app.modules.long_input import (
+    assemble_sections,
+    build_chunks,
+    estimate_tokens,
+    merge_assignments,
+    pending_chunks,
+    reuse_assignments,
+    split_units,
+)
+
+logger = logging.getLogger("lem.parser")
 
 PARSE_SECTIONS = {
     "delegowanie": {
@@ -19,6 +44,12 @@ PARSE_SECTIONS = {
             "decyzje": "Sposób podejmowania decyzji co i jak delegować",
             "efekty": "Planowane efekty rozmowy delegującej",
         },
+        "keywords": {
+            "przygotowanie": ["przygot"],
+            "przebieg": ["przebieg", "rozmow", "krok"],
+            "decyzje": ["decyz", "wybor"],
+            "efekty": ["efekt", "rezultat", "wynik"],
+        },
     },
     "podejmowanie_decyzji": {
         "keys": ["kontekst_sytuacji", "analiza_kryteriow", "proces_decyzyjny", "komunikacja_wdrozenie"],
@@ -28,6 +59,12 @@ PARSE_SECTIONS = {
             "proces_decyzyjny": "Proces podejmowania decyzji i scenariusze",
             "komunikacja_wdrozenie": "Komunikacja decyzji i plan wdrożenia",
         },
+        "keywords": {
+            "kontekst_sytuacji": ["kontekst", "sytuac", "otoczen"],
+            "analiza_kryteriow": ["kryter", "ryzyk"],
+            "proces_decyzyjny": ["proces", "scenariusz", "decyzyjn"],
+            "komunikacja_wdrozenie": ["komunik", "wdroz"],
+        },
     },
     "okreslanie_priorytetow": {
         "keys": ["analiza_celow", "kontekst_priorytetow", "proces_priorytetyzacji", "kaskadowanie_komunikacja"],
@@ -37,6 +74,12 @@ PARSE_SECTIONS = {
             "proces_priorytetyzacji": "Proces priorytetyzacji i kryteria",
             "kaskadowanie_komunikacja": "Kaskadowanie i komunikacja priorytetów",
         },
+        "keywords": {
+            "analiza_celow": ["cel", "analiz"],
+            "kontekst_priorytetow": ["kontekst", "zmienn"],
+            "proces_priorytetyzacji": ["proces", "priorytetyz", "kryter"],
+            "kaskadowanie_komunikacja": ["kaskad", "komunik"],
+        },
     },
     "udzielanie_feedbacku": {
         "keys": ["opis_sytuacji", "przebieg_rozmowy", "reakcja_pracownika", "ustalenia_wnioski"],
@@ -46,10 +89,68 @@ PARSE_SECTIONS = {
             "reakcja_pracownika": "Reakcja pracownika i dialog",
             "ustalenia_wnioski": "Ustalenia, oczekiwania i wnioski",
         },
+        "keywords": {
+            "opis_sytuacji": ["opis", "sytuac", "zachowan"],
+            "przebieg_rozmowy": ["przebieg", "rozmow"],
+            "reakcja_pracownika": ["reakc", "dialog"],
+            "ustalenia_wnioski": ["ustalen", "wniosk", "oczekiw"],
+        },
     },
 }
 
 
+# Powyżej progu (szacowane tokeny wejścia) parser LLM przechodzi na tryb okienkowy:
+# przepisany w JSON tekst nie zmieściłby się w limicie max_tokens
+CHUNK_THRESHOLD_TOKENS = int(os.getenv("LEM_PARSE_CHUNK_THRESHOLD_TOKENS", "1500"))
+CHUNK_TOKENS = 700
+CHUNK_OVERLAP_UNITS = 1
+
+CHUNK_PROMPT_TEMPLATE = """Przypisz każdy ponumerowany akapit odpowiedzi uczestnika do jednej sekcji.
+
+SEKCJE:
+{sections}
+
+AKAPITY:
+{paragraphs}
+
+ZWRÓĆ TYLKO JSON: numer akapitu -> klucz sekcji, np. {{"{example_id}": "{example_key}"}}.
+Każdy akapit z listy musi mieć przypisaną dokładnie jedną sekcję."""
+
+# Wspólny podział dla kilku kompetencji: akapity (drobniejsze niż w trybie okienkowym) klasyfikowane
+# jednym wywołaniem dla wszystkich kompetencji naraz, wynik w cache per hash tekstu. Stały szablon
+# (nie aktywne prompty parse kompetencji) - parsowanie z niego ma w last_meta shared_template=True.
+# Szablon odtwarza domyślne prompty parse (SHARED_TEMPLATE_PARSE_VERSIONS); kompetencja z innym
+# aktywnym promptem parse (zmiana w prompt managerze) parsowana jest zawsze swoim promptem.
+MULTI_PROMPT_TEMPLATE = """Przypisz każdy ponumerowany akapit odpowiedzi uczestnika do jednej sekcji - osobno dla każdej kompetencji.
+
+KOMPETENCJE I ICH SEKCJE:
+{competencies}
+
+AKAPITY:
+{paragraphs}
+
+ZWRÓĆ TYLKO JSON: numer akapitu -> {{kompetencja: klucz sekcji}}, np. {{"{example_id}": {example}}}.
+Każdy akapit z listy musi mieć w każdej kompetencji przypisaną dokładnie jedną sekcję."""
+MULTI_UNIT_CHARS = 400
+# Budżet odpowiedzi: ~20 tokenów na przypisanie akapitu w każdej kompetencji (jak w _classify_chunk)
+SHARED_LABEL_TOKENS = 20
+SHARED_TEMPLATE_PARSE_VERSIONS = {
+    "delegowanie": "v1_initial",
+    "podejmowanie_decyzji": "v1_decyzje",
+    "okreslanie_priorytetow": "v1_priorytety",
+    "udzielanie_feedbacku": "v1_feedbacku",
+}
+SHARED_CACHE_SIZE = int(os.getenv("LEM_PARSE_SHARED_CACHE_SIZE", "256"))
+
+# Licznik metod parsowania w procesie (skip rate = odsetek parsowań bez wywołania LLM);
+# llm_shared = parsowanie, które wykonało wspólny podział, shared = sekcje z jego cache;
+# reused / llm_incremental = revise bez LLM / z klasyfikacją tylko zmienionych akapitów
+_PARSE_STATS: dict[str, int] = {
+    "presectioned": 0, "rules": 0, "llm": 0, "llm_chunked": 0, "shared": 0, "llm_shared": 0,
+    "reused": 0, "llm_incremental": 0,
+}
+
+
 def get_sections_for_competency(competency: str) -> dict:
     """Zwraca definicję sekcji parsowania dla danej kompetencji."""
     if competency not in PARSE_SECTIONS:
@@ -57,17 +158,204 @@ def get_sections_for_competency(competency: str) -> dict:
     return PARSE_SECTIONS[competency]
 
 
+def get_parse_stats() -> dict:
+    """Statystyki metod parsowania i odsetek pominiętych wywołań LLM."""
+    total = sum(_PARSE_STATS.values())
+    skipped = sum(_PARSE_STATS[method] for method in ("presectioned", "rules", "shared", "reused"))
+    return {
+        **_PARSE_STATS,
+        "total": total,
+        "llm_skip_rate": round(skipped / total, 3) if total else 0.0,
+        "shared_cache_entries": len(_SHARED_CACHE),
+    }
+
+
+class _SharedParseCache:
+    """LRU: hash tekstu (i modelu) -> {(kompetencja, wersja promptu parse): sekcje}. Per proces (worker).
+
+    Sekcje kompetencji zapisane są z aktywną wersją jej promptu parse - po zmianie promptu
+    wpis nie jest już zwracany.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict[str, dict[str, str]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _slot(competency: str) -> tuple[str, Optional[str]]:
+        return competency, get_active_versions(competency).get("parse")
+
+    def get(self, key: str, competency: str) -> Optional[dict[str, str]]:
+        entry = self._entries.get(key)
+        slot = self._slot(competency)
+        if entry is None or slot not in entry:
+            return None
+        self._entries.move_to_end(key)
+        return entry[slot]
+
+    def put(self, key: str, competency: str, sections: dict[str, str]) -> None:
+        self._entries.setdefault(key, {})[self._slot(competency)] = sections
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_SHARED_CACHE = _SharedParseCache(SHARED_CACHE_SIZE)
+_SHARED_FLIGHTS = SingleFlight("shared_parse")
+
+
+def uses_shared_template(competency: str) -> bool:
+    """Czy aktywny prompt parse kompetencji to ten, który odtwarza wspólny szablon."""
+    return get_active_versions(competency).get("parse") == SHARED_TEMPLATE_PARSE_VERSIONS.get(competency)
+
+
+def shared_parse_key(response_text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{response_text.strip()}".encode("utf-8")).hexdigest()
+
+
+def _multi_prompt(units: list[str], chunk: list[int], competencies: list[str]) -> str:
+    lines = []
+    for competency in competencies:
+        sections_def = PARSE_SECTIONS[competency]
+        lines.append(f"{competency}:")
+        lines.extend(f"  - {key}: {sections_def['labels'].get(key, key)}" for key in sections_def["keys"])
+    example = json.dumps({c: PARSE_SECTIONS[c]["keys"][0] for c in competencies}, ensure_ascii=False)
+    return MULTI_PROMPT_TEMPLATE.format(
+        competencies="\n".join(lines),
+        paragraphs="\n\n".join(f"[{i + 1}] {units[i]}" for i in chunk),
+        example_id=chunk[0] + 1,
+        example=example,
+    )
+
+
+async def parse_for_competencies(
+    response_text: str,
+    competencies: Iterable[str],
+    client: Any = None,
+    model: Optional[str] = None,
+) -> tuple[dict[str, dict[str, str]], dict[str, Any]]:
+    """Sekcje jednego tekstu dla wielu kompetencji: z cache, z nagłówków (bez LLM), a dla reszty
+    jedną klasyfikacją akapitów wspólną dla wszystkich kompetencji (w oknach dla długich tekstów).
+    Wynik trafia do cache, z którego korzysta ResponseParser.parse każdej kompetencji.
+    Zwraca ({kompetencja: sekcje}, usage wywołań LLM)."""
+    competencies = list(dict.fromkeys(competencies))
+    for competency in competencies:
+        get_sections_for_competency(competency)
+    client = client or get_llm_client()
+    model = model or get_model_name()
+    key = shared_parse_key(response_text, model)
+
+    result: dict[str, dict[str, str]] = {}
+    missing = []
+    for competency in competencies:
+        cached = _SHARED_CACHE.get(key, competency)
+        if cached is None:
+            split = split_sections(response_text, PARSE_SECTIONS[competency])
+            if split is not None:
+                _SHARED_CACHE.put(key, competency, split)
+                cached = split
+        if cached is None:
+            missing.append(competency)
+        else:
+            result[competency] = cached
+    if not missing:
+        return result, {}
+
+    async def _classify() -> tuple[dict[str, dict[str, str]], dict[str, Any]]:
+        return await _classify_shared(response_text, missing, client, model, key)
+
+    sections, usage = await _SHARED_FLIGHTS.do(f"{key}:{','.join(sorted(missing))}", _classify)
+    result.update(sections)
+    return result, usage
+
+
+async def _classify_shared(
+    response_text: str,
+    competencies: list[str],
+    client: Any,
+    model: str,
+    key: str,
+) -> tuple[dict[str, dict[str, str]], dict[str, Any]]:
+    units = split_units(response_text, MULTI_UNIT_CHARS)
+    if not units:
+        raise ValueError("Pusta odpowiedź - brak akapitów do podziału")
+    chunks = build_chunks(units, CHUNK_TOKENS, CHUNK_OVERLAP_UNITS)
+    system_prompt = get_system_prompt("parse")
+
+    async def _call(chunk: list[int]) -> tuple[dict[str, dict[int, str]], dict[str, Any]]:
+        response = await create_chat_completion(
+            client,
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": _multi_prompt(units, chunk, competencies)}
+            ],
+            **temperature_param(0.0),
+            **max_tokens_param(SHARED_LABEL_TOKENS * len(chunk) * len(competencies) + 50)
+        )
+        usage = getattr(response, "usage", None)
+        usage = usage if isinstance(usage, dict) else (usage.model_dump() if hasattr(usage, "model_dump") else {})
+        result_json = extract_json_from_text(response.choices[0].message.content)
+        labels: dict[str, dict[int, str]] = {competency: {} for competency in competencies}
+        for raw_id, assignment in result_json.items():
+            try:
+                unit = int(str(raw_id).strip("[] ")) - 1
+            except ValueError:
+                continue
+            if unit not in chunk or not isinstance(assignment, dict):
+                continue
+            for competency in competencies:
+                if isinstance(assignment.get(competency), str):
+                    labels[competency][unit] = assignment[competency].strip()
+        return labels, usage
+
+    tasks = [asyncio.ensure_future(_call(chunk)) for chunk in chunks]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException as e:
+        for task in tasks:
+            task.cancel()
+        if isinstance(e, Exception):
+            raise ValueError(f"Błąd wspólnego parsowania odpowiedzi: {e}")
+        raise
+
+    sections: dict[str, dict[str, str]] = {}
+    for competency in competencies:
+        keys = PARSE_SECTIONS[competency]["keys"]
+        assigned = merge_assignments(len(units), chunks, [labels[competency] for labels, _ in results], keys)
+        sections[competency] = assemble_sections(units, assigned, keys)
+        _SHARED_CACHE.put(key, competency, sections[competency])
+
+    usage_total = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    for _, usage in results:
+        for name in usage_total:
+            usage_total[name] += int(usage.get(name) or 0)
+    logger.info(
+        "Wspólny podział %d akapitów dla %s: %d wywołań, %d tokenów",
+        len(units), competencies, len(chunks), usage_total["total_tokens"],
+    )
+    return sections, usage_total
+
+
 class ResponseParser:
     """Parser odpowiedzi uczestnika na strukturyzowane sekcje"""
 
-    def __init__(self, competency: str = "delegowanie"):
+    def __init__(self, competency: str = "delegowanie", use_rules: bool = True):
         self.competency = competency
+        self.use_rules = use_rules
         self.client = get_llm_client()
         self.model = get_model_name()
         self.prompt_template = get_active_prompt_content("parse", competency)
         self.system_prompt = get_system_prompt("parse")
         self.sections_def = get_sections_for_competency(competency)
         self.last_usage: dict[str, Any] | None = None
+        self.last_meta: dict[str, Any] = {}
 
     def _usage_to_dict(self, usage: Any) -> dict[str, Any]:
         if usage is None:
@@ -80,12 +368,82 @@ class ResponseParser:
             return dict(usage.__dict__)
         return {}
 
-    async def parse(self, response_text: str) -> ParsedResponse:
-        """Parsuje odpowiedź uczestnika na strukturyzowane sekcje."""
+    def from_sections(self, sections: dict[str, str], response_text: str) -> ParsedResponse:
+        """Buduje ParsedResponse z sekcji dostarczonych przez klienta API (bez LLM)."""
+        unknown = [key for key in sections if key not in self.sections_def["keys"]]
+        if unknown:
+            raise ValueError(
+                f"Nieznane sekcje dla kompetencji {self.competency}: {unknown}. "
+                f"Dostępne: {self.sections_def['keys']}"
+            )
+        return ParsedResponse(
+            sections={key: (sections.get(key) or "").strip() for key in self.sections_def["keys"]},
+            raw_text=response_text,
+        )
+
+    async def parse(
+        self,
+        response_text: str,
+        sections: Optional[dict[str, str]] = None,
+        shared_competencies: Optional[Iterable[str]] = None,
+    ) -> ParsedResponse:
+        """Parsuje odpowiedź uczestnika na strukturyzowane sekcje.
+
+        Kolejność: sekcje od klienta -> deterministyczny podział po nagłówkach -> wspólny podział dla
+        `shared_competencies` (gdy tekst oceniany jest w kilku kompetencjach; z cache lub jednym
+        wywołaniem) -> LLM (dla długich odpowiedzi - klasyfikacja akapitów w oknach, patrz _parse_chunked).
+        Bez `shared_competencies` cache wspólnego podziału nie jest używany - np. ponowna ocena po
+        zmianie promptu parse zawsze parsuje aktywnym promptem. Wspólny podział obejmuje tylko
+        kompetencje z domyślnym promptem parse (uses_shared_template); gdy się nie uda (np. ucięty
+        JSON), parser przechodzi na własną ścieżkę LLM.
+        """
+        self.last_usage = None
+        if sections:
+            parsed = self.from_sections(sections, response_text)
+            self._record_method("presectioned")
+            return parsed
+
+        if self.use_rules:
+            split = split_sections(response_text, self.sections_def)
+            if split is not None:
+                self._record_method("rules")
+                return ParsedResponse(sections=split, raw_text=response_text)
+
+        others = [
+            c for c in dict.fromkeys(shared_competencies or [])
+            if c != self.competency and uses_shared_template(c)
+        ]
+        if others and uses_shared_template(self.competency):
+            competencies = [self.competency, *others]
+            sections = _SHARED_CACHE.get(shared_parse_key(response_text, self.model), self.competency)
+            if sections is not None:
+                self._record_method("shared")
+            else:
+                try:
+                    shared, usage = await parse_for_competencies(
+                        response_text, competencies, client=self.client, model=self.model,
+                    )
+                except ValueError as e:
+                    logger.warning(
+                        "Parse %s: wspólny podział nieudany, parsowanie per kompetencja: %s", self.competency, e,
+                    )
+                else:
+                    self._record_method("llm_shared")
+                    self.last_usage = usage or None
+                    sections = shared[self.competency]
+            if sections is not None:
+                self.last_meta.update({"competencies": competencies, "shared_template": True})
+                return ParsedResponse(sections=sections, raw_text=response_text)
+
+        if estimate_tokens(response_text) > CHUNK_THRESHOLD_TOKENS:
+            return await self._parse_chunked(response_text)
+
+        self._record_method("llm")
         prompt = self.prompt_template.format(response_text=response_text)
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": self.system_prompt},
@@ -115,6 +473,125 @@ class ResponseParser:
         except Exception as e:
             raise ValueError(f"Błąd podczas parsowania odpowiedzi: {e}")
 
+    def _chunk_prompt(self, units: list[str], chunk: list[int]) -> str:
+        sections = "\n".join(
+            f"- {key}: {self.sections_def['labels'].get(key, key)}" for key in self.sections_def["keys"]
+        )
+        paragraphs = "\n\n".join(f"[{i + 1}] {units[i]}" for i in chunk)
+        return CHUNK_PROMPT_TEMPLATE.format(
+            sections=sections,
+            paragraphs=paragraphs,
+            example_id=chunk[0] + 1,
+            example_key=self.sections_def["keys"][0],
+        )
+
+    async def _classify_chunk(self, units: list[str], chunk: list[int]) -> tuple[dict[int, str], dict[str, Any]]:
+        response = await create_chat_completion(
+            self.client,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": self._chunk_prompt(units, chunk)}
+            ],
+            **temperature_param(0.0),
+            **max_tokens_param(20 * len(chunk) + 50)
+        )
+        usage = self._usage_to_dict(getattr(response, "usage", None))
+        result_json = extract_json_from_text(response.choices[0].message.content)
+        labels = {}
+        for raw_id, key in result_json.items():
+            try:
+                unit = int(str(raw_id).strip("[] ")) - 1
+            except ValueError:
+                continue
+            if unit in chunk and isinstance(key, str):
+                labels[unit] = key.strip()
+        return labels, usage
+
+    async def _classify_chunks(
+        self, units: list[str], chunks: list[list[int]],
+    ) -> tuple[list[dict[int, str]], dict[str, int]]:
+        """Równoległa klasyfikacja okien; zwraca etykiety per okno i zsumowane usage."""
+        tasks = [asyncio.ensure_future(self._classify_chunk(units, chunk)) for chunk in chunks]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            if isinstance(e, json.JSONDecodeError):
+                raise ValueError(f"Nie udało się sparsować JSON z odpowiedzi LLM: {e}")
+            if isinstance(e, Exception):
+                raise ValueError(f"Błąd podczas parsowania odpowiedzi: {e}")
+            raise
+
+        usage_total = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        for _, usage in results:
+            for key in usage_total:
+                usage_total[key] += int(usage.get(key) or 0)
+        return [labels for labels, _ in results], usage_total
+
+    async def _parse_chunked(self, response_text: str) -> ParsedResponse:
+        """Długa odpowiedź: równoległa klasyfikacja akapitów w oknach z zakładką, scalanie lokalne."""
+        units = split_units(response_text)
+        chunks = build_chunks(units, CHUNK_TOKENS, CHUNK_OVERLAP_UNITS)
+        self._record_method("llm_chunked")
+        chunk_labels, usage_total = await self._classify_chunks(units, chunks)
+
+        merge_start = time.perf_counter()
+        keys = self.sections_def["keys"]
+        assigned = merge_assignments(len(units), chunks, chunk_labels, keys)
+        sections = assemble_sections(units, assigned, keys)
+        merge_ms = round((time.perf_counter() - merge_start) * 1000, 2)
+
+        self.last_usage = usage_total
+        self.last_meta.update({"chunks": len(chunks), "units": len(units), "merge_ms": merge_ms})
+        logger.info("Parse %s: tryb okienkowy, %d akapitów w %d oknach", self.competency, len(units), len(chunks))
+        return ParsedResponse(sections=sections, raw_text=response_text)
+
+    async def reparse(
+        self,
+        response_text: str,
+        previous_sections: Optional[dict[str, str]],
+        sections: Optional[dict[str, str]] = None,
+    ) -> ParsedResponse:
+        """Parsowanie poprawionej odpowiedzi (revise) z użyciem poprzedniego podziału.
+
+        Akapity niezmienione względem `previous_sections` zachowują swoją sekcję; LLM klasyfikuje
+        tylko nowe/zmienione akapity (z sąsiadami jako kontekstem) w oknach jak w _parse_chunked.
+        Sekcje od klienta, podział po nagłówkach albo brak akapitów do przeniesienia - zwykłe parse().
+        """
+        if sections or not previous_sections or (
+            self.use_rules and split_sections(response_text, self.sections_def) is not None
+        ):
+            return await self.parse(response_text, sections)
+
+        keys = self.sections_def["keys"]
+        units = split_units(response_text)
+        known = reuse_assignments(units, previous_sections, keys)
+        if not known:
+            return await self.parse(response_text)
+
+        chunks = pending_chunks(units, known, CHUNK_TOKENS, CHUNK_OVERLAP_UNITS)
+        self.last_usage = None
+        self._record_method("llm_incremental" if chunks else "reused")
+        chunk_labels, usage_total = await self._classify_chunks(units, chunks)
+        if chunks:
+            self.last_usage = usage_total
+
+        # Poprzedni podział głosuje pierwszy - przy remisie wygrywa sekcja niezmienionego akapitu
+        assigned = merge_assignments(len(units), [sorted(known), *chunks], [known, *chunk_labels], keys)
+        self.last_meta.update({"units": len(units), "reused_units": len(known), "chunks": len(chunks)})
+        logger.info(
+            "Parse %s: %d z %d akapitów z poprzedniego podziału, %d okien",
+            self.competency, len(known), len(units), len(chunks),
+        )
+        return ParsedResponse(sections=assemble_sections(units, assigned, keys), raw_text=response_text)
+
+    def _record_method(self, method: str) -> None:
+        _PARSE_STATS[method] += 1
+        self.last_meta = {"method": method, "llm_skipped": method in ("presectioned", "rules", "shared", "reused")}
+        logger.debug("Parse %s: metoda %s", self.competency, method)
+
     def validate_parsed_response(self, parsed: ParsedResponse) -> tuple[bool, list[str]]:
         """Waliduje czy sparsowana odpowiedź ma wystarczającą zawartość."""
         missing = []
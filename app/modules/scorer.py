@@ -5,13 +5,46 @@ Przypisuje ocenę 0-4 (co 0.25) na podstawie analizy wymiarów (dynamicznie per
 
 import json
 import re
+import statistics
 from pathlib import Path
-from typing import Any
-from app.llm_client import get_llm_client, get_model_name, max_tokens_param, temperature_param
+from typing import Any, Optional
+from app.llm_client import (
+    create_chat_completion,
+    get_llm_client,
+    get_model_name,
+    max_tokens_param,
+    temperature_param,
+)
 from app.models import MappedResponse, ScoringResult, DimensionScore
 from app.rubric import get_wymiary_for_competency, get_poziom_kompetencji
 from app.prompt_manager import get_active_prompt_content, get_system_prompt
 
+SCORER_CONFIG_PATH = Path(__file__).parent.parent.parent / "config" / "scorer.json"
+AGGREGATES = ("median", "mean")
+
+
+def get_scorer_config(competency: str, config_path: Path = SCORER_CONFIG_PATH) -> dict:
+    """Ustawienia scorera: _default nadpisane ustawieniami kompetencji."""
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        data = {}
+    config = {"samples": 1, "aggregate": "median", "sample_temperature": 0.7}
+    config.update(data.get("_default", {}))
+    config.update(data.get(competency, {}))
+    config["samples"] = max(1, int(config["samples"]))
+    if config["aggregate"] not in AGGREGATES:
+        raise ValueError(f"Nieznana agregacja scorera: {config['aggregate']}. Dostępne: {AGGREGATES}")
+    return config
+
+
+def aggregate_samples(samples: list[float], method: str) -> tuple[float, Optional[float]]:
+    """Łączy próbki ocen wymiaru; zwraca (ocena, rozrzut max-min). Rozrzut None dla jednej próbki."""
+    score = statistics.median(samples) if method == "median" else statistics.fmean(samples)
+    spread = round(max(samples) - min(samples), 4) if len(samples) > 1 else None
+    return round(score, 4), spread
+
 
 class CompetencyScorer:
     """Scorer oceniający kompetencję na podstawie wymiarów"""
@@ -29,6 +62,11 @@ class CompetencyScorer:
             weights_data = json.load(f)
             self.weights = weights_data[competency]
 
+        config = get_scorer_config(competency)
+        self.samples = config["samples"]
+        self.aggregate = config["aggregate"]
+        self.sample_temperature = config["sample_temperature"]
+
         self.prompt_template = get_active_prompt_content("score", competency)
         self.system_prompt = get_system_prompt("score")
         self.last_usage: dict[str, Any] | None = None
@@ -50,14 +88,35 @@ class CompetencyScorer:
         for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
             self._accumulated_usage[key] += int(d.get(key, 0))
 
+    @staticmethod
+    def final_score(total_weighted_score: float) -> float:
+        """Ocena końcowa 0-4 (co 0.25) z sumy punktów wymiarów (ocena * waga, suma wag = 1)."""
+        final_score = round(total_weighted_score * 4.0 * 4) / 4
+        return max(0.0, min(4.0, final_score))
+
     async def score(self, mapped_response: MappedResponse) -> ScoringResult:
         """Ocenia kompetencję na podstawie zmapowanej odpowiedzi."""
+        return await self.rescore(mapped_response, previous_scores={}, dimensions=None)
+
+    async def rescore(
+        self,
+        mapped_response: MappedResponse,
+        previous_scores: dict[str, float],
+        dimensions: set[str] | None,
+        previous_samples: dict[str, tuple[Optional[float], int]] | None = None,
+    ) -> ScoringResult:
+        """Ocenia tylko wymiary z `dimensions` (None = wszystkie); pozostałe biorą ocenę z previous_scores
+        (i rozrzut/liczbę próbek z previous_samples)."""
         self._accumulated_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
         dimension_scores = {}
         total_weighted_score = 0.0
 
         for wymiar_key, evidence in mapped_response.evidence.items():
-            wymiar_score = await self._score_dimension(wymiar_key, evidence, mapped_response)
+            if dimensions is None or wymiar_key in dimensions or wymiar_key not in previous_scores:
+                wymiar_score, rozrzut, liczba_probek = await self._score_dimension(wymiar_key, evidence, mapped_response)
+            else:
+                wymiar_score = previous_scores[wymiar_key]
+                rozrzut, liczba_probek = (previous_samples or {}).get(wymiar_key, (None, 1))
             waga = self.weights.get(wymiar_key, 0.0)
             punkty = wymiar_score * waga
             total_weighted_score += punkty
@@ -67,12 +126,12 @@ class CompetencyScorer:
                 ocena=wymiar_score,
                 waga=waga,
                 punkty=punkty,
-                uzasadnienie=self._get_dimension_justification(wymiar_key, wymiar_score, evidence)
+                uzasadnienie=self._get_dimension_justification(wymiar_key, wymiar_score, evidence),
+                rozrzut=rozrzut,
+                liczba_probek=liczba_probek,
             )
 
-        final_score = total_weighted_score * 4.0
-        final_score = round(final_score * 4) / 4
-        final_score = max(0.0, min(4.0, final_score))
+        final_score = self.final_score(total_weighted_score)
 
         poziom = get_poziom_kompetencji(final_score)
 
@@ -89,10 +148,15 @@ class CompetencyScorer:
         wymiar_key: str,
         evidence,
         mapped_response: MappedResponse
-    ) -> float:
-        """Ocenia pojedynczy wymiar w skali 0-1."""
+    ) -> tuple[float, Optional[float], int]:
+        """Ocenia pojedynczy wymiar w skali 0-1; zwraca (ocena, rozrzut, liczba próbek).
+
+        Przy samples > 1 prosi o n odpowiedzi w jednym wywołaniu (prompt liczony raz na backendach
+        obsługujących `n`) i agreguje je medianą lub średnią. Backend, który ignoruje `n`, zwraca
+        jedną odpowiedź - wtedy ocena jest z jednej próbki, bez rozrzutu.
+        """
         if not evidence.czy_obecny or len(evidence.znalezione_fragmenty) == 0:
-            return 0.0
+            return 0.0, None, 0
 
         wymiar_def = self.wymiary[wymiar_key]
 
@@ -103,30 +167,37 @@ class CompetencyScorer:
             dowody=self._format_evidence(evidence),
         )
 
+        if self.samples > 1:
+            sampling = {"n": self.samples, **temperature_param(self.sample_temperature)}
+        else:
+            sampling = temperature_param(0.1)
+
         try:
-            response = await self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
-                **temperature_param(0.1),
+                **sampling,
                 **max_tokens_param(10)
             )
 
             self._accumulate_usage(getattr(response, "usage", None))
-            score_text = response.choices[0].message.content.strip()
-            match = re.search(r'(\d+\.?\d*)', score_text)
-            if match:
-                score = float(match.group(1))
-            else:
-                return self._fallback_score(evidence)
+            samples = []
+            for choice in response.choices:
+                match = re.search(r'(\d+\.?\d*)', (choice.message.content or "").strip())
+                if match:
+                    samples.append(max(0.0, min(1.0, float(match.group(1)))))
+            if not samples:
+                return self._fallback_score(evidence), None, 0
 
-            score = max(0.0, min(1.0, score))
-            return score
+            score, spread = aggregate_samples(samples, self.aggregate)
+            return score, spread, len(samples)
 
         except Exception:
-            return self._fallback_score(evidence)
+            return self._fallback_score(evidence), None, 0
 
     def _fallback_score(self, evidence) -> float:
         """Prosta heurystyka scoringu w przypadku błędu LLM."""
@@ -0,0 +1,151 @@
+"""
+Deterministyczny podział odpowiedzi na sekcje (bez LLM).
+Rozpoznaje nagłówki odpowiadające etykietom i słowom kluczowym z PARSE_SECTIONS
+(porównanie bez polskich znaków diakrytycznych). Zwraca None, gdy podział nie jest pewny -
+wtedy parser korzysta z LLM.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+MIN_SECTION_CHARS = 20
+MAX_HEADING_CHARS = 80
+MAX_HEADING_WORDS = 8
+MAX_PREAMBLE_CHARS = 200
+MIN_HEADING_SCORE = 2
+
+_STOPWORDS = {"i", "oraz", "do", "co", "jak", "w", "z", "na", "po", "o", "a", "ze", "dla", "od", "sie"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NUMBERED_RE = re.compile(r"^(?:\d{1,2}|[IVXivx]{1,4})[.)]\s+")
+_BULLET_RE = re.compile(r"^[-•–·]\s+|^\*\s+")
+_BOLD_RE = re.compile(r"^\*\*(.+?)\*\*\s*:?\s*(.*)$")
+_PARENS_RE = re.compile(r"\([^)]*\)")
+
+
+def fold_diacritics(text: str) -> str:
+    """Małe litery bez polskich znaków (ł nie rozkłada się w NFKD)."""
+    text = text.lower().replace("ł", "l")
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _tokens(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(fold_diacritics(text)) if t not in _STOPWORDS]
+
+
+def _stem(token: str) -> str:
+    return token[:6] if len(token) > 6 else token
+
+
+def _build_vocabulary(sections_def: dict) -> dict[str, dict[str, set[str]]]:
+    vocab = {}
+    for key in sections_def["keys"]:
+        label = sections_def["labels"].get(key, key)
+        vocab[key] = {
+            "label": {_stem(t) for t in _tokens(label) + _tokens(key.replace("_", " "))},
+            "keywords": {fold_diacritics(k) for k in sections_def.get("keywords", {}).get(key, [])},
+        }
+    return vocab
+
+
+def _score_heading(heading: str, vocab: dict[str, dict[str, set[str]]]) -> Optional[str]:
+    """Zwraca klucz sekcji, jeśli nagłówek jednoznacznie pasuje do jednej sekcji."""
+    tokens = _tokens(heading)
+    if not tokens:
+        return None
+    scores = {}
+    for key, words in vocab.items():
+        score = 0
+        for token in tokens:
+            if any(token.startswith(kw) for kw in words["keywords"]):
+                score += 2
+            elif _stem(token) in words["label"] or any(token.startswith(s) for s in words["label"] if len(s) >= 4):
+                score += 1
+        scores[key] = score
+    best = max(scores.values())
+    if best < MIN_HEADING_SCORE:
+        return None
+    winners = [k for k, v in scores.items() if v == best]
+    return winners[0] if len(winners) == 1 else None
+
+
+def _heading_candidate(line: str) -> Optional[tuple[str, str, str]]:
+    """Rozpoznaje linię wyglądającą na nagłówek. Zwraca (styl, tekst nagłówka, treść w tej samej linii)."""
+    stripped = line.strip()
+    if not stripped or _BULLET_RE.match(stripped):
+        return None
+
+    style = "plain"
+    if stripped.startswith("#"):
+        style = "markdown"
+        stripped = stripped.lstrip("#").strip()
+    numbered = _NUMBERED_RE.match(stripped)
+    if numbered:
+        style = "numbered"
+        stripped = stripped[numbered.end():]
+
+    bold = _BOLD_RE.match(stripped)
+    if bold:
+        if style == "plain":
+            style = "bold"
+        heading, rest = bold.group(1), bold.group(2)
+    elif style == "markdown":
+        heading, rest = stripped, ""
+    elif ":" in stripped:
+        heading, rest = stripped.split(":", 1)
+    elif len(stripped.split()) <= 6 and not stripped.endswith((".", "!", "?", '"', "”")):
+        heading, rest = stripped, ""
+    else:
+        return None
+
+    heading = _PARENS_RE.sub(" ", heading).strip(" *_:–-")
+    if not heading or len(heading) > MAX_HEADING_CHARS or len(heading.split()) > MAX_HEADING_WORDS:
+        return None
+    return style, heading, rest.strip()
+
+
+def split_sections(
+    response_text: str,
+    sections_def: dict,
+    min_section_chars: int = MIN_SECTION_CHARS,
+) -> Optional[dict[str, str]]:
+    """Dzieli tekst po nagłówkach sekcji. None = brak pewności (brakujące/niejednoznaczne sekcje)."""
+    vocab = _build_vocabulary(sections_def)
+    heading_style: Optional[str] = None
+    current: Optional[str] = None
+    preamble: list[str] = []
+    collected: dict[str, list[str]] = {key: [] for key in sections_def["keys"]}
+    paragraph_start = True
+
+    for line in response_text.splitlines():
+        candidate = _heading_candidate(line)
+        starts_paragraph, paragraph_start = paragraph_start, not line.strip()
+        if candidate:
+            style, heading, rest = candidate
+            key = _score_heading(heading, vocab)
+            # Nagłówki sekcji mają jeden styl - np. "4. **Zakres decyzyjności:**" wewnątrz
+            # sekcji pogrubionych nagłówków to punkt listy, nie nowa sekcja
+            same_style = heading_style is None or style == heading_style
+            # Bez wyróżnienia nagłówkiem jest cała krótka linia albo "Etykieta: treść" na początku
+            # akapitu; "Decyzja: ..." w środku akapitu to zdanie narracji i zostaje w sekcji w całości
+            inline_plain = style == "plain" and rest and not starts_paragraph
+            if key and same_style and not inline_plain:
+                heading_style = style
+                current = key
+                if rest:
+                    collected[key].append(rest)
+                continue
+
+        target = collected[current] if current else preamble
+        target.append(line.rstrip())
+
+    if current is None:
+        return None
+    if len("\n".join(preamble).strip()) > MAX_PREAMBLE_CHARS:
+        return None
+
+    sections = {key: "\n".join(lines).strip() for key, lines in collected.items()}
+    if any(len(value) < min_section_chars for value in sections.values()):
+        return None
+    return sections
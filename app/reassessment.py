@@ -0,0 +1,152 @@
+"""
+Ponowna ocena zapisanych assessmentów - tylko etapy unieważnione przez zmianę
+wersji promptów, modelu LLM lub wag. Wyniki pozostałych etapów są przenoszone bez zmian.
+Sama zmiana wag nie wymaga LLM w etapie score - wynik jest przeliczany z ocen wymiarów.
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+from app.deadline import PIPELINE_STAGES
+from app.modules.scorer import CompetencyScorer
+from app.rubric import get_poziom_kompetencji
+
+logger = logging.getLogger("lem.reassessment")
+
+REUSE = "reuse"
+RERUN = "rerun"
+REAGGREGATE = "reaggregate"
+
+StageRunner = Callable[[str, dict[str, Any]], Awaitable[dict[str, Any]]]
+
+
+def stored_fingerprint(assessment: dict[str, Any]) -> dict[str, Any]:
+    """Wersje promptów, model i wagi, z którymi powstały zapisane etapy."""
+    steps = assessment.get("steps", {})
+    prompt_versions = assessment.get("prompt_versions") or {}
+    fingerprint: dict[str, Any] = {"stages": {}}
+    for stage in PIPELINE_STAGES:
+        step = steps.get(stage) or {}
+        fingerprint["stages"][stage] = {
+            "prompt_version": (step.get("_prompt_meta") or {}).get("active_version") or prompt_versions.get(stage),
+            "model": (step.get("_llm") or {}).get("model") or assessment.get("llm_model"),
+            "llm_skipped": bool((step.get("_parse_meta") or {}).get("llm_skipped")),
+        }
+    dimension_scores = (steps.get("score") or {}).get("dimension_scores") or {}
+    fingerprint["weights"] = {key: value.get("waga") for key, value in dimension_scores.items()}
+    return fingerprint
+
+
+def plan_reassessment(
+    assessment: dict[str, Any],
+    current: dict[str, Any],
+    force_from: Optional[str] = None,
+) -> dict[str, Any]:
+    """Wyznacza akcję dla każdego etapu: reuse / rerun / reaggregate.
+
+    current: {"prompt_versions": {...}, "model": str, "weights": {...}} - stan obecnej konfiguracji.
+    Pierwszy unieważniony etap i wszystkie kolejne są uruchamiane ponownie.
+    """
+    stored = stored_fingerprint(assessment)
+    steps = assessment.get("steps", {})
+    reasons: dict[str, list[str]] = {}
+
+    for stage in PIPELINE_STAGES:
+        was = stored["stages"][stage]
+        stage_reasons = []
+        if not steps.get(stage):
+            stage_reasons.append("brak zapisanego wyniku")
+        elif not was["llm_skipped"]:
+            new_version = (current.get("prompt_versions") or {}).get(stage)
+            if new_version and was["prompt_version"] != new_version:
+                stage_reasons.append(f"prompt {was['prompt_version']} -> {new_version}")
+            if current.get("model") and was["model"] != current["model"]:
+                stage_reasons.append(f"model {was['model']} -> {current['model']}")
+        if force_from and PIPELINE_STAGES.index(stage) >= PIPELINE_STAGES.index(force_from):
+            stage_reasons.append("wymuszone")
+        if stage_reasons:
+            reasons[stage] = stage_reasons
+
+    weights_changed = {
+        key: value for key, value in (current.get("weights") or {}).items()
+        if stored["weights"] and stored["weights"].get(key) != value
+    }
+
+    actions: dict[str, str] = {}
+    invalidated = False
+    for stage in PIPELINE_STAGES:
+        if invalidated or stage in reasons:
+            invalidated = True
+            actions[stage] = RERUN
+        elif stage == "score" and weights_changed:
+            reasons["score"] = [f"wagi: {sorted(weights_changed)}"]
+            actions[stage] = REAGGREGATE
+            invalidated = True
+        else:
+            actions[stage] = REUSE
+
+    return {
+        "assessment_id": assessment.get("id"),
+        "actions": actions,
+        "reasons": reasons,
+        "up_to_date": all(action == REUSE for action in actions.values()),
+    }
+
+
+def reaggregate_score(score_step: dict[str, Any], weights: dict[str, float]) -> dict[str, Any]:
+    """Przelicza wynik końcowy z zapisanych ocen wymiarów dla nowych wag (bez LLM)."""
+    dimension_scores = {}
+    total = 0.0
+    for key, data in (score_step.get("dimension_scores") or {}).items():
+        waga = weights.get(key, 0.0)
+        punkty = (data.get("ocena") or 0.0) * waga
+        total += punkty
+        dimension_scores[key] = {**data, "waga": waga, "punkty": punkty}
+
+    final_score = CompetencyScorer.final_score(total)
+    output = dict(score_step)
+    output.update({
+        "ocena": final_score,
+        "poziom": get_poziom_kompetencji(final_score).value,
+        "dimension_scores": dimension_scores,
+        "_usage": None,
+        "_cost": None,
+        "_reaggregated": True,
+    })
+    if "ocena_delegowanie" in output:
+        # Alias wstecznej zgodności (tylko w krokach, które go zapisały) - nie może wskazywać starej oceny
+        output["ocena_delegowanie"] = final_score
+    return output
+
+
+async def execute_reassessment(
+    assessment: dict[str, Any],
+    plan: dict[str, Any],
+    run_stage: StageRunner,
+    weights: dict[str, float],
+) -> dict[str, Any]:
+    """Wykonuje plan: etapy reuse są kopiowane (z oznaczeniem źródła), pozostałe liczone od nowa."""
+    stored_steps = assessment.get("steps", {})
+    steps: dict[str, Any] = {}
+    previous: Optional[dict[str, Any]] = None
+    for stage in PIPELINE_STAGES:
+        action = plan["actions"][stage]
+        if action == REUSE:
+            output = {**stored_steps[stage], "_reused_from": assessment["id"]}
+        elif action == REAGGREGATE:
+            output = reaggregate_score(stored_steps["score"], weights)
+        else:
+            if stage == "parse":
+                payload = {"response_text": assessment["response_text"]}
+            else:
+                payload = dict(previous or {})
+            payload["competency"] = assessment["competency"]
+            output = await run_stage(stage, payload)
+        steps[stage] = output
+        previous = output
+    logger.info(
+        "Reassess #%s: %s",
+        assessment.get("id"),
+        ", ".join(f"{stage}={action}" for stage, action in plan["actions"].items()),
+    )
+    return steps
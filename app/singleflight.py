@@ -0,0 +1,82 @@
+"""
+Single-flight: współdzielenie jednego wykonania pipeline'u przez identyczne, równoległe żądania.
+Działa w obrębie procesu (workera) - kolejne żądanie z tym samym kluczem dołącza do
+trwającego wykonania zamiast uruchamiać własne wywołania LLM.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, TypeVar
+
+logger = logging.getLogger("lem.singleflight")
+
+T = TypeVar("T")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalizacja tekstu do klucza: różnice w białych znakach nie zmieniają wyniku."""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def make_flight_key(*parts: Any) -> str:
+    """Stabilny klucz z dowolnych części serializowalnych do JSON."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Grupa współdzielonych wykonań identyfikowanych kluczem."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            self.executions += 1
+            call.task.add_done_callback(lambda _t, k=key, c=call: self._forget(k, c))
+        else:
+            self.coalesced += 1
+            logger.info("[%s] Dołączono do trwającego wykonania %s (oczekujących: %d)", self.name, key[:12], call.waiters + 1)
+
+        call.waiters += 1
+        try:
+            # shield: anulowanie jednego oczekującego nie przerywa wykonania pozostałym
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self.abandoned += 1
+                logger.warning("[%s] Brak oczekujących - anuluję wykonanie %s", self.name, key[:12])
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "executions": self.executions,
+            "coalesced_requests": self.coalesced,
+            "saved_executions": self.coalesced,
+            "abandoned_executions": self.abandoned,
+            "in_flight": len(self._calls),
+        }
@@ -53,9 +53,21 @@ window.LEMShared = (function () {
         }, 2800);
     }
 
+    // Strona listy stronicowanej kursorem (/api/sessions, /api/runs, /api/db/assessments);
+    // nextCursor = null na ostatniej stronie
+    async function fetchPage(url, cursor) {
+        const sep = url.includes("?") ? "&" : "?";
+        const resp = await fetch(cursor ? `${url}${sep}cursor=${encodeURIComponent(cursor)}` : url);
+        if (!resp.ok) {
+            throw new Error(`HTTP ${resp.status}`);
+        }
+        return { items: await resp.json(), nextCursor: resp.headers.get("X-Next-Cursor") };
+    }
+
     return {
         escHtml,
         ensureAuth,
+        fetchPage,
         doLogout,
         setActiveNav,
         showToast,
@@ -0,0 +1,147 @@
+"""
+Zapis write-behind wyników POST /assess (audyt ruchu API).
+Odpowiedź nie czeka na commit SQLite: wynik trafia do kolejki w pamięci procesu, a task zapisujący
+grupuje wpisy i zapisuje je partiami - jedna transakcja na partię (db_models.save_assessments).
+Kolejka jest opróżniana przy zamknięciu workera (shutdown).
+
+Wpisy ponad LEM_WRITE_BEHIND_MAX_PENDING są odrzucane z ostrzeżeniem - zapis nie może blokować
+ani spowalniać odpowiedzi. Włączane przez LEM_PERSIST_ASSESS=1.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Optional
+
+from app.db_models import save_assessment, save_assessments
+
+logger = logging.getLogger("lem.write_behind")
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL_S = 0.5
+DEFAULT_MAX_PENDING = 1000
+
+
+def persist_assess_enabled() -> bool:
+    return os.getenv("LEM_PERSIST_ASSESS", "0").strip().lower() in ("1", "true", "yes")
+
+
+class WriteBehindQueue:
+    """Kolejka zapisów ocen z zapisem partiami w tle."""
+
+    def __init__(
+        self,
+        writer: Callable[[list[dict[str, Any]]], Awaitable[Any]] = save_assessments,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S,
+        max_pending: Optional[int] = None,
+    ):
+        self.writer = writer
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        if max_pending is None:
+            max_pending = int(os.getenv("LEM_WRITE_BEHIND_MAX_PENDING", str(DEFAULT_MAX_PENDING)))
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_pending))
+        self._task: Optional[asyncio.Task] = None
+        self._current: Optional[asyncio.Future] = None
+        self._held: Optional[dict[str, Any]] = None  # wpis pobrany z kolejki, czekający na okno partii
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_batch_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def enqueue(self, record: dict[str, Any]) -> bool:
+        """Dodaje ocenę do zapisu; False gdy kolejka jest pełna (wpis odrzucony)."""
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Kolejka zapisu pełna - pominięto ocenę %s/%s", record.get("participant_id"), record.get("competency"))
+            return False
+        self.enqueued += 1
+        self.start()
+        return True
+
+    def _drain(self, first: dict[str, Any]) -> list[dict[str, Any]]:
+        batch = [first]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self._held = await self._queue.get()
+                # Krótkie okno na zebranie partii (odpowiedzi i tak już wysłane)
+                if self._queue.qsize() < self.batch_size - 1:
+                    await asyncio.sleep(self.flush_interval_s)
+            except asyncio.CancelledError:
+                return
+            batch, self._held = self._drain(self._held), None
+            self._current = asyncio.ensure_future(self._write(batch))
+            try:
+                # Anulowanie taska (shutdown) nie przerywa rozpoczętej transakcji - flush na nią poczeka
+                await asyncio.shield(self._current)
+            except asyncio.CancelledError:
+                return
+
+    async def _write(self, batch: list[dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            await self.writer(batch)
+            self.written += len(batch)
+        except Exception:
+            logger.exception("Zapis partii %d ocen nieudany - zapis pojedynczo", len(batch))
+            # Jeden błędny wpis nie może przepaść razem z całą partią
+            for record in batch:
+                try:
+                    await save_assessment(**record)
+                    self.written += 1
+                except Exception:
+                    self.failed += 1
+                    logger.exception("Nie zapisano oceny %s/%s", record.get("participant_id"), record.get("competency"))
+        self.batches += 1
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+
+    async def flush_and_stop(self) -> None:
+        """Zatrzymuje task i zapisuje wszystko, co zostało w kolejce (shutdown workera)."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        if self._current is not None and not self._current.done():
+            await self._current
+        if self._held is not None:
+            held, self._held = self._held, None
+            await self._write(self._drain(held))
+        while not self._queue.empty():
+            await self._write(self._drain(self._queue.get_nowait()))
+        # Nowa kolejka - stara jest związana z pętlą zdarzeń, która właśnie się kończy
+        self._queue = asyncio.Queue(maxsize=self._queue.maxsize)
+        if self.enqueued:
+            logger.info("Kolejka zapisu opróżniona: zapisano %d, błędy %d, odrzucone %d", self.written, self.failed, self.dropped)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": persist_assess_enabled(),
+            "pending": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 1) if self.batches else 0.0,
+            "last_batch_ms": round(self.last_batch_ms, 1),
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+WRITE_BEHIND = WriteBehindQueue()
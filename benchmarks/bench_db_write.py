@@ -0,0 +1,149 @@
+"""
+Benchmark zapisu ocen do SQLite: wiersze/s dla zapisu wiersz po wierszu (odtworzona implementacja
+sprzed puli połączeń: nowe połączenie na każdą ocenę, domyślny dziennik rollback, osobny await na
+każdy wiersz i commit na ocenę), save_assessment (executemany w transakcji kolejki zapisów, WAL)
+i save_assessments (wiele ocen w jednej transakcji)
+Uruchom: python benchmarks/bench_db_write.py --assessments 500 --batch 50
+Używa tymczasowej bazy, bez LLM.
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+# Dodaj główny katalog do PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import app.database as database
+from app.db_models import (
+    ASSESSMENT_CHILD_INSERTS,
+    _INSERT_ASSESSMENT_SQL,
+    _assessment_child_rows,
+    _assessment_row,
+    _now_iso,
+    save_assessment,
+    save_assessments,
+)
+from app.db_writer import DB_WRITER
+
+DIMENSIONS = [
+    "intencja", "stan_docelowy", "metoda_pomiaru", "poziom_odpowiedzialnosci",
+    "harmonogram", "monitorowanie", "sprawdzenie_zrozumienia",
+]
+
+
+def make_record(index: int) -> dict:
+    """Ocena o kształcie wyniku /assess: 7 wymiarów, 2 cytaty na wymiar, 4 etapy."""
+    text = f"Odpowiedź uczestnika {index}. " * 40
+    return {
+        "participant_id": f"P{index:05d}",
+        "competency": "delegowanie",
+        "created_by": "bench",
+        "run_name": "bench",
+        "prompt_versions": None,
+        "reassessed_from": None,
+        "steps": {
+            "parse": {"sections": {"przebieg": text}, "raw_text": text, "_usage": {"total_tokens": 900}},
+            "map": {"evidence": {
+                dim: {"znalezione_fragmenty": [f"Cytat {dim} 1", f"Cytat {dim} 2"], "czy_obecny": True}
+                for dim in DIMENSIONS
+            }},
+            "score": {"ocena": 2.5, "poziom": "Efektywny", "dimension_scores": {
+                dim: {"ocena": 0.5, "waga": 1 / 7, "punkty": 0.07, "uzasadnienie": "Uzasadnienie wymiaru"}
+                for dim in DIMENSIONS
+            }},
+            "feedback": {"summary": "Podsumowanie", "recommendation": "Rekomendacja",
+                         "mocne_strony": ["A", "B"], "obszary_rozwoju": ["C"]},
+            "timing": {"parse_ms": 10, "map_ms": 20, "score_ms": 30, "feedback_ms": 40},
+        },
+    }
+
+
+def count_rows(record: dict) -> int:
+    return 1 + sum(len(rows) for rows in _assessment_child_rows(0, record["steps"], "").values())
+
+
+async def use_rollback_journal() -> None:
+    """Przywraca domyślny tryb dziennika (init_db ustawia WAL, który jest trwały w pliku bazy)."""
+    await DB_WRITER.stop()
+    await database.close_pool()
+    async with aiosqlite.connect(database.DB_PATH.as_posix()) as conn:
+        await conn.execute("PRAGMA journal_mode = DELETE")
+
+
+async def write_row_by_row(records: list[dict], batch: int) -> None:
+    """Poprzedni sposób zapisu: połączenie otwierane dla każdej oceny (bez puli i pragm strojenia),
+    jeden execute na wiersz, commit po każdej ocenie."""
+    child_sql = dict(ASSESSMENT_CHILD_INSERTS)
+    for record in records:
+        created_at = _now_iso()
+        async with aiosqlite.connect(database.DB_PATH.as_posix()) as conn:
+            await conn.execute("PRAGMA foreign_keys = ON")
+            cursor = await conn.execute(_INSERT_ASSESSMENT_SQL, _assessment_row(**record, created_at=created_at))
+            for table, rows in _assessment_child_rows(cursor.lastrowid, record["steps"], created_at).items():
+                for row in rows:
+                    await conn.execute(child_sql[table], row)
+            await conn.commit()
+
+
+async def write_single(records: list[dict], batch: int) -> None:
+    for record in records:
+        await save_assessment(**record)
+
+
+async def write_bulk(records: list[dict], batch: int) -> None:
+    for start in range(0, len(records), batch):
+        await save_assessments(records[start:start + batch])
+
+
+MODES = {"row_by_row": write_row_by_row, "save_assessment": write_single, "save_assessments": write_bulk}
+
+
+async def run_benchmark(assessments: int, batch: int) -> list[dict]:
+    records = [make_record(i) for i in range(assessments)]
+    rows = sum(count_rows(record) for record in records)
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for mode, write in MODES.items():
+            # Każdy tryb na świeżej bazie - te same warunki startowe
+            database.DB_PATH = Path(tmpdir) / f"{mode}.db"
+            await database.init_db()
+            if mode == "row_by_row":
+                await use_rollback_journal()
+            start = time.perf_counter()
+            await write(records, batch)
+            elapsed = time.perf_counter() - start
+            await DB_WRITER.stop()
+            await database.close_pool()
+            result = {
+                "mode": mode,
+                "assessments": assessments,
+                "rows": rows,
+                "seconds": round(elapsed, 3),
+                "rows_per_s": round(rows / elapsed),
+                "assessments_per_s": round(assessments / elapsed, 1),
+            }
+            print(f"{mode:>16}: {result['rows_per_s']:>8} wierszy/s, {result['assessments_per_s']:>7} ocen/s "
+                  f"({result['seconds']} s)")
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark zapisu ocen do SQLite")
+    parser.add_argument("--assessments", type=int, default=500, help="Liczba zapisywanych ocen")
+    parser.add_argument("--batch", type=int, default=50, help="Rozmiar partii dla save_assessments")
+    parser.add_argument("--output", help="Opcjonalny plik wyjściowy JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args.assessments, args.batch))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
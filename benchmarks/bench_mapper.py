@@ -0,0 +1,97 @@
+"""
+Benchmark mappera: czas ścienny trybu single (jedno wywołanie) vs per_dimension (wywołania równoległe)
+Uruchom: python benchmarks/bench_mapper.py --competency delegowanie --repeats 5
+Wymaga działającego serwera LLM (LLM_PROVIDER/LOCAL_LLM_URL z .env).
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Dodaj główny katalog do PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.models import ParsedResponse
+from app.modules.mapper import MAPPER_MODES, ResponseMapper
+from app.modules.parser import PARSE_SECTIONS
+from app.modules.section_splitter import split_sections
+
+SAMPLES_DIR = Path(__file__).parent.parent / "tests" / "sample_responses"
+
+
+def load_samples(competency: str, samples_dir: Path) -> list[tuple[str, ParsedResponse]]:
+    """Próbki podzielone lokalnie na sekcje (bez wywołań parsera LLM)."""
+    samples = []
+    for path in sorted(samples_dir.glob("*.txt")):
+        text = path.read_text(encoding="utf-8")
+        sections = split_sections(text, PARSE_SECTIONS[competency])
+        if sections is None:
+            print(f"Pomijam {path.name}: brak pewnego podziału na sekcje")
+            continue
+        samples.append((path.name, ParsedResponse(sections=sections, raw_text=text)))
+    return samples
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def bench_mode(mode: str, competency: str, samples: list[tuple[str, ParsedResponse]], repeats: int) -> dict:
+    mapper = ResponseMapper(competency)
+    mapper.mode = mode
+    timings_ms = []
+    completion_tokens = []
+    for _ in range(repeats):
+        for _name, parsed in samples:
+            start = time.perf_counter()
+            await mapper.map(parsed)
+            timings_ms.append((time.perf_counter() - start) * 1000)
+            completion_tokens.append((mapper.last_usage or {}).get("completion_tokens", 0))
+    return {
+        "mode": mode,
+        "runs": len(timings_ms),
+        "median_ms": round(statistics.median(timings_ms), 1),
+        "p95_ms": round(percentile(timings_ms, 95), 1),
+        "mean_completion_tokens": round(statistics.mean(completion_tokens), 1),
+    }
+
+
+async def run_benchmark(competency: str, repeats: int, samples_dir: Path) -> list[dict]:
+    samples = load_samples(competency, samples_dir)
+    if not samples:
+        print("Brak próbek do benchmarku")
+        return []
+    # Rozgrzewka (połączenie, cache prefiksów) nie jest liczona
+    await ResponseMapper(competency).map(samples[0][1])
+
+    results = []
+    for mode in MAPPER_MODES:
+        result = await bench_mode(mode, competency, samples, repeats)
+        print(f"{mode:>14}: mediana {result['median_ms']} ms, p95 {result['p95_ms']} ms, "
+              f"completion tokens (śr.) {result['mean_completion_tokens']}")
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Benchmark trybów mappera LEM")
+    parser.add_argument("--competency", default="delegowanie", help="Kompetencja (klucz z PARSE_SECTIONS)")
+    parser.add_argument("--repeats", type=int, default=3, help="Liczba powtórzeń na próbkę")
+    parser.add_argument("--samples", default=str(SAMPLES_DIR), help="Katalog z odpowiedziami (.txt)")
+    parser.add_argument("--output", help="Opcjonalny plik wyjściowy JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args.competency, args.repeats, Path(args.samples)))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
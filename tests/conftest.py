@@ -0,0 +1,76 @@
+"""
+Wspólne fixtures testów: tymczasowa baza SQLite i atrapa klienta LLM
+"""
+
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+import app.database as database
+from app.db_writer import DB_WRITER
+
+DEFAULT_USAGE = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+
+
+class FakeLLMClient:
+    """Atrapa AsyncOpenAI (chat.completions.create) zapisująca argumenty wywołań.
+
+    `replies` - lista kolejnych odpowiedzi albo funkcja argumentów wywołania zwracająca treść
+    (lub listę treści - po jednej na choice); `usage` - słownik, lista kolejnych słowników (ostatni
+    powtarzany) albo funkcja argumentów wywołania. Przy `stream=True` treść przychodzi w kawałkach,
+    a usage w ostatnim chunku.
+    """
+
+    def __init__(self, replies, usage=None, stream: bool = False, chunk_size: int = 7):
+        self.replies = replies if callable(replies) else list(replies)
+        self.usage = usage or DEFAULT_USAGE
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.calls: list[dict] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @property
+    def prompts(self) -> list[str]:
+        return [call["messages"][-1]["content"] for call in self.calls]
+
+    def _usage(self, kwargs: dict) -> dict:
+        if callable(self.usage):
+            return self.usage(kwargs)
+        if isinstance(self.usage, list):
+            return self.usage[min(len(self.calls), len(self.usage)) - 1]
+        return self.usage
+
+    async def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.replies(kwargs) if callable(self.replies) else self.replies.pop(0)
+        usage = self._usage(kwargs)
+        if self.stream:
+            return self._chunks(content, usage)
+        contents = content if isinstance(content, list) else [content]
+        return SimpleNamespace(
+            usage=usage,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text)) for text in contents],
+        )
+
+    async def _chunks(self, content: str, usage: dict):
+        for i in range(0, len(content), self.chunk_size):
+            delta = SimpleNamespace(content=content[i:i + self.chunk_size])
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+        yield SimpleNamespace(usage=usage, choices=[])
+
+
+@pytest.fixture
+def fake_llm():
+    """Fabryka atrap klienta LLM: fake_llm(replies, usage=None, stream=False)"""
+    return FakeLLMClient
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path, monkeypatch):
+    """Tymczasowa baza z aktualnym schematem; kolejka zapisów i pula połączeń zamykane po teście"""
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "lem.db")
+    await database.init_db()
+    yield
+    await DB_WRITER.stop()
+    await database.close_pool()
@@ -0,0 +1,107 @@
+"""
+Testy admission control: szacowanie czasu odpowiedzi i odrzucanie ponad SLO (klient LLM zastąpiony atrapą)
+"""
+
+import asyncio
+from contextlib import ExitStack
+from types import SimpleNamespace
+
+import pytest
+
+import app.llm_client as llm_client
+from app.admission import AdmissionController, Rejected, route_stages
+from app.llm_scheduler import LlmScheduler
+
+
+def test_route_stages():
+    assert route_stages("POST", "/assess") == ["parse", "map", "score", "feedback"]
+    assert route_stages("POST", "/api/diagnostic/map") == ["map"]
+    assert route_stages("POST", "/api/pipeline/runs/abc/stages/score") == ["score"]
+    assert route_stages("GET", "/api/diagnostic/map") is None
+    assert route_stages("POST", "/api/pipeline/runs") is None
+
+
+def test_stage_ewma():
+    controller = AdmissionController(slo_ms=60_000, capacity=2)
+    controller.record_stage("map", 1000)
+    controller.record_stage("map", 2000)
+    assert controller.service_ms(["map"]) == pytest.approx(1200)
+
+
+def test_rejects_when_queue_exceeds_slo():
+    controller = AdmissionController(slo_ms=30_000, capacity=2)
+    for stage in ("parse", "map", "score", "feedback"):
+        controller.record_stage(stage, 5000)
+
+    tickets = [controller.admit(["parse", "map", "score", "feedback"]) for _ in range(2)]
+    with pytest.raises(Rejected) as exc:
+        controller.admit(["parse", "map", "score", "feedback"])
+    assert exc.value.retry_after_s >= 1
+    assert controller.rejected == 1
+
+    controller.release(tickets[0])
+    assert controller.admit(["map"])
+
+
+def test_request_deadline_tightens_limit():
+    controller = AdmissionController(slo_ms=60_000, capacity=1)
+    controller.record_stage("feedback", 8000)
+    controller.admit(["feedback"])
+    assert controller.admit(["feedback"], budget_ms=30_000)
+    with pytest.raises(Rejected):
+        controller.admit(["feedback"], budget_ms=10_000)
+
+
+def test_free_slot_is_always_admitted():
+    controller = AdmissionController(slo_ms=10_000, capacity=2)
+    controller.record_stage("map", 50_000)
+    assert controller.admit(["map"]) and controller.admit(["map"])
+    with pytest.raises(Rejected):
+        controller.admit(["map"])
+
+
+def test_disabled_admits_everything():
+    controller = AdmissionController(slo_ms=0, capacity=1)
+    controller.record_stage("map", 10**7)
+    assert controller.admit(["map"]) and controller.admit(["map"]) and controller.admit(["map"])
+
+
+def test_dimension_fan_out_not_counted_as_requests():
+    """Równoległe wywołania jednego żądania (wymiary, próbki) zajmują sloty LLM, nie sloty żądań"""
+    controller = AdmissionController(slo_ms=10_000, capacity=4, llm_capacity=8)
+    controller.record_stage("map", 50_000)
+    controller.admit(["map"])
+
+    with ExitStack() as calls:
+        for _ in range(6):
+            calls.enter_context(controller.llm_call())
+        assert controller.llm_busy_slots() == 3
+        assert controller.admit(["map"])
+
+        # Serwer LLM nasycony (wszystkie sloty schedulera) - jak wszystkie sloty żądań zajęte
+        for _ in range(2):
+            calls.enter_context(controller.llm_call())
+        with pytest.raises(Rejected):
+            controller.admit(["map"])
+    assert controller.llm_in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_only_calls_holding_scheduler_slot_are_counted(monkeypatch):
+    controller = AdmissionController(slo_ms=10_000, capacity=4, llm_capacity=2)
+    monkeypatch.setattr(llm_client, "ADMISSION", controller)
+    monkeypatch.setattr(llm_client, "LLM_SCHEDULER", LlmScheduler(capacity=2, background_share=0))
+    release = asyncio.Event()
+
+    async def create(**kwargs):
+        await release.wait()
+        return "odpowiedź"
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    calls = [asyncio.create_task(llm_client.create_chat_completion(client, model="m")) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    assert controller.llm_in_flight == 2
+
+    release.set()
+    assert await asyncio.gather(*calls) == ["odpowiedź"] * 5
+    assert controller.llm_in_flight == 0
@@ -0,0 +1,63 @@
+"""
+Testy puli połączeń SQLite: tryb WAL, odczyt w trakcie otwartej transakcji zapisu, wycofanie
+niezatwierdzonych zmian przy zwrocie połączenia (tymczasowa baza)
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+import app.database as database
+
+
+async def _insert_sample(conn, label: str) -> None:
+    await conn.execute(
+        "INSERT INTO sample_responses (label, content, created_at) VALUES (?, 'treść', '2026-01-01')", (label,)
+    )
+
+
+@pytest.mark.asyncio
+async def test_pragmas_and_read_only(db):
+    async with database.get_connection() as conn:
+        assert (await (await conn.execute("PRAGMA journal_mode")).fetchone())[0] == "wal"
+        assert (await (await conn.execute("PRAGMA synchronous")).fetchone())[0] == 1  # NORMAL
+        assert (await (await conn.execute("PRAGMA foreign_keys")).fetchone())[0] == 1
+    async with database.get_connection(read_only=True) as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            await _insert_sample(conn, "zakazany")
+
+
+@pytest.mark.asyncio
+async def test_reads_not_blocked_by_open_write(db):
+    reads_before = database.get_pool_stats()["read"]["acquired"]  # odczyty init_db
+    async with database.get_connection() as writer:
+        await _insert_sample(writer, "pierwsza")
+        # Transakcja zapisu otwarta - odczyt widzi ostatni zatwierdzony stan i nie czeka
+        async with database.get_connection(read_only=True) as reader:
+            rows = await asyncio.wait_for(reader.execute_fetchall("SELECT COUNT(*) FROM sample_responses"), 1)
+        assert rows[0][0] == 0
+        await writer.commit()
+
+    stats = database.get_pool_stats()
+    assert stats["write"]["open"] == 1 and stats["read"]["acquired"] == reads_before + 1
+
+
+@pytest.mark.asyncio
+async def test_uncommitted_changes_rolled_back_on_release(db):
+    with pytest.raises(RuntimeError):
+        async with database.get_connection() as conn:
+            await _insert_sample(conn, "porzucona")
+            raise RuntimeError("błąd w trakcie zapisu")
+
+    # Drugi zapis czeka na jedyne połączenie zapisujące i dostaje je czyste
+    async def write_second():
+        async with database.get_connection() as conn:
+            await _insert_sample(conn, "druga")
+            await conn.commit()
+
+    await asyncio.gather(write_second(), write_second())
+    async with database.get_connection(read_only=True) as conn:
+        rows = await conn.execute_fetchall("SELECT label FROM sample_responses ORDER BY id")
+    assert [row["label"] for row in rows] == ["druga", "druga"]
+    assert database.get_pool_stats()["write"]["open"] == 1
@@ -0,0 +1,78 @@
+"""
+Testy kolejki zapisów SQLite: grupowanie operacji w transakcje, wycofanie tylko operacji z błędem,
+oczekiwanie na blokadę pliku innego procesu (tymczasowa baza)
+"""
+
+import asyncio
+import os
+
+import pytest
+import pytest_asyncio
+
+import app.database as database
+from app.db_writer import DbWriter, fcntl
+
+
+@pytest_asyncio.fixture
+async def writer(db):
+    writer = DbWriter(max_batch=10)
+    yield writer
+    await writer.stop()
+
+
+def _insert(label: str):
+    async def op(conn):
+        cursor = await conn.execute(
+            "INSERT INTO sample_responses (label, content, created_at) VALUES (?, 'treść', '2026-01-01')", (label,)
+        )
+        return cursor.lastrowid
+    return op
+
+
+async def _labels() -> list[str]:
+    async with database.get_connection(read_only=True) as conn:
+        rows = await conn.execute_fetchall("SELECT label FROM sample_responses ORDER BY id")
+    return [row["label"] for row in rows]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_batched(writer):
+    ids = await asyncio.gather(*(writer.submit(_insert(f"p{i}")) for i in range(25)))
+
+    assert sorted(ids) == list(range(1, 26))
+    assert len(await _labels()) == 25
+    stats = writer.stats()
+    assert stats["ops"] == 25 and stats["batches"] <= 4 and stats["failed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failing_op_rolled_back_alone(writer):
+    async def broken(conn):
+        await conn.execute(
+            "INSERT INTO sample_responses (label, content, created_at) VALUES ('zła', 'treść', '2026-01-01')"
+        )
+        raise ValueError("błąd operacji")
+
+    results = await asyncio.gather(
+        writer.submit(_insert("a")), writer.submit(broken), writer.submit(_insert("b")), return_exceptions=True
+    )
+
+    assert isinstance(results[1], ValueError)
+    assert await _labels() == ["a", "b"]
+    assert writer.stats()["batches"] == 1 and writer.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(fcntl is None, reason="blokada plików niedostępna")
+async def test_waits_for_other_process_lock(writer):
+    # Drugi deskryptor zachowuje się jak blokada trzymana przez inny worker
+    fd = os.open(database.DB_PATH.as_posix() + ".writer.lock", os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    asyncio.get_running_loop().call_later(0.2, fcntl.flock, fd, fcntl.LOCK_UN)
+    try:
+        await asyncio.wait_for(writer.submit(_insert("po blokadzie")), 5)
+    finally:
+        os.close(fd)
+
+    assert await _labels() == ["po blokadzie"]
+    assert writer.stats()["max_lock_wait_ms"] >= 150
@@ -0,0 +1,107 @@
+"""
+Testy deadline'u żądań: podział budżetu między etapy, 504 po przekroczeniu budżetu etapu,
+499 i anulowanie pracy po rozłączeniu klienta (atrapa żądania zamiast HTTP)
+"""
+
+import asyncio
+
+import pytest
+
+import app.deadline as deadline_module
+from app.deadline import (
+    DEADLINE_HEADER,
+    PIPELINE_STAGES,
+    ClientDisconnected,
+    Deadline,
+    DeadlineExceeded,
+    cancel_on_disconnect,
+)
+
+
+class StubRequest:
+    """Nagłówki i is_disconnected() - tyle, ile używa moduł deadline."""
+
+    def __init__(self, headers: dict | None = None, disconnect_after: int | None = None):
+        self.headers = headers or {}
+        self.disconnect_after = disconnect_after
+        self.polls = 0
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return self.disconnect_after is not None and self.polls >= self.disconnect_after
+
+
+def test_from_request_precedence(monkeypatch):
+    monkeypatch.setenv("LEM_REQUEST_DEADLINE_MS", "40000")
+    assert Deadline.from_request(StubRequest({DEADLINE_HEADER: "20000"}), 10000).budget_ms == 10000
+    assert Deadline.from_request(StubRequest({DEADLINE_HEADER: "20000"})).budget_ms == 20000
+    assert Deadline.from_request(StubRequest({DEADLINE_HEADER: "abc"})).budget_ms == 40000
+    assert Deadline.from_request(None, 5).budget_ms == deadline_module.MIN_DEADLINE_MS
+    monkeypatch.delenv("LEM_REQUEST_DEADLINE_MS")
+    assert Deadline.from_request(StubRequest()).is_unbounded
+
+
+def test_stage_budget_split():
+    deadline = Deadline(10000)
+    # Pierwszy etap dostaje swój udział z wag wszystkich pozostałych etapów (0.15 z 1.0)
+    assert deadline.stage_timeout("parse", PIPELINE_STAGES) == pytest.approx(1.5, abs=0.05)
+    # Ostatni etap dostaje całą resztę budżetu
+    assert deadline.stage_timeout("feedback", ["feedback"]) == pytest.approx(10.0, abs=0.05)
+    assert deadline.stage_timeout("score", ["score", "feedback"]) == pytest.approx(10.0 * 0.20 / 0.55, abs=0.05)
+    assert Deadline().stage_timeout("parse", PIPELINE_STAGES) is None
+
+
+@pytest.mark.asyncio
+async def test_stage_over_budget_raises_504_and_cancels():
+    deadline = Deadline(1000)
+    cancelled = asyncio.Event()
+
+    async def slow_stage():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(DeadlineExceeded) as exc_info:
+        await deadline.run_stage("parse", slow_stage(), PIPELINE_STAGES)
+
+    assert exc_info.value.status_code == 504 and exc_info.value.stage == "parse"
+    assert exc_info.value.budget_ms == pytest.approx(150, abs=10)
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_stage_within_budget_returns_result():
+    assert await Deadline(5000).run_stage("parse", asyncio.sleep(0, result="sekcje"), PIPELINE_STAGES) == "sekcje"
+
+
+@pytest.mark.asyncio
+async def test_disconnect_returns_499_and_cancels_work(monkeypatch):
+    monkeypatch.setattr(deadline_module, "DISCONNECT_POLL_INTERVAL", 0.01)
+    cancelled = asyncio.Event()
+
+    async def pipeline():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    request = StubRequest(disconnect_after=2)
+    with pytest.raises(ClientDisconnected) as exc_info:
+        await cancel_on_disconnect(request, pipeline(), "test")
+
+    assert exc_info.value.status_code == 499
+    assert cancelled.is_set() and request.polls == 2
+
+
+@pytest.mark.asyncio
+async def test_connected_client_gets_result(monkeypatch):
+    monkeypatch.setattr(deadline_module, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+    async def pipeline():
+        await asyncio.sleep(0.05)
+        return "ocena"
+
+    assert await cancel_on_disconnect(StubRequest(), pipeline(), "test") == "ocena"
@@ -0,0 +1,68 @@
+"""
+Testy jednostkowe prefiltra dowodów (BM25 względem rubryki, bez LLM)
+"""
+
+import pytest
+from pathlib import Path
+from app.modules.parser import PARSE_SECTIONS
+from app.modules.section_splitter import split_sections
+from app.modules.evidence_prefilter import (
+    analyze,
+    get_rubric_index,
+    prefilter_sections,
+    split_sentences,
+    stem_pl,
+)
+from app.rubric import get_wymiary_for_competency
+
+
+@pytest.fixture
+def index():
+    return get_rubric_index("delegowanie", get_wymiary_for_competency("delegowanie"))
+
+
+@pytest.fixture
+def long_sections():
+    path = Path(__file__).parent / "sample_responses" / "response_level_3_biegly.txt"
+    return split_sections(path.read_text(encoding="utf-8"), PARSE_SECTIONS["delegowanie"])
+
+
+def test_stemmer_conflates_inflections():
+    """Formy fleksyjne sprowadzane są do wspólnego rdzenia"""
+    assert stem_pl("harmonogramu") == stem_pl("harmonogram")
+    assert analyze("monitorowania")[0] == analyze("monitorowanie")[0]
+
+
+def test_split_sentences_joins_wrapped_lines():
+    """Linie złamane w środku zdania są sklejane, punkty listy zostają osobno"""
+    text = "1. Ustalam cel projektu i\nstan docelowy.\n2. Pytam o harmonogram."
+    assert split_sentences(text) == ["1. Ustalam cel projektu i stan docelowy.", "2. Pytam o harmonogram."]
+
+
+def test_prefilter_shrinks_long_response(index, long_sections):
+    """Długa odpowiedź - do LLM trafia wyraźnie mniej tekstu, każdy wymiar ma kandydatów"""
+    filtered, stats = prefilter_sections(long_sections, index)
+
+    assert filtered is not None
+    assert stats["applied"]
+    assert stats["chars_after"] < stats["chars_before"] * 0.7
+    assert stats["dimensions_without_candidates"] == []
+
+
+def test_prefilter_keeps_best_sentence_per_dimension(index, long_sections):
+    """Zdanie wprost o harmonogramie trafia do kandydatów"""
+    filtered, _ = prefilter_sections(long_sections, index)
+    assert "kamienie milowe" in "\n".join(filtered.values())
+
+
+def test_prefilter_falls_back_on_unrelated_text(index):
+    """Tekst niezwiązany z rubryką - pełny tekst zamiast prefiltra"""
+    sections = {"przygotowanie": "Pogoda była ładna. Pojechałem rowerem nad jezioro. Woda była ciepła."}
+    filtered, stats = prefilter_sections(sections, index)
+
+    assert filtered is None
+    assert not stats["applied"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
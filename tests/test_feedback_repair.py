@@ -0,0 +1,100 @@
+"""
+Testy naprawy feedbacku: kontrola jakości pól i regeneracja tylko pól niepoprawnych (klient LLM zastąpiony atrapą)
+"""
+
+import json
+
+import pytest
+
+from app.models import DimensionScore, Feedback, MappedResponse, ParsedResponse, ScoringResult
+from app.modules.feedback import FeedbackGenerator, field_failures
+
+
+# Pełne generowanie, potem tańsze wywołania naprawcze
+USAGE = [
+    {"prompt_tokens": 1500, "completion_tokens": 600, "total_tokens": 2100},
+    {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+]
+
+
+@pytest.fixture
+def scoring():
+    parsed = ParsedResponse(sections={"przebieg": "Rozmowa"}, raw_text="Rozmowa")
+    return ScoringResult(
+        ocena=2.5,
+        poziom="Efektywny",
+        dimension_scores={"intencja": DimensionScore(wymiar="intencja", ocena=0.7, waga=1.0, punkty=0.7, uzasadnienie="")},
+        mapped_response=MappedResponse(evidence={}, parsed_response=parsed),
+    )
+
+
+def _words(n: int) -> str:
+    return " ".join(["słowo"] * n)
+
+
+def test_field_failures():
+    feedback = Feedback(summary=_words(10), recommendation=_words(20), mocne_strony=["A"], obszary_rozwoju=[])
+    assert field_failures(feedback) == ["summary", "obszary_rozwoju"]
+
+
+@pytest.mark.asyncio
+async def test_repair_regenerates_only_failing_fields(scoring, fake_llm):
+    generator = FeedbackGenerator("delegowanie")
+    generator.client = fake_llm([json.dumps(reply) for reply in [
+        {"summary": _words(10), "recommendation": _words(20), "mocne_strony": ["A"], "obszary_rozwoju": ["B"]},
+        {"summary": _words(8)},  # nadal za krótkie - odrzucone
+        {"summary": _words(80), "recommendation": "nie powinno zostać użyte"},
+    ]], usage=USAGE)
+
+    feedback = await generator.generate(scoring)
+
+    assert len(feedback.summary.split()) == 80
+    assert feedback.recommendation == _words(20)
+    assert "POPRAW TYLKO TE POLA" in generator.client.prompts[1] and "- recommendation" not in generator.client.prompts[1]
+    repair = generator.last_meta["repair"]
+    assert repair["attempts"] == 2 and repair["repaired_fields"] == ["summary"] and repair["still_failing"] == []
+    assert repair["tokens_saved"] == 2 * 2100 - 2 * 150
+    assert generator.last_usage["total_tokens"] == 2100 + 2 * 150
+
+
+@pytest.mark.asyncio
+async def test_too_long_summary_is_repaired_not_rejected(scoring, fake_llm):
+    """Summary ponad limit znaków modelu Feedback trafia do naprawy zamiast przerwać etap"""
+    too_long = " ".join(["rozbudowane"] * 170)
+    generator = FeedbackGenerator("delegowanie")
+    generator.client = fake_llm([json.dumps(reply) for reply in [
+        {"summary": too_long, "recommendation": _words(20), "mocne_strony": ["A"], "obszary_rozwoju": ["B"]},
+        {"summary": _words(90)},
+    ]], usage=USAGE)
+
+    feedback = await generator.generate(scoring)
+
+    assert feedback.summary == _words(90)
+    assert generator.last_meta["repair"]["repaired_fields"] == ["summary"]
+
+
+@pytest.mark.asyncio
+async def test_wrongly_typed_list_repaired_then_fallback(scoring, fake_llm):
+    """Tekst zamiast listy: naprawa pola; gdy naprawy zawiodą - fallback do typu i limitów modelu"""
+    generator = FeedbackGenerator("delegowanie")
+    generator.client = fake_llm([json.dumps(reply) for reply in [
+        {"summary": _words(60), "recommendation": _words(20), "mocne_strony": "Intencja: jasny cel", "obszary_rozwoju": ["B"]},
+        {"mocne_strony": ["Intencja: jasny cel", "Kontrola: terminy"]},
+    ]], usage=USAGE)
+    feedback = await generator.generate(scoring)
+    assert feedback.mocne_strony == ["Intencja: jasny cel", "Kontrola: terminy"]
+
+    too_long = " ".join(["rozbudowane"] * 170)
+    generator.client = fake_llm([json.dumps(reply) for reply in [
+        {"summary": too_long, "recommendation": _words(20), "mocne_strony": "Intencja: jasny cel", "obszary_rozwoju": ["B"]},
+        "nie JSON",
+        {"summary": 12, "mocne_strony": "nadal tekst"},
+    ]], usage=USAGE)
+    feedback = await generator.generate(scoring)
+
+    assert feedback.mocne_strony == ["Intencja: jasny cel"]
+    # Przycięte na granicy słowa do limitu znaków modelu Feedback
+    assert len(feedback.summary) <= 1000 and set(feedback.summary.split()) == {"rozbudowane"}
+    repair = generator.last_meta["repair"]
+    assert repair["attempts"] == 2 and repair["repaired_fields"] == []
+    assert repair["fallback_fields"] == ["summary", "mocne_strony"] and repair["still_failing"] == []
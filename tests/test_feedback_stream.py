@@ -0,0 +1,79 @@
+"""
+Testy strumieniowania feedbacku: przyrostowy czytnik JSON i zdarzenia generatora (klient LLM zastąpiony atrapą)
+"""
+
+import json
+
+import pytest
+
+from app.json_utils import JsonFieldStream
+from app.models import DimensionScore, MappedResponse, ParsedResponse, ScoringResult
+from app.modules.feedback import FeedbackGenerator
+
+FEEDBACK = {
+    "summary": " ".join(["Uczestnik \"jasno\" określa cel."] * 15),
+    "recommendation": "Warto ustalić z pracownikiem konkretny termin pierwszego wspólnego przeglądu postępów.",
+    "mocne_strony": ["Intencja: jasny cel", "Harmonogram: terminy"],
+    "obszary_rozwoju": ["Monitorowanie: brak punktów kontrolnych"],
+}
+
+
+def _feed_all(text: str, step: int) -> list[tuple[str, str, str]]:
+    reader = JsonFieldStream()
+    events = []
+    for i in range(0, len(text), step):
+        events += reader.feed(text[i:i + step])
+    assert reader.done
+    return events
+
+
+@pytest.mark.parametrize("step", [1, 4, 1000])
+def test_reader_emits_fields_and_items(step):
+    text = "```json\n" + json.dumps(FEEDBACK, ensure_ascii=False) + "\n```"
+    events = _feed_all(text, step)
+
+    deltas = "".join(value for kind, field, value in events if kind == "delta" and field == "summary")
+    assert deltas == FEEDBACK["summary"]
+    complete = [(kind, field, value) for kind, field, value in events if kind != "delta"]
+    assert complete == [
+        ("field", "summary", FEEDBACK["summary"]),
+        ("field", "recommendation", FEEDBACK["recommendation"]),
+        ("item", "mocne_strony", "Intencja: jasny cel"),
+        ("item", "mocne_strony", "Harmonogram: terminy"),
+        ("item", "obszary_rozwoju", "Monitorowanie: brak punktów kontrolnych"),
+    ]
+
+
+def test_reader_waits_for_complete_escape():
+    reader = JsonFieldStream()
+    assert reader.feed('{"summary": "za\\u01') == [("delta", "summary", "za")]
+    assert reader.feed('7c') == [("delta", "summary", "ż")]
+
+
+@pytest.mark.asyncio
+async def test_generate_streams_events(fake_llm):
+    parsed = ParsedResponse(sections={"przebieg": "Rozmowa"}, raw_text="Rozmowa")
+    scoring = ScoringResult(
+        ocena=2.5,
+        poziom="Efektywny",
+        dimension_scores={"intencja": DimensionScore(wymiar="intencja", ocena=0.7, waga=1.0, punkty=0.7, uzasadnienie="")},
+        mapped_response=MappedResponse(evidence={}, parsed_response=parsed),
+    )
+    generator = FeedbackGenerator("delegowanie")
+    generator.client = fake_llm(
+        [json.dumps(FEEDBACK, ensure_ascii=False)],
+        usage={"prompt_tokens": 900, "completion_tokens": 300, "total_tokens": 1200},
+        stream=True,
+    )
+    events: list[dict] = []
+
+    feedback = await generator.generate(scoring, on_event=events.append)
+
+    assert generator.client.calls[0]["stream"] is True
+    assert feedback.model_dump() == FEEDBACK
+    assert events[0]["type"] == "delta" and events[0]["field"] == "summary"
+    assert [e["value"] for e in events if e["type"] == "item"] == FEEDBACK["mocne_strony"] + FEEDBACK["obszary_rozwoju"]
+    assert generator.last_usage["total_tokens"] == 1200
+    assert generator.last_meta["repair"]["attempts"] == 0
+    latency = generator.last_meta["latency"]
+    assert latency["streamed"] and latency["ttft_ms"] is not None and latency["ttft_ms"] <= latency["total_ms"]
@@ -0,0 +1,54 @@
+"""
+Testy oceny przyrostowej: wykrywanie zmienionych sekcji i wymiarów do ponownego mapowania (bez wywołań LLM)
+"""
+
+from app.incremental import changed_sections, citation_sections, dimensions_to_remap, evidence_changed
+from app.models import WymiarEvidence
+from app.modules.evidence_prefilter import RubricIndex
+from app.modules.mapper import ResponseMapper
+
+SECTIONS = {
+    "przygotowanie": "Analizuję cele kwartalne i kompetencje zespołu.",
+    "przebieg": "Ustalamy kamienie milowe i cotygodniowe spotkania kontrolne.",
+    "decyzje": "Deleguję prowadzenie pilota Annie.",
+    "efekty": "Anna rozwija kompetencje projektowe.",
+}
+
+
+def test_changed_sections_ignores_whitespace():
+    new = {**SECTIONS, "przebieg": "Ustalamy  kamienie milowe i cotygodniowe\nspotkania kontrolne.",
+           "efekty": "Anna prowadzi pilota samodzielnie."}
+    assert changed_sections(SECTIONS, new) == {"efekty"}
+
+
+def test_citation_sections_exact_and_fallback():
+    assert citation_sections("kamienie milowe", SECTIONS) == {"przebieg"}
+    assert citation_sections("coś zupełnie innego", SECTIONS) == set(SECTIONS)
+
+
+def test_unchanged_answer_remaps_nothing():
+    index = RubricIndex(ResponseMapper("delegowanie").wymiary)
+    old_evidence = {key: {"znalezione_fragmenty": [], "czy_obecny": False} for key in index.docs}
+    remap, _ = dimensions_to_remap(SECTIONS, dict(SECTIONS), old_evidence, index, set())
+    assert remap == set()
+
+
+def test_changed_section_remaps_only_supported_dimensions():
+    index = RubricIndex(ResponseMapper("delegowanie").wymiary)
+    old_evidence = {key: {"znalezione_fragmenty": [], "czy_obecny": False} for key in index.docs}
+    old_evidence["harmonogram"] = {"znalezione_fragmenty": ["kamienie milowe"], "czy_obecny": True}
+    new = {**SECTIONS, "przebieg": "Ustalamy terminy pośrednie i raporty co tydzień."}
+
+    remap, supporting = dimensions_to_remap(SECTIONS, new, old_evidence, index, {"przebieg"})
+
+    assert "harmonogram" in remap
+    assert remap == {key for key, sources in supporting.items() if "przebieg" in sources}
+    assert remap != set(index.docs)
+
+
+def test_evidence_changed():
+    old = {"znalezione_fragmenty": ["kamienie milowe"], "czy_obecny": True}
+    same = WymiarEvidence(wymiar="harmonogram", znalezione_fragmenty=["kamienie  milowe"], czy_obecny=True)
+    other = WymiarEvidence(wymiar="harmonogram", znalezione_fragmenty=[], czy_obecny=False)
+    assert not evidence_changed(old, same)
+    assert evidence_changed(old, other)
@@ -0,0 +1,71 @@
+"""
+Testy zadań w tle z harmonogramem: okna czasu, wstrzymanie i wznowienie od punktu kontrolnego
+(tymczasowa baza SQLite, bez LLM)
+"""
+
+from datetime import datetime
+
+import pytest
+
+import app.database as database
+import app.jobs as jobs
+from app.db_models import claim_job, create_job, get_job
+
+
+def test_window_across_midnight():
+    assert jobs.in_window("22:00-06:00", datetime(2026, 1, 1, 23, 30))
+    assert jobs.in_window("22:00-06:00", datetime(2026, 1, 1, 5, 59))
+    assert not jobs.in_window("22:00-06:00", datetime(2026, 1, 1, 12, 0))
+    assert jobs.next_window_start("22:00-06:00", datetime(2026, 1, 1, 12, 0)) == datetime(2026, 1, 1, 22, 0)
+    with pytest.raises(ValueError):
+        jobs.validate_schedule({"policy": "window", "window": "25:00-06:00"})
+    assert jobs.validate_schedule({"policy": "now"}) is None
+
+
+@pytest.mark.asyncio
+async def test_paused_job_resumes_from_checkpoint(db, monkeypatch):
+    processed = []
+    gate = {"open": True}
+
+    def factory(params, created_by):
+        async def worker(item):
+            processed.append(item)
+            if item == 2:
+                gate["open"] = False  # okno zamyka się po drugim elemencie
+            return {"status": "done"}
+        return worker
+
+    monkeypatch.setattr(jobs, "can_run", lambda schedule, now=None: (gate["open"], None if gate["open"] else "poza oknem"))
+    monkeypatch.setattr(jobs, "ensure_scheduler", lambda: None)
+    jobs.register_job_kind("test", factory)
+
+    job = await jobs.start_job(
+        kind="test", params={}, items=[1, 2, 3, 4], worker=factory({}, "tester"), created_by="tester",
+        concurrency=1, schedule={"policy": "window", "window": "22:00-06:00"},
+    )
+    # Okno otwarte - zadanie startuje od razu
+    await jobs._RUNNING[job["id"]]
+
+    paused = await get_job(job["id"])
+    assert paused["status"] == "paused" and paused["done"] == 2 and paused["lease_owner"] is None
+
+    gate["open"] = True
+    assert await jobs.schedule_pending_jobs() == [job["id"]]
+    await jobs._RUNNING[job["id"]]
+
+    completed = await get_job(job["id"])
+    assert completed["status"] == "completed" and completed["done"] == 4
+    assert processed == [1, 2, 3, 4]
+    assert [entry["index"] for entry in completed["result"]] == [0, 1, 2, 3]
+    # Punkty kontrolne per element - kolumna result nie jest przepisywana po każdym elemencie
+    async with database.get_connection(read_only=True) as conn:
+        rows = await conn.execute_fetchall("SELECT result FROM background_jobs WHERE id = ?", (job["id"],))
+    assert rows[0]["result"] is None
+
+
+@pytest.mark.asyncio
+async def test_lease_blocks_second_worker(db):
+    job = await create_job(kind="test", params={}, items=[1], created_by="tester", schedule=None)
+    assert await claim_job(job["id"], "worker-a", 60)
+    assert await claim_job(job["id"], "worker-b", 60) is None
+    assert await claim_job(job["id"], "worker-a", 60)
@@ -0,0 +1,133 @@
+"""
+Testy schedulera wywołań LLM: kolejność wydawania slotów według klas priorytetu
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.llm_scheduler import LlmScheduler, current_priority, llm_priority
+
+ALICE = ("alice", "user")
+
+
+async def _fill(scheduler: LlmScheduler, priority: str, order: list[str], release: asyncio.Event, user=ALICE):
+    async with scheduler.slot(priority, user):
+        order.append(priority)
+        await release.wait()
+
+
+async def _call(scheduler: LlmScheduler, user: tuple[str, str], order: list[str]):
+    async with scheduler.slot("batch", user):
+        order.append(user[0])
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_by_priority():
+    scheduler = LlmScheduler(capacity=1, background_share=0)
+    order: list[str] = []
+    release = asyncio.Event()
+    await scheduler.acquire("api", ALICE)  # zajęty jedyny slot
+
+    tasks = [asyncio.create_task(_fill(scheduler, cls, order, release)) for cls in ("calibration", "batch", "interactive")]
+    await asyncio.sleep(0)
+    assert scheduler.stats()["classes"]["batch"]["queued"] == 1
+
+    release.set()
+    scheduler.release("api", ALICE)
+    await asyncio.gather(*tasks)
+    assert order == ["interactive", "batch", "calibration"]
+
+
+@pytest.mark.asyncio
+async def test_background_reserved_share():
+    scheduler = LlmScheduler(capacity=2, background_share=0.5)
+    order: list[str] = []
+    release = asyncio.Event()
+    await scheduler.acquire("interactive", ALICE)
+    await scheduler.acquire("interactive", ALICE)
+
+    tasks = [asyncio.create_task(_fill(scheduler, cls, order, release)) for cls in ("interactive", "batch")]
+    await asyncio.sleep(0)
+    scheduler.release("interactive", ALICE)
+    await asyncio.sleep(0)
+    assert order == ["batch"]  # rezerwa tła wyprzedza interactive
+
+    release.set()
+    scheduler.release("interactive", ALICE)
+    await asyncio.gather(*tasks)
+    assert scheduler.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    scheduler = LlmScheduler(capacity=1, background_share=0)
+    await scheduler.acquire("api", ALICE)
+    waiter = asyncio.create_task(scheduler.acquire("batch", ALICE))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    scheduler.release("api", ALICE)
+    assert scheduler.stats()["in_flight"] == 0
+    assert scheduler.stats()["classes"]["batch"]["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_share_between_users():
+    """Użytkownik z dużym zadaniem nie blokuje drugiego; waga roli zwiększa udział"""
+    scheduler = LlmScheduler(capacity=1, background_share=0, role_weights={"user": 1.0, "admin": 2.0})
+    order: list[str] = []
+    await scheduler.acquire("api", ALICE)
+    tasks = [asyncio.create_task(_call(scheduler, ("bulk", "user"), order)) for _ in range(6)]
+    tasks += [asyncio.create_task(_call(scheduler, ("bob", "user"), order)) for _ in range(2)]
+    tasks += [asyncio.create_task(_call(scheduler, ("root", "admin"), order)) for _ in range(4)]
+    await asyncio.sleep(0)
+    assert scheduler.user_stats()["users"]["bulk"]["queued"] == 6
+
+    scheduler.release("api", ALICE)
+    await asyncio.gather(*tasks)
+    assert order[:8] == ["bulk", "bob", "root", "root", "bulk", "bob", "root", "root"]
+    assert order[8:] == ["bulk"] * 4
+    assert scheduler.user_stats()["users"] == {}
+
+
+@pytest.mark.asyncio
+async def test_foreground_activity_shared_between_workers(tmp_path):
+    """Bezczynność dla polityki idle liczona z ruchu wszystkich workerów (wspólny znacznik)"""
+    marker = (tmp_path / "lem.db.foreground").as_posix()
+    worker_a = LlmScheduler(capacity=1, shared_marker=lambda: marker)
+    worker_b = LlmScheduler(capacity=1, shared_marker=lambda: marker)
+    worker_b._foreground_active_at -= 600  # w tym workerze brak ruchu od 10 minut
+    assert worker_b.foreground_idle_seconds() >= 600
+
+    await worker_a.acquire("interactive", ALICE)
+    assert worker_b.foreground_idle_seconds() < 5
+
+    # Długie wywołanie w A: znacznik się starzeje, dopóki A go nie odświeży
+    stale = time.time() - 300
+    os.utime(marker, (stale, stale))
+    assert 295 < worker_b.foreground_idle_seconds() < 310
+    worker_a.publish_foreground()
+    assert worker_b.foreground_idle_seconds() < 5
+    worker_a.release("interactive", ALICE)
+
+    # Ruch w tle nie odświeża znacznika
+    os.utime(marker, (stale, stale))
+    await worker_a.acquire("batch", ALICE)
+    worker_a.release("batch", ALICE)
+    worker_a.publish_foreground()
+    assert worker_b.foreground_idle_seconds() > 295
+
+
+def test_priority_context():
+    assert current_priority() == "api"
+    with llm_priority("batch"):
+        assert current_priority() == "batch"
+    assert current_priority() == "api"
+    with pytest.raises(ValueError):
+        with llm_priority("urgent"):
+            pass
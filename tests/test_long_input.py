@@ -0,0 +1,81 @@
+"""
+Testy jednostkowe trybu okienkowego parsera dla długich odpowiedzi (bez LLM)
+"""
+
+import pytest
+from app.modules.long_input import (
+    assemble_sections,
+    build_chunks,
+    merge_assignments,
+    pending_chunks,
+    reuse_assignments,
+    split_units,
+)
+
+KEYS = ["przygotowanie", "przebieg", "decyzje", "efekty"]
+
+
+def test_chunks_overlap_and_cover_all_units():
+    """Każdy akapit trafia do okna, kolejne okna zachodzą na siebie o jeden akapit"""
+    units = ["x" * 400] * 10  # ~100 tokenów na akapit
+    chunks = build_chunks(units, chunk_tokens=300, overlap_units=1)
+
+    assert sorted({i for chunk in chunks for i in chunk}) == list(range(10))
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert prev[-1] == nxt[0]
+
+
+def test_long_paragraph_split_into_sentence_groups():
+    """Akapit dłuższy niż limit dzielony jest po zdaniach"""
+    paragraph = " ".join(f"Zdanie numer {i} opisuje kolejny krok rozmowy." for i in range(60))
+    units = split_units(f"Krótki wstęp.\n\n{paragraph}", max_unit_chars=500)
+
+    assert units[0] == "Krótki wstęp."
+    assert len(units) > 3
+    assert all(len(u) <= 500 for u in units)
+
+
+def test_merge_majority_and_tie_break():
+    """Większość głosów wygrywa; remis rozstrzyga pierwsze okno; brak głosu - sekcja poprzednika"""
+    chunks = [[0, 1, 2], [2, 3], [2, 3, 4]]
+    labels = [
+        {0: "przygotowanie", 1: "przebieg", 2: "decyzje"},
+        {2: "przebieg", 3: "efekty"},
+        {2: "decyzje", 3: "decyzje", 4: "nieznana"},
+    ]
+    assigned = merge_assignments(5, chunks, labels, KEYS)
+
+    assert assigned == ["przygotowanie", "przebieg", "decyzje", "efekty", "efekty"]
+    assert merge_assignments(5, chunks, labels, KEYS) == assigned
+
+
+def test_assemble_keeps_original_order():
+    units = ["A", "B", "C"]
+    sections = assemble_sections(units, ["przebieg", "efekty", "przebieg"], KEYS)
+
+    assert sections["przebieg"] == "A\n\nC"
+    assert sections["przygotowanie"] == ""
+
+
+def test_reuse_keeps_unchanged_units_only():
+    """Akapit bez zmian (poza białymi znakami) zachowuje sekcję; zmieniony i niejednoznaczny - nie"""
+    previous = {"przygotowanie": "A\n\nB", "przebieg": "C\n\nWspólny", "efekty": "Wspólny"}
+    units = ["A", "B  zmienione", "C", "Nowy", "Wspólny"]
+
+    assert reuse_assignments(units, previous, KEYS) == {0: "przygotowanie", 2: "przebieg"}
+    assert reuse_assignments(["A"], {}, KEYS) == {}
+
+
+def test_pending_chunks_cover_changed_units_with_neighbours():
+    """Okna tylko wokół akapitów bez przypisania, z sąsiadem po każdej stronie; sąsiednie ciągi scalane"""
+    units = ["x" * 400] * 10
+    known = {i: "przebieg" for i in range(10) if i not in (2, 4, 8)}
+
+    assert pending_chunks(units, known, chunk_tokens=1000) == [[1, 2, 3, 4, 5], [7, 8, 9]]
+    assert pending_chunks(units, {i: "przebieg" for i in range(10)}, chunk_tokens=1000) == []
+    # Za duże okno dzielone jak w build_chunks (z zakładką)
+    assert pending_chunks(units, known, chunk_tokens=300)[:2] == [[1, 2, 3], [3, 4, 5]]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
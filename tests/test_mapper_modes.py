@@ -0,0 +1,46 @@
+"""
+Testy budowania promptów mappera w trybie per_dimension (bez wywołań LLM)
+"""
+
+import json
+import pytest
+from app.models import ParsedResponse
+from app.modules.mapper import ResponseMapper, get_mapper_config
+
+
+@pytest.fixture
+def parsed():
+    return ParsedResponse(
+        sections={
+            "przygotowanie": "Analizuję cele kwartalne i kompetencje zespołu.",
+            "przebieg": "Ustalamy kamienie milowe i cotygodniowe spotkania kontrolne.",
+            "decyzje": "Deleguję prowadzenie pilota Annie.",
+            "efekty": "Anna rozwija kompetencje projektowe.",
+        },
+        raw_text="",
+    )
+
+
+def test_dimension_prompts_share_response_prefix(parsed):
+    """Jeden prompt na wymiar, odpowiedź na początku (wspólny prefiks wywołań)"""
+    mapper = ResponseMapper("delegowanie")
+    prompts, _ = mapper.build_dimension_prompts(parsed)
+
+    assert set(prompts) == set(mapper.wymiary)
+    prefix = prompts["intencja"].split("WYMIAR DO ANALIZY")[0]
+    assert "kamienie milowe" in prefix
+    assert all(p.startswith(prefix) for p in prompts.values())
+    assert mapper.wymiary["harmonogram"]["nazwa"] in prompts["harmonogram"]
+
+
+def test_mode_override_per_competency(tmp_path):
+    """Tryb z _default nadpisywany ustawieniem kompetencji"""
+    path = tmp_path / "mapper.json"
+    path.write_text(json.dumps({"_default": {"mode": "single"}, "delegowanie": {"mode": "per_dimension"}}))
+
+    assert get_mapper_config("delegowanie", path)["mode"] == "per_dimension"
+    assert get_mapper_config("udzielanie_feedbacku", path)["mode"] == "single"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,79 @@
+"""
+Testy walidacji wyniku mappera i naprawy tylko brakujących/niepoprawnych wymiarów (klient LLM zastąpiony atrapą)
+"""
+
+import json
+import re
+
+import pytest
+
+from app.models import ParsedResponse
+from app.modules.mapper import ResponseMapper, dimension_problem
+
+VALID = {"znalezione_fragmenty": ["Anna prowadzi pilota."], "czy_obecny": True, "notatki": "ok"}
+
+
+DIMENSION_PROMPT = re.compile(r"WYMIAR DO ANALIZY: .* \((\w+)\)")
+
+
+def dimension_replies(first: str, repairs: dict[str, str]):
+    """Pierwsze wywołanie: `first`; kolejne (prompty per wymiar): odpowiedź z `repairs` wg klucza wymiaru."""
+    def reply(kwargs):
+        match = DIMENSION_PROMPT.search(kwargs["messages"][-1]["content"])
+        return repairs[match.group(1)] if match else first
+    return reply
+
+
+def repaired_keys(client) -> list[str]:
+    return [match.group(1) for match in map(DIMENSION_PROMPT.search, client.prompts) if match]
+
+
+@pytest.fixture
+def parsed():
+    return ParsedResponse(sections={"decyzje": "Anna prowadzi pilota."}, raw_text="Anna prowadzi pilota.")
+
+
+def test_dimension_problem():
+    assert dimension_problem(VALID) is None
+    assert dimension_problem({"czy_obecny": False}) is None
+    assert dimension_problem(None) == "brak wymiaru w odpowiedzi"
+    assert dimension_problem("tak") == "wynik wymiaru nie jest obiektem"
+    assert dimension_problem({"czy_obecny": "tak"}) == "brak lub niepoprawne czy_obecny"
+    assert dimension_problem({"czy_obecny": True, "znalezione_fragmenty": []}) == "czy_obecny bez cytatów"
+
+
+@pytest.mark.asyncio
+async def test_single_mode_repairs_only_invalid_dimensions(parsed, fake_llm):
+    mapper = ResponseMapper("delegowanie")
+    mapper.mode = "single"
+    first = {key: VALID for key in mapper.wymiary}
+    del first["harmonogram"]
+    first["monitorowanie"] = "garbage"
+    mapper.client = fake_llm(dimension_replies(
+        json.dumps(first),
+        {"harmonogram": json.dumps(VALID), "monitorowanie": "nie wiem"},
+    ))
+
+    mapped = await mapper.map(parsed)
+
+    assert sorted(repaired_keys(mapper.client)) == ["harmonogram", "monitorowanie"]
+    assert mapped.evidence["harmonogram"].czy_obecny is True
+    assert mapped.evidence["monitorowanie"].czy_obecny is False
+    assert mapped.evidence["monitorowanie"].notatki == "Brak poprawnego wyniku mappera dla wymiaru"
+    validation = mapper.last_meta["validation"]
+    assert set(validation["invalid"]) == {"harmonogram", "monitorowanie"}
+    assert validation["repaired"] == ["harmonogram"] and validation["still_invalid"] == ["monitorowanie"]
+    assert mapper.last_usage["total_tokens"] == 3 * 15
+
+
+@pytest.mark.asyncio
+async def test_unparseable_response_falls_back_to_dimension_calls(parsed, fake_llm):
+    mapper = ResponseMapper("delegowanie")
+    mapper.mode = "single"
+    mapper.client = fake_llm(dimension_replies("Przepraszam, nie mogę.", {key: json.dumps(VALID) for key in mapper.wymiary}))
+
+    mapped = await mapper.map(parsed)
+
+    assert sorted(repaired_keys(mapper.client)) == sorted(mapper.wymiary)
+    assert all(evidence.czy_obecny for evidence in mapped.evidence.values())
+    assert mapper.last_meta["validation"]["still_invalid"] == []
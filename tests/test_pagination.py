@@ -0,0 +1,73 @@
+"""
+Testy stronicowania list kursorem (keyset): kompletność stron, filtry, indeksy złożone
+(tymczasowa baza SQLite)
+"""
+
+import pytest
+
+import app.database as database
+from app.db_models import list_assessments_page, list_runs_page, save_assessments, save_run
+
+
+def _record(index: int, created_at: str) -> dict:
+    return {
+        "participant_id": f"P{index % 2}",
+        "competency": "delegowanie",
+        "created_by": "tester",
+        "created_at": created_at,
+        "steps": {
+            "parse": {"raw_text": f"Tekst {index}", "_llm": {"model": "gpt-4o" if index % 3 else "qwen"}},
+            "score": {"ocena": index * 0.5, "poziom": "Efektywny", "dimension_scores": {}},
+        },
+    }
+
+
+async def _all_pages(fetch, **filters) -> list[list]:
+    pages, cursor = [], None
+    while True:
+        items, cursor = await fetch(cursor=cursor, **filters)
+        pages.append(items)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.asyncio
+async def test_assessment_pages_cover_all_rows_newest_first(db):
+    # Dwie oceny z tym samym created_at - kolejność rozstrzyga id
+    stamps = ["2026-01-01T10:00:00+00:00", "2026-01-03T10:00:00+00:00", "2026-01-03T10:00:00+00:00",
+              "2026-01-02T10:00:00+00:00", "2026-01-05T10:00:00+00:00"]
+    ids = await save_assessments([_record(i, stamp) for i, stamp in enumerate(stamps)])
+
+    pages = await _all_pages(list_assessments_page, limit=2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [item["id"] for page in pages for item in page] == [ids[4], ids[2], ids[1], ids[3], ids[0]]
+
+    filtered = await _all_pages(
+        list_assessments_page, limit=1, participant_id="P0", date_from="2026-01-02", date_to="2026-01-04",
+    )
+    assert [item["id"] for page in filtered for item in page] == [ids[2]]
+    items, cursor = await list_assessments_page(llm_model="qwen", score_min=1.0, score_max=2.0)
+    assert [item["id"] for item in items] == [ids[3]] and cursor is None
+
+    with pytest.raises(ValueError):
+        await list_assessments_page(cursor="nie-kursor")
+    with pytest.raises(ValueError):
+        await list_assessments_page(date_from="2026-13-01")
+
+
+@pytest.mark.asyncio
+async def test_run_pages_and_index_use(db):
+    for i in range(3):
+        await save_run(participant_id=f"P{i}", competency="delegowanie", module="mapper", run={}, saved_by="jan")
+
+    pages = await _all_pages(list_runs_page, limit=2, competency="delegowanie")
+    assert [[item["participant_id"] for item in page] for page in pages] == [["P2", "P1"], ["P0"]]
+
+    async with database.get_connection(read_only=True) as conn:
+        plan = await conn.execute_fetchall(
+            "EXPLAIN QUERY PLAN SELECT id FROM assessments WHERE competency = ? AND (created_at, id) < (?, ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT 21",
+            ("delegowanie", "2026-01-03", 10),
+        )
+    details = " ".join(row[3] for row in plan)
+    assert "idx_assessments_competency_page" in details and "TEMP B-TREE" not in details
@@ -0,0 +1,60 @@
+"""
+Testy runów pipeline'u przechowywanych po stronie serwera (tymczasowa baza SQLite, bez LLM)
+"""
+
+import pytest
+import pytest_asyncio
+from app.db_models import (
+    create_pipeline_run,
+    get_assessment_by_id,
+    get_pipeline_run,
+    save_pipeline_run_assessment,
+    save_pipeline_stage,
+)
+
+STAGES = {
+    "parse": {"sections": {"przebieg": "Rozmowa"}, "raw_text": "Rozmowa"},
+    "map": {"evidence": {"intencja": {"znalezione_fragmenty": ["Rozmowa"], "czy_obecny": True}}},
+    "score": {"ocena": 2.5, "poziom": "Efektywny", "dimension_scores": {"intencja": {"ocena": 0.6, "waga": 1.0, "punkty": 0.6}}},
+    "feedback": {"summary": "Podsumowanie", "recommendation": "Rekomendacja", "mocne_strony": [], "obszary_rozwoju": []},
+}
+
+
+@pytest_asyncio.fixture
+async def run(db):
+    return await create_pipeline_run(
+        participant_id="P001", competency="delegowanie", response_text="Rozmowa", created_by="tester",
+    )
+
+
+async def _complete(run_id):
+    order = list(STAGES)
+    for i, (stage, output) in enumerate(STAGES.items()):
+        await save_pipeline_stage(run_id, stage, output, 10 * (i + 1), invalidate=order[i + 1:])
+
+
+@pytest.mark.asyncio
+async def test_rerun_stage_invalidates_downstream(run):
+    """Ponowne uruchomienie etapu usuwa wyniki etapów zależnych"""
+    await _complete(run["id"])
+    await save_pipeline_stage(run["id"], "map", STAGES["map"], 5, invalidate=["score", "feedback"])
+
+    stored = await get_pipeline_run(run["id"])
+    assert set(stored["stages"]) == {"parse", "map"}
+    assert stored["timing"]["map_ms"] == 5
+
+
+@pytest.mark.asyncio
+async def test_save_run_as_assessment(run):
+    """Zapis runu tworzy ocenę z czasami etapów i wiąże ją z runem"""
+    await _complete(run["id"])
+    stored = await get_pipeline_run(run["id"])
+    result = await save_pipeline_run_assessment(stored, created_by="tester", prompt_versions={"map": "v1"})
+
+    assessment = await get_assessment_by_id(result["id"])
+    assert assessment["score"] == 2.5
+    assert (await get_pipeline_run(run["id"]))["assessment_id"] == result["id"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,85 @@
+"""
+Testy planowania ponownej oceny (bez LLM)
+"""
+
+import pytest
+from app.modules.scorer import CompetencyScorer
+from app.reassessment import REAGGREGATE, REUSE, RERUN, plan_reassessment, reaggregate_score
+
+
+def _step(version, model="gpt-4o", **extra):
+    return {"_prompt_meta": {"active_version": version}, "_llm": {"model": model}, **extra}
+
+
+@pytest.fixture
+def assessment():
+    return {
+        "id": 7,
+        "competency": "delegowanie",
+        "response_text": "tekst",
+        "prompt_versions": {"parse": "v1", "map": "v1", "score": "v1", "feedback": "v1"},
+        "steps": {
+            "parse": _step("v1"),
+            "map": _step("v1"),
+            "score": _step("v1", dimension_scores={
+                "intencja": {"ocena": 1.0, "waga": 0.5, "punkty": 0.5},
+                "harmonogram": {"ocena": 0.5, "waga": 0.5, "punkty": 0.25},
+            }),
+            "feedback": _step("v1"),
+        },
+    }
+
+
+CURRENT = {
+    "prompt_versions": {"parse": "v1", "map": "v1", "score": "v1", "feedback": "v1"},
+    "model": "gpt-4o",
+    "weights": {"intencja": 0.5, "harmonogram": 0.5},
+}
+
+
+def test_unchanged_assessment_is_up_to_date(assessment):
+    assert plan_reassessment(assessment, CURRENT)["up_to_date"]
+
+
+def test_feedback_prompt_change_reruns_only_feedback(assessment):
+    current = {**CURRENT, "prompt_versions": {**CURRENT["prompt_versions"], "feedback": "v2"}}
+    actions = plan_reassessment(assessment, current)["actions"]
+    assert actions == {"parse": REUSE, "map": REUSE, "score": REUSE, "feedback": RERUN}
+
+
+def test_map_prompt_change_reruns_downstream(assessment):
+    current = {**CURRENT, "prompt_versions": {**CURRENT["prompt_versions"], "map": "v2"}}
+    actions = plan_reassessment(assessment, current)["actions"]
+    assert actions == {"parse": REUSE, "map": RERUN, "score": RERUN, "feedback": RERUN}
+
+
+def test_rule_based_parse_ignores_model_change(assessment):
+    """Parse bez LLM (podział po nagłówkach) nie zależy od modelu"""
+    assessment["steps"]["parse"]["_parse_meta"] = {"llm_skipped": True}
+    actions = plan_reassessment(assessment, {**CURRENT, "model": "gpt-4.1"})["actions"]
+    assert actions["parse"] == REUSE
+    assert actions["map"] == RERUN
+
+
+def test_weights_change_reaggregates_score(assessment):
+    current = {**CURRENT, "weights": {"intencja": 0.25, "harmonogram": 0.75}}
+    plan = plan_reassessment(assessment, current)
+    assert plan["actions"]["score"] == REAGGREGATE
+    assert plan["actions"]["feedback"] == RERUN
+
+    score = reaggregate_score(assessment["steps"]["score"], current["weights"])
+    # (1.0 * 0.25 + 0.5 * 0.75) * 4 = 2.5
+    assert score["ocena"] == 2.5
+    assert score["dimension_scores"]["harmonogram"]["waga"] == 0.75
+    assert "ocena_delegowanie" not in score
+
+
+def test_reaggregate_uses_scorer_rounding(assessment):
+    assessment["steps"]["score"]["ocena_delegowanie"] = 3.0
+    score = reaggregate_score(assessment["steps"]["score"], {"intencja": 0.9, "harmonogram": 0.4})
+    # Suma wag > 1: (0.9 + 0.2) * 4 = 4.4 -> obcięte do 4.0, jak w CompetencyScorer
+    assert score["ocena"] == score["ocena_delegowanie"] == CompetencyScorer.final_score(1.1) == 4.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,93 @@
+"""
+Testy zapisu ocen: zapis wsadowy (executemany dla wielu ocen) daje te same dane co zapis pojedynczy,
+skrót i długość tekstu zapisywane przy insercie i uzupełniane migracją (tymczasowa baza SQLite)
+"""
+
+import sqlite3
+
+import pytest
+
+import app.database as database
+import app.db_writer as db_writer
+from app.db_models import get_assessment_by_id, list_assessments, save_assessment, save_assessments
+from app.db_writer import run_write
+
+
+def _record(participant_id: str, citations: list[str]) -> dict:
+    return {
+        "participant_id": participant_id,
+        "competency": "delegowanie",
+        "created_by": "tester",
+        "created_at": "2026-01-01T00:00:00+00:00",
+        "steps": {
+            "parse": {"sections": {"przebieg": "Tekst"}, "raw_text": "Tekst", "_usage": {"total_tokens": 10}},
+            "map": {"evidence": {
+                "intencja": {"znalezione_fragmenty": citations, "czy_obecny": bool(citations)},
+                "harmonogram": {"znalezione_fragmenty": [], "czy_obecny": False},
+            }},
+            "score": {"ocena": 2.0, "poziom": "Efektywny", "dimension_scores": {
+                "intencja": {"ocena": 0.5, "waga": 0.5, "punkty": 0.25, "uzasadnienie": "U"},
+                "harmonogram": {"ocena": 0.0, "waga": 0.5, "punkty": 0.0, "uzasadnienie": "Brak"},
+            }},
+            "feedback": {"summary": "S", "recommendation": "R", "mocne_strony": ["A"], "obszary_rozwoju": ["B"]},
+            "timing": {"parse_ms": 5, "map_ms": 7},
+        },
+    }
+
+
+def _without_ids(session: dict) -> dict:
+    return {key: value for key, value in session.items() if key not in ("id", "filename", "participant_id")}
+
+
+@pytest.mark.asyncio
+async def test_bulk_matches_single_save(db):
+    single = await save_assessment(**_record("P0", ["Cytat 1", "Cytat 2"]))
+    bulk_ids = await save_assessments([_record("P1", ["Cytat 1", "Cytat 2"]), _record("P2", [])])
+
+    assert bulk_ids == [single["id"] + 1, single["id"] + 2]
+    reference = await get_assessment_by_id(single["id"])
+    assert _without_ids(await get_assessment_by_id(bulk_ids[0])) == _without_ids(reference)
+
+    assert reference["evidence"] == {"intencja": ["Cytat 1", "Cytat 2"], "harmonogram": []}
+    assert list(reference["steps"]) == ["parse", "map", "score", "feedback", "prompt_versions"]
+    assert (await get_assessment_by_id(bulk_ids[1]))["evidence"] == {"intencja": [], "harmonogram": []}
+
+
+@pytest.mark.asyncio
+async def test_text_hash_stored_and_backfilled(db):
+    await save_assessments([_record("P1", []), _record("P2", [])])
+    # Ocena sprzed migracji - bez skrótu i długości
+    async with database.get_connection() as conn:
+        await conn.execute(
+            "INSERT INTO assessments (participant_id, competency, response_text, created_at, created_by) "
+            "VALUES ('P0', 'delegowanie', 'Inny tekst', '2026-01-01', 'tester')"
+        )
+        await conn.commit()
+    await database.init_db()
+
+    rows = {row["participant_id"]: row for row in await list_assessments()}
+    assert rows["P0"]["response_text_hash"] == database.response_text_hash("Inny tekst")
+    assert rows["P0"]["response_text_len"] == len("Inny tekst")
+    assert rows["P1"]["response_text_hash"] == rows["P2"]["response_text_hash"] == database.response_text_hash("Tekst")
+
+    same_text = await list_assessments(text_hash=rows["P1"]["response_text_hash"])
+    assert sorted(row["participant_id"] for row in same_text) == ["P1", "P2"]
+
+
+@pytest.mark.asyncio
+async def test_backfill_error_does_not_abort_startup(db, monkeypatch):
+    await save_assessments([_record("P1", [])])
+    async with database.get_connection() as conn:
+        await conn.execute("UPDATE assessments SET response_text_hash = NULL")
+        await conn.commit()
+
+    async def locked(op):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(db_writer, "run_write", locked)
+    await database.init_db()  # start workera mimo błędu uzupełniania
+    assert not (await list_assessments())[0]["response_text_hash"]
+
+    monkeypatch.setattr(db_writer, "run_write", run_write)
+    await database.init_db()
+    assert (await list_assessments())[0]["response_text_hash"] == database.response_text_hash("Tekst")
@@ -0,0 +1,40 @@
+"""
+Testy zapisanych runów (pipeline_steps 'run:<moduł>'): filtrowanie i limit w SQL po kolumnach metadanych,
+migracja runów zapisanych wcześniej tylko z input_data JSON (tymczasowa baza SQLite)
+"""
+
+import json
+
+import pytest
+
+import app.database as database
+from app.db_models import get_run_by_ref, list_runs, save_run
+
+
+@pytest.mark.asyncio
+async def test_filters_and_legacy_rows_migrated(db):
+    # Run zapisany przed migracją - metadane tylko w input_data
+    async with database.get_connection() as conn:
+        await conn.execute(
+            "INSERT INTO pipeline_steps (step_name, input_data, output_data, created_at) VALUES (?, ?, ?, ?)",
+            ("run:mapper", json.dumps({"participant_id": "P0", "competency": "delegowanie", "saved_by": "anna"}),
+             "{}", "2026-01-01"),
+        )
+        await conn.commit()
+    await database.init_db()
+
+    for participant_id, competency, module in [("P1", "delegowanie", "scorer"), ("P2", "feedback_c", "mapper")]:
+        await save_run(participant_id=participant_id, competency=competency, module=module, run={"ok": True}, saved_by="jan")
+
+    assert [run["participant_id"] for run in await list_runs()] == ["P2", "P1", "P0"]
+    assert [run["participant_id"] for run in await list_runs(competency="delegowanie")] == ["P1", "P0"]
+    assert [run["participant_id"] for run in await list_runs(module="mapper", limit=1)] == ["P2"]
+    legacy = await get_run_by_ref((await list_runs(participant_id="P0"))[0]["filename"])
+    assert legacy["saved_by"] == "anna" and legacy["module"] == "mapper"
+
+    async with database.get_connection(read_only=True) as conn:
+        plan = await conn.execute_fetchall(
+            "EXPLAIN QUERY PLAN SELECT id FROM pipeline_steps WHERE module IS NOT NULL AND competency = ? ORDER BY id DESC LIMIT 5",
+            ("delegowanie",),
+        )
+    assert "idx_pipeline_steps_runs_competency" in " ".join(row[3] for row in plan)
@@ -0,0 +1,77 @@
+"""
+Testy self-consistency scorera: n próbek w jednym wywołaniu, agregacja i rozrzut (klient LLM zastąpiony atrapą)
+"""
+
+import json
+
+import pytest
+
+from app.models import MappedResponse, ParsedResponse, WymiarEvidence
+from app.modules.scorer import CompetencyScorer, aggregate_samples, get_scorer_config
+
+
+def sampling_client(fake_llm, answers: list[str], supports_n: bool = True):
+    """Zwraca tyle odpowiedzi, ile wynosi `n` (lub jedną, gdy backend ignoruje `n`)."""
+    def samples(kwargs) -> int:
+        return kwargs.get("n", 1) if supports_n else 1
+    return fake_llm(
+        lambda kwargs: answers[:samples(kwargs)],
+        usage=lambda kwargs: {
+            "prompt_tokens": 300, "completion_tokens": 2 * samples(kwargs), "total_tokens": 300 + 2 * samples(kwargs),
+        },
+    )
+
+
+@pytest.fixture
+def mapped():
+    parsed = ParsedResponse(sections={"przebieg": "Rozmowa"}, raw_text="Rozmowa")
+    return MappedResponse(
+        evidence={
+            "intencja": WymiarEvidence(wymiar="intencja", znalezione_fragmenty=["Cel jest jasny"], czy_obecny=True),
+            "harmonogram": WymiarEvidence(wymiar="harmonogram", znalezione_fragmenty=[], czy_obecny=False),
+        },
+        parsed_response=parsed,
+    )
+
+
+def test_aggregate_samples():
+    assert aggregate_samples([0.6, 0.9, 0.7], "median") == (0.7, 0.3)
+    assert aggregate_samples([0.6, 0.9, 0.6], "mean") == (0.7, 0.3)
+    assert aggregate_samples([0.8], "median") == (0.8, None)
+
+
+def test_config_override(tmp_path):
+    path = tmp_path / "scorer.json"
+    path.write_text(json.dumps({"_default": {"samples": 1}, "delegowanie": {"samples": 5, "aggregate": "mean"}}))
+    assert get_scorer_config("delegowanie", path)["samples"] == 5
+    assert get_scorer_config("podejmowanie_decyzji", path) == {"samples": 1, "aggregate": "median", "sample_temperature": 0.7}
+    path.write_text(json.dumps({"_default": {"aggregate": "mode"}}))
+    with pytest.raises(ValueError):
+        get_scorer_config("delegowanie", path)
+
+
+@pytest.mark.asyncio
+async def test_samples_in_single_request(mapped, fake_llm):
+    scorer = CompetencyScorer("delegowanie")
+    scorer.samples, scorer.aggregate = 3, "median"
+    scorer.client = sampling_client(fake_llm, ["0.6", "Ocena: 0.9", "0.7"])
+
+    result = await scorer.score(mapped)
+
+    assert len(scorer.client.calls) == 1 and scorer.client.calls[0]["n"] == 3
+    intencja = result.dimension_scores["intencja"]
+    assert intencja.ocena == 0.7 and intencja.rozrzut == 0.3 and intencja.liczba_probek == 3
+    assert result.dimension_scores["harmonogram"].liczba_probek == 0
+    assert scorer.last_usage["prompt_tokens"] == 300
+
+
+@pytest.mark.asyncio
+async def test_backend_without_n_falls_back_to_one_sample(mapped, fake_llm):
+    scorer = CompetencyScorer("delegowanie")
+    scorer.samples = 3
+    scorer.client = sampling_client(fake_llm, ["0.8", "0.2", "0.2"], supports_n=False)
+
+    result = await scorer.score(mapped)
+
+    intencja = result.dimension_scores["intencja"]
+    assert intencja.ocena == 0.8 and intencja.rozrzut is None and intencja.liczba_probek == 1
@@ -0,0 +1,93 @@
+"""
+Testy jednostkowe deterministycznego podziału na sekcje (bez LLM)
+"""
+
+import pytest
+from pathlib import Path
+from app.modules.parser import PARSE_SECTIONS
+from app.modules.section_splitter import split_sections, fold_diacritics
+
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture
+def delegowanie_sections():
+    return PARSE_SECTIONS["delegowanie"]
+
+
+@pytest.mark.parametrize("filename", [
+    "response_level_0_nieefektywny.txt",
+    "response_level_2_efektywny.txt",
+    "response_level_3_biegly.txt",
+])
+def test_split_plain_headings(delegowanie_sections, filename):
+    """Nagłówki 'Przygotowanie do rozmowy:' itd. dają wszystkie 4 sekcje"""
+    text = (ROOT / "tests" / "sample_responses" / filename).read_text(encoding="utf-8")
+    sections = split_sections(text, delegowanie_sections)
+
+    assert sections is not None
+    assert set(sections) == set(delegowanie_sections["keys"])
+    assert all(len(v) >= 20 for v in sections.values())
+
+
+def test_split_bold_headings_ignores_nested_items(delegowanie_sections):
+    """Pogrubione punkty listy wewnątrz sekcji nie rozpoczynają nowej sekcji"""
+    text = (ROOT / "odpowiedz_1_poziom_bardzo_wysoki.md").read_text(encoding="utf-8")
+    sections = split_sections(text, delegowanie_sections)
+
+    assert sections is not None
+    assert "Zakres odpowiedzialności i decyzyjność" in sections["przebieg"]
+    assert sections["decyzje"].startswith("Deleguję")
+
+
+def test_split_missing_section_falls_back(delegowanie_sections):
+    """Brak jednej z sekcji = brak pewności (fallback do LLM)"""
+    text = (ROOT / "odpowiedz_6_sprytny_minimalista.md").read_text(encoding="utf-8")
+    assert split_sections(text, delegowanie_sections) is None
+
+
+def test_split_without_diacritics(delegowanie_sections):
+    """Nagłówki bez polskich znaków są rozpoznawane tak samo"""
+    text = (
+        "PRZYGOTOWANIE:\nAnalizuje priorytety kwartalne i obciazenie zespolu przed rozmowa.\n\n"
+        "Przebieg rozmowy:\nWyjasniam cel, ustalamy terminy i punkty kontrolne projektu.\n\n"
+        "Decyzja co delegowac:\nDeleguje prowadzenie pilota, zostawiam sobie eskalacje.\n\n"
+        "Efekty:\nPracownik samodzielnie prowadzi projekt, a ja odzyskuje czas.\n"
+    )
+    sections = split_sections(text, delegowanie_sections)
+
+    assert sections is not None
+    assert sections["decyzje"].startswith("Deleguje prowadzenie")
+
+
+def test_inline_label_inside_section_stays_in_section(delegowanie_sections):
+    """Zdanie "Etykieta: treść" w środku akapitu nie otwiera nowej sekcji i zachowuje etykietę"""
+    text = (
+        "Przygotowanie do rozmowy:\nAnalizuję priorytety kwartalne i obciążenie zespołu przed rozmową.\n\n"
+        "Przebieg rozmowy:\nWyjaśniam cel projektu i wspólnie ustalamy terminy.\n"
+        "Decyzja: pracownik sam wybiera dostawców, a ja zatwierdzam tylko budżet.\n"
+        "Pod koniec rozmowy: podsumowujemy ustalenia i punkty kontrolne.\n\n"
+        "Decyzje delegacyjne:\nDeleguję prowadzenie pilota, zostawiam sobie eskalacje.\n\n"
+        "Planowane efekty:\nPracownik samodzielnie prowadzi projekt, a ja odzyskuję czas.\n"
+    )
+    sections = split_sections(text, delegowanie_sections)
+
+    assert sections is not None
+    assert "Decyzja: pracownik sam wybiera dostawców" in sections["przebieg"]
+    assert sections["przebieg"].endswith("Pod koniec rozmowy: podsumowujemy ustalenia i punkty kontrolne.")
+    assert sections["decyzje"] == "Deleguję prowadzenie pilota, zostawiam sobie eskalacje."
+
+
+def test_unstructured_text_falls_back(delegowanie_sections):
+    """Tekst bez nagłówków nie jest dzielony lokalnie"""
+    text = "Rozmawiam z pracownikiem i mówię mu co ma zrobić. " * 10
+    assert split_sections(text, delegowanie_sections) is None
+
+
+def test_fold_diacritics():
+    assert fold_diacritics("Źródło ŁÓDŹ zażółć") == "zrodlo lodz zazolc"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
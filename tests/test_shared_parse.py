@@ -0,0 +1,161 @@
+"""
+Testy wspólnego podziału na sekcje dla wielu kompetencji: jedno wywołanie klasyfikacji akapitów,
+cache per tekst używany przez parser każdej kompetencji (klient LLM zastąpiony atrapą)
+"""
+
+import json
+import re
+
+import pytest
+
+import app.modules.parser as parser_module
+from app.llm_client import max_tokens_param
+from app.modules.parser import ResponseParser, parse_for_competencies
+
+TEXT = (
+    "Przed rozmową przejrzałem cele zespołu i zastanowiłem się, kto ma czas na nowe zadanie.\n\n"
+    "Na spotkaniu omówiliśmy z Anną zakres projektu oraz kryteria, po których ocenimy sukces.\n\n"
+    "Ustaliliśmy cotygodniowe spotkania i to, że Anna sama zdecyduje o sposobie realizacji."
+)
+ASSIGNMENT = {
+    "1": {"delegowanie": "przygotowanie", "podejmowanie_decyzji": "kontekst_sytuacji"},
+    "2": {"delegowanie": "przebieg", "podejmowanie_decyzji": "analiza_kryteriow"},
+    "3": {"delegowanie": "efekty", "podejmowanie_decyzji": "komunikacja_wdrozenie"},
+}
+
+
+CLASSIFY_USAGE = {"prompt_tokens": 200, "completion_tokens": 40, "total_tokens": 240}
+
+
+def classify(kwargs) -> str:
+    ids = re.findall(r"^\[(\d+)\]", kwargs["messages"][-1]["content"], re.M)
+    return json.dumps({i: ASSIGNMENT[i] for i in ids})
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    parser_module._SHARED_CACHE.clear()
+    yield
+    parser_module._SHARED_CACHE.clear()
+
+
+@pytest.mark.asyncio
+async def test_one_call_for_all_competencies(fake_llm):
+    client = fake_llm(classify, usage=CLASSIFY_USAGE)
+    sections, usage = await parse_for_competencies(
+        TEXT, ["delegowanie", "podejmowanie_decyzji"], client=client, model="test-model",
+    )
+
+    assert len(client.prompts) == 1 and "podejmowanie_decyzji:" in client.prompts[0]
+    assert sections["delegowanie"]["przebieg"].startswith("Na spotkaniu")
+    assert sections["podejmowanie_decyzji"]["komunikacja_wdrozenie"].startswith("Ustaliliśmy")
+    assert usage["total_tokens"] == 240
+
+    # Drugie wywołanie - w całości z cache
+    _, usage = await parse_for_competencies(TEXT, ["podejmowanie_decyzji"], client=client, model="test-model")
+    assert usage == {} and len(client.prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_parsers_reuse_shared_split(fake_llm):
+    client = fake_llm(classify, usage=CLASSIFY_USAGE)
+    first = ResponseParser("delegowanie")
+    first.client, first.model = client, "test-model"
+    parsed = await first.parse(TEXT, shared_competencies=["delegowanie", "podejmowanie_decyzji"])
+    assert first.last_meta["method"] == "llm_shared" and first.last_usage["total_tokens"] == 240
+    assert parsed.sections["przygotowanie"].startswith("Przed rozmową")
+
+    second = ResponseParser("podejmowanie_decyzji")
+    second.client, second.model = client, "test-model"
+    parsed = await second.parse(TEXT, shared_competencies=["delegowanie", "podejmowanie_decyzji"])
+    assert second.last_meta["method"] == "shared" and second.last_meta["shared_template"] is True
+    assert second.last_usage is None and len(client.prompts) == 1
+    assert parsed.sections["analiza_kryteriow"].startswith("Na spotkaniu")
+
+
+@pytest.mark.asyncio
+async def test_cache_skipped_without_shared_competencies_or_after_prompt_change(fake_llm, monkeypatch):
+    client = fake_llm(classify, usage=CLASSIFY_USAGE)
+    await parse_for_competencies(TEXT, ["delegowanie", "podejmowanie_decyzji"], client=client, model="test-model")
+
+    # Pojedyncza ocena (np. ponowna ocena, revise) parsuje aktywnym promptem kompetencji
+    single = ResponseParser("delegowanie")
+    single.client, single.model = fake_llm([json.dumps({"przebieg": TEXT})]), "test-model"
+    parsed = await single.parse(TEXT)
+    assert single.last_meta["method"] == "llm" and parsed.sections["przebieg"] == TEXT
+
+    # Nowa wersja promptu parse - wspólny podział liczony od nowa
+    versions = parser_module.get_active_versions
+    monkeypatch.setattr(parser_module, "get_active_versions", lambda c: {**versions(c), "parse": "v-nowa"})
+    _, usage = await parse_for_competencies(TEXT, ["delegowanie", "podejmowanie_decyzji"], client=client, model="test-model")
+    assert usage["total_tokens"] == 240 and len(client.prompts) == 2
+
+
+@pytest.mark.asyncio
+async def test_non_default_parse_prompt_skips_shared_template(fake_llm, monkeypatch):
+    """Kompetencja z promptem parse zmienionym w prompt managerze nie korzysta ze stałego szablonu"""
+    versions = parser_module.get_active_versions
+    monkeypatch.setattr(
+        parser_module, "get_active_versions",
+        lambda c: {**versions(c), "parse": "v-nowa"} if c == "podejmowanie_decyzji" else versions(c),
+    )
+    both = ["delegowanie", "podejmowanie_decyzji"]
+
+    edited = ResponseParser("podejmowanie_decyzji")
+    edited.client, edited.model = fake_llm([json.dumps({"kontekst_sytuacji": TEXT})]), "test-model"
+    await edited.parse(TEXT, shared_competencies=both)
+    assert edited.last_meta["method"] == "llm" and "shared_template" not in edited.last_meta
+
+    # Druga kompetencja zostaje sama - wspólny podział nic nie oszczędza, zwykła ścieżka LLM
+    default = ResponseParser("delegowanie")
+    default.client, default.model = fake_llm([json.dumps({"przebieg": TEXT})]), "test-model"
+    await default.parse(TEXT, shared_competencies=both)
+    assert default.last_meta["method"] == "llm" and "AKAPITY" not in default.client.prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_truncated_shared_output_falls_back_to_single_parse(fake_llm):
+    """Budżet tokenów ~20 na akapit i kompetencję; ucięty JSON - parsowanie per kompetencja"""
+    client = fake_llm([
+        '{"1": {"delegowanie": "przygotowanie", "podejmowanie_decyzji": "kontekst_sy',
+        json.dumps({"przygotowanie": TEXT}),
+    ], usage=CLASSIFY_USAGE)
+    parser = ResponseParser("delegowanie")
+    parser.client, parser.model = client, "test-model"
+
+    parsed = await parser.parse(TEXT, shared_competencies=["delegowanie", "podejmowanie_decyzji"])
+
+    assert max_tokens_param(20 * 3 * 2 + 50).items() <= client.calls[0].items()
+    assert len(client.calls) == 2 and parser.last_meta["method"] == "llm"
+    assert parsed.sections["przygotowanie"] == TEXT
+    assert parser_module._SHARED_CACHE.get(parser_module.shared_parse_key(TEXT, "test-model"), "delegowanie") is None
+
+
+@pytest.mark.asyncio
+async def test_reparse_classifies_only_changed_paragraphs(fake_llm):
+    previous = {
+        "przygotowanie": TEXT.split("\n\n")[0],
+        "przebieg": TEXT.split("\n\n")[1],
+        "decyzje": "",
+        "efekty": TEXT.split("\n\n")[2],
+    }
+    added = "Zdecydowałem, że Anna dostanie budżet projektu i sama wybierze dostawców."
+    revised = TEXT + "\n\n" + added
+    client = fake_llm(lambda kwargs: json.dumps({"3": "efekty", "4": "decyzje"}), usage=CLASSIFY_USAGE)
+    parser = ResponseParser("delegowanie")
+    parser.client, parser.model = client, "test-model"
+
+    parsed = await parser.reparse(revised, previous)
+    # Jedno krótkie wywołanie: nowy akapit i jego sąsiad jako kontekst
+    assert len(client.prompts) == 1 and "[4] Zdecydowałem" in client.prompts[0]
+    assert "[1]" not in client.prompts[0] and "[2]" not in client.prompts[0]
+    assert parsed.sections["decyzje"] == added
+    assert parsed.sections["przygotowanie"] == previous["przygotowanie"]
+    assert parser.last_meta["method"] == "llm_incremental" and parser.last_meta["reused_units"] == 3
+    assert parser.last_usage["total_tokens"] == 240
+
+    # Bez zmian w treści - podział w całości z poprzedniego runu, bez LLM
+    parsed = await parser.reparse(TEXT.replace("\n\n", "\n\n\n"), previous)
+    assert parsed.sections == previous and len(client.prompts) == 1
+    assert parser.last_meta["method"] == "reused" and parser.last_meta["llm_skipped"] is True
+    assert parser.last_usage is None
@@ -0,0 +1,80 @@
+"""
+Testy single-flight: jedno wykonanie dla identycznych równoległych żądań, anulowanie pojedynczego
+oczekującego i anulowanie wykonania, gdy odejdzie ostatni oczekujący
+"""
+
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight, make_flight_key
+
+
+def _factory(calls: list, release: asyncio.Event, cancelled: list):
+    async def run():
+        calls.append(1)
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "wynik"
+    return run
+
+
+def test_flight_key_stable():
+    assert make_flight_key("assess", {"b": 1, "a": 2}) == make_flight_key("assess", {"a": 2, "b": 1})
+    assert make_flight_key("assess", None, "api") != make_flight_key("assess", 30000, "api")
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_share_one_execution():
+    flights = SingleFlight("test")
+    calls, cancelled, release = [], [], asyncio.Event()
+
+    waiters = [asyncio.create_task(flights.do("klucz", _factory(calls, release, cancelled))) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["wynik"] * 3
+    assert calls == [1]
+    stats = flights.stats()
+    assert stats["executions"] == 1 and stats["coalesced_requests"] == 2 and stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_stop_others():
+    flights = SingleFlight("test")
+    calls, cancelled, release = [], [], asyncio.Event()
+    first = asyncio.create_task(flights.do("klucz", _factory(calls, release, cancelled)))
+    second = asyncio.create_task(flights.do("klucz", _factory(calls, release, cancelled)))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    release.set()
+
+    assert await second == "wynik"
+    assert calls == [1] and cancelled == [] and flights.stats()["abandoned_executions"] == 0
+
+
+@pytest.mark.asyncio
+async def test_last_waiter_leaving_cancels_execution():
+    flights = SingleFlight("test")
+    calls, cancelled, release = [], [], asyncio.Event()
+    waiters = [asyncio.create_task(flights.do("klucz", _factory(calls, release, cancelled))) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert cancelled == [1]
+    assert flights.stats()["abandoned_executions"] == 1 and flights.stats()["in_flight"] == 0
+
+    # Kolejne żądanie z tym samym kluczem uruchamia nowe wykonanie
+    release.set()
+    assert await flights.do("klucz", _factory(calls, release, cancelled)) == "wynik"
+    assert calls == [1, 1]
@@ -0,0 +1,67 @@
+"""
+Testy zapisu write-behind ocen z /assess: partie w jednej transakcji, opróżnianie przy zamknięciu
+(tymczasowa baza SQLite, bez LLM)
+"""
+
+import asyncio
+
+import pytest
+
+from app.db_models import list_assessments, save_assessments
+from app.write_behind import WriteBehindQueue
+
+
+def _record(participant_id: str) -> dict:
+    return {
+        "participant_id": participant_id,
+        "competency": "delegowanie",
+        "created_by": "api",
+        "run_name": "api",
+        "steps": {
+            "response_text": "Tekst odpowiedzi",
+            "parse": {"sections": {"przebieg": "Tekst odpowiedzi"}, "raw_text": "Tekst odpowiedzi"},
+            "map": {"evidence": {"intencja": {"znalezione_fragmenty": ["Tekst"], "czy_obecny": True}}},
+            "score": {"ocena": 2.0, "poziom": "Efektywny", "dimension_scores": {"intencja": {"ocena": 0.5}}},
+            "feedback": {"summary": "S", "recommendation": "R", "mocne_strony": [], "obszary_rozwoju": []},
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_batches_and_flush_on_shutdown(db):
+    batches: list[int] = []
+
+    async def writer(records):
+        batches.append(len(records))
+        await save_assessments(records)
+
+    queue = WriteBehindQueue(writer=writer, batch_size=3, flush_interval_s=60)
+    for i in range(5):
+        assert queue.enqueue(_record(f"P{i}"))
+    await asyncio.sleep(0)  # pierwsza partia: 3 gotowe wpisy, bez czekania na okno
+
+    await queue.flush_and_stop()
+
+    assert batches == [3, 2]
+    assert sorted(a["participant_id"] for a in await list_assessments()) == [f"P{i}" for i in range(5)]
+    assert queue.stats()["written"] == 5 and queue.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking(db):
+    queue = WriteBehindQueue(batch_size=10, flush_interval_s=60, max_pending=1)
+    assert queue.enqueue(_record("P1"))
+    assert queue.enqueue(_record("P2")) is False
+    await queue.flush_and_stop()
+    assert queue.stats()["dropped"] == 1 and len(await list_assessments()) == 1
+
+
+@pytest.mark.asyncio
+async def test_record_waiting_for_batch_window_is_flushed(db):
+    queue = WriteBehindQueue(batch_size=10, flush_interval_s=60)
+    queue.enqueue(_record("P1"))
+    await asyncio.sleep(0)  # task pobrał wpis i czeka na okno partii
+    assert queue.stats()["pending"] == 0
+
+    await queue.flush_and_stop()
+    assert [a["participant_id"] for a in await list_assessments()] == ["P1"]